@@ -126,7 +126,8 @@ def obtain_histograms(root_path, pickle_file_path):
             mv.feature_manipulations.expand_mrc_features(x) for x in experiment_features]
 
         print('Starting histograms')
-        exp_histogram_manager = mv.HistogramManager(new_experiment_features)
+        exp_histogram_manager = mv.HistogramManager(new_experiment_features,
+                                                    keep_data=True)
 
         print('Loading features from disk: experiment_files')
         control_features = [
@@ -137,7 +138,8 @@ def obtain_histograms(root_path, pickle_file_path):
             mv.feature_manipulations.expand_mrc_features(x) for x in control_features]
 
         print('Starting histograms')
-        ctl_histogram_manager = mv.HistogramManager(new_control_features)
+        ctl_histogram_manager = mv.HistogramManager(new_control_features,
+                                                    keep_data=True)
 
         # Store a pickle file in the same folder as this script
         # (i.e. movement_validation/examples/)
@@ -95,8 +95,10 @@ def main():
     control_files = get_matlab_filepaths(control_path)
 
     # Compute histograms on our files
-    experiment_histograms = mv.HistogramManager(experiment_files)
-    control_histograms = mv.HistogramManager(control_files)
+    experiment_histograms = mv.HistogramManager(experiment_files,
+                                                keep_data=True)
+    control_histograms = mv.HistogramManager(control_files,
+                                             keep_data=True)
     experiment_histograms.plot_information()
 
     # Compute statistics
@@ -29,6 +29,7 @@ from .features import feature_manipulations
 
 from .features.worm_features import WormFeatures
 from .features.feature_processing_options import FeatureProcessingOptions
+from .features.feature_cache import FeatureCache
 
 from .statistics.histogram_manager import HistogramManager
 from .statistics.statistics_manager import StatisticsManager
@@ -53,6 +54,7 @@ __all__ = ['__version__',
            'VideoInfo',
            'WormFeatures',
            'FeatureProcessingOptions',
+           'FeatureCache',
            'NormalizedWormPlottable',
            'HistogramManager',
            'StatisticsManager',
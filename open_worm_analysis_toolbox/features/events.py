@@ -71,7 +71,6 @@ import operator
 import h5py
 import warnings
 
-from itertools import groupby
 from .. import utils
 
 
@@ -276,41 +275,27 @@ class EventFinder:
         # are caught
         bracketed_event_mask = np.concatenate([[False], event_mask, [False]])
 
-        # Let's obtain the "x-coordinates" of the True entries.
-        # e.g. If our bracketed_event_mask is
-        # [False, False, False, True, False True, True, True, False], then
-        # we obtain the array [3, 5, 6, 7]
-        x = np.flatnonzero(bracketed_event_mask) - 1
-
-        # Group these together using a fancy trick from
-        # http://stackoverflow.com/questions/2154249/, since
-        # the lambda function x:x[0]-x[1] on an enumerated list will
-        # group consecutive integers together
-        # e.g. [[(0, 3)], [(1, 5), (2, 6), (3, 7)]]
-        # list(group)
-        x_grouped = [list(group) for key, group in
-                     groupby(enumerate(x), lambda i:i[0] - i[1])]
-
-        # We want to know the first element from each "run", and the
-        # last element e.g. [[3, 4], [5, 7]]
-        event_candidates = [(i[0][1], i[-1][1]) for i in x_grouped]
+        # A run of Trues starts where the mask goes from False to True, and
+        # stops just before it goes from True to False
+        mask_changes = np.diff(bracketed_event_mask.astype(np.int8))
+        starts = np.flatnonzero(mask_changes == 1)
+        stops = np.flatnonzero(mask_changes == -1) - 1
 
         # Early exit if we have no starts and stops at all
-        if not event_candidates:
-            return np.array(event_candidates)
+        if starts.size == 0:
+            return np.array([])
 
         # If a run of NaNs precedes the first start index, all the way back to
         # the first element, then revise our first (start, stop) entry to
         # include all those NaNs.
-        if np.all(np.isnan(event_data[:event_candidates[0][0]])):
-            event_candidates[0] = (0, event_candidates[0][1])
+        if np.all(np.isnan(event_data[:starts[0]])):
+            starts[0] = 0
 
         # Same but with NaNs succeeding the final end index.
-        if np.all(np.isnan(event_data[event_candidates[-1][1] + 1:])):
-            event_candidates[-1] = (event_candidates[-1]
-                                    [0], event_data.size - 1)
+        if np.all(np.isnan(event_data[stops[-1] + 1:])):
+            stops[-1] = event_data.size - 1
 
-        return np.array(event_candidates)
+        return np.column_stack((starts, stops))
 
     def remove_gaps(self, event_candidates, threshold,
                     comparison_operator):
@@ -341,26 +326,20 @@ class EventFinder:
                comparison_operator == operator.gt or
                comparison_operator == operator.ge)
 
-        new_event_candidates = []
-        num_groups = np.shape(event_candidates)[0]
+        if len(event_candidates) == 0:
+            return event_candidates
 
-        i = 0
-        while(i < num_groups):
-            # Now advance through groups to the right,
-            # continuing as long as they satisfy our comparison operator
-            ii = i
-            while(ii + 1 < num_groups and comparison_operator(
-                    event_candidates[ii + 1][0] - event_candidates[ii][1] - 1,
-                    threshold)):
-                ii += 1
+        # Join each event to the next as long as the gap between them
+        # satisfies our comparison operator
+        gaps = event_candidates[1:, 0] - event_candidates[:-1, 1] - 1
+        is_joined = comparison_operator(gaps, threshold)
 
-            # Add this largest possible start/stop duple to our NEW revised
-            # list
-            new_event_candidates.append((event_candidates[i][0],
-                                         event_candidates[ii][1]))
-            i = ii + 1
+        is_group_start = np.concatenate(([True], ~is_joined))
+        is_group_end = np.concatenate((~is_joined, [True]))
 
-        return np.array(new_event_candidates)
+        # The largest possible start/stop duples
+        return np.column_stack((event_candidates[is_group_start, 0],
+                                event_candidates[is_group_end, 1]))
 
     def remove_too_small_events(self, event_candidates):
         """
@@ -428,15 +407,12 @@ class EventFinder:
         # --------------------------------------------------------
 
         num_runs = np.shape(event_candidates)[0]
+        starts = event_candidates[:, 0]
+        ends = event_candidates[:, 1] + 1
 
         # Sum the actual distance travelled by the worm during each candidate
         # event
-        event_sums = np.empty(num_runs, dtype=float)
-        for i in range(num_runs):
-            event_sums[i] = np.nansum(
-                distance_data[
-                    event_candidates[i][0]:(
-                        event_candidates[i][1] + 1)])
+        event_sums = h__nanSumsOverRanges(distance_data, starts, ends)[0]
 
         # self.min_distance_threshold contains a 1-d n-element array of
         # skeleton lengths * 5% or whatever proportion we've decided the
@@ -449,20 +425,16 @@ class EventFinder:
         # threshold at all.
         min_threshold_sums = np.empty(num_runs, dtype=float)
         if self.min_distance_threshold is not None:
-            for i in range(num_runs):
-                min_threshold_sums[i] = np.nanmean(
-                    self.min_distance_threshold[
-                        event_candidates[i][0]:(
-                            event_candidates[i][1] + 1)])
+            min_threshold_sums = h__nanMeansOverRanges(
+                np.broadcast_to(self.min_distance_threshold,
+                                distance_data.shape), starts, ends)
 
         # Same procedure as above, but for the maximum distance threshold.
         max_threshold_sums = np.empty(num_runs, dtype=float)
         if self.max_distance_threshold is not None:
-            for i in range(num_runs):
-                max_threshold_sums[i] = np.nanmean(
-                    self.max_distance_threshold[
-                        event_candidates[i][0]:(
-                            event_candidates[i][1] + 1)])
+            max_threshold_sums = h__nanMeansOverRanges(
+                np.broadcast_to(self.max_distance_threshold,
+                                distance_data.shape), starts, ends)
 
         # Actual filtering of the candidate events
         # --------------------------------------------------------
@@ -488,6 +460,47 @@ class EventFinder:
         return event_candidates[np.flatnonzero(~events_to_remove)]
 
 
+def h__nanSumsOverRanges(data, starts, ends):
+    """
+    np.nansum of data[start:end] for many ranges at once, from cumulative
+    sums, so that the time taken doesn't depend on the length of the
+    ranges.
+
+    Parameters
+    ---------------------------------------
+    data: 1-d numpy array
+    starts, ends: 1-d numpy arrays of ints
+        The ranges, as slice values
+
+    Returns
+    ---------------------------------------
+    (sums, counts)
+        The sum and the number of non-NaN values of each range
+
+    """
+    is_valid = ~np.isnan(data)
+    cum_sums = np.concatenate(([0], np.cumsum(np.where(is_valid, data, 0))))
+    cum_counts = np.concatenate(([0], np.cumsum(is_valid)))
+
+    return (cum_sums[ends] - cum_sums[starts],
+            cum_counts[ends] - cum_counts[starts])
+
+
+def h__nanMeansOverRanges(data, starts, ends):
+    """
+    np.nanmean of data[start:end] for many ranges at once, NaN for ranges
+    with no valid data. See h__nanSumsOverRanges.
+    """
+    sums, counts = h__nanSumsOverRanges(np.asarray(data, dtype=float),
+                                        starts, ends)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+# The record type of EventList.events. The end frame is inclusive.
+EVENT_DTYPE = np.dtype([('start', np.int64), ('end', np.int64)])
+
+
 class EventList(object):
     """
     The EventList class is a relatively straightforward class specifying
@@ -504,8 +517,11 @@ class EventList(object):
 
     Attributes
     ----------
+    events : numpy structured array 1-d, dtype EVENT_DTYPE
+        One ('start', 'end') record per event. This is the internal
+        representation of the events.
     start_frames : numpy.array 1-d
-        Frames when each event starts.
+        Frames when each event starts (a view into events).
     end_frames : numpy.array 1-d
         Frames when each event ends (is inclusive, i.e. the last frame is
         a part of the event)
@@ -537,22 +553,30 @@ class EventList(object):
         ----------
 
         """
-        # self.start_frames and self.end_frames will be the internal representation
-        # of the events within this class.
-        self.start_frames = None
-        self.end_frames = None
-
         # Check if our events array exists and there is at least one event
         if (event_starts_and_stops is not None and
                 event_starts_and_stops.size != 0):
-            self.start_frames = event_starts_and_stops[:, 0]
-            self.end_frames = event_starts_and_stops[:, 1]
+            self.set_events(event_starts_and_stops[:, 0],
+                            event_starts_and_stops[:, 1])
+        else:
+            self.set_events([], [])
 
-        if(self.start_frames is None):
-            self.start_frames = np.array([], dtype=int)
+    def set_events(self, start_frames, end_frames):
+        """
+        Replace the events with the given start and (inclusive) end frames
+        """
+        start_frames = np.asarray(start_frames)
+        self.events = np.empty(start_frames.size, dtype=EVENT_DTYPE)
+        self.events['start'] = start_frames
+        self.events['end'] = end_frames
 
-        if(self.end_frames is None):
-            self.end_frames = np.array([], dtype=int)
+    @property
+    def start_frames(self):
+        return self.events['start']
+
+    @property
+    def end_frames(self):
+        return self.events['end']
 
     def __repr__(self):
         return utils.print_object(self)
@@ -560,19 +584,10 @@ class EventList(object):
     @property
     def starts_and_stops(self):
         """
-        Returns the start_frames and end_frames as a single numpy array
+        Returns the start_frames and end_frames as a single n x 2 numpy
+        array
         """
-        s_and_s = np.array([self.start_frames, self.end_frames])
-
-        # check that we didn't have s_and_s = [None, None] or something
-        if len(np.shape(s_and_s)) == 2:
-            # We need the first dimension to be the events, and the second
-            # to be the start / end, not the other way around.
-            # i.e. we want it to be n x 2, not 2 x n
-            s_and_s = np.rollaxis(s_and_s, 1)
-            return s_and_s
-        else:
-            return np.array([])
+        return self.events.view(np.int64).reshape(-1, 2).copy()
 
     @property
     def __len__(self):
@@ -584,12 +599,7 @@ class EventList(object):
         Formerly n_events
 
         """
-        # TODO: I think we are mixing lists and numpy arrays - let's remove the lists
-        # TypeError: object of type 'numpy.float64' has no len()
-        try:
-            return len(self.start_frames)
-        except TypeError:
-            return self.start_frames.size
+        return self.events.size
 
     @property
     def last_event_frame(self):
@@ -604,7 +614,7 @@ class EventList(object):
 
         """
         # Check if the end_frames have any entries at all
-        if self.end_frames is not None and self.end_frames.size != 0:
+        if self.events.size != 0:
             return self.end_frames[-1]
         else:
             return 0
@@ -654,11 +664,17 @@ class EventList(object):
         if num_frames is None:
             num_frames = self.last_event_frame + 1
 
-        mask = np.zeros(max(self.last_event_frame +
-                            1, num_frames), dtype='bool')
+        n_mask = max(self.last_event_frame + 1, num_frames)
 
-        for i_event in range(self.__len__):
-            mask[self.start_frames[i_event]:self.end_frames[i_event] + 1] = True
+        # Mark +1 at each start and -1 just after each end, then the
+        # running total is positive inside the events. Events that overlap
+        # are handled correctly since we only check for > 0.
+        n_changes = n_mask + 1
+        if self.events.size != 0:
+            n_changes = max(n_changes, self.end_frames.max() + 2)
+        changes = np.bincount(self.start_frames, minlength=n_changes) - \
+            np.bincount(self.end_frames + 1, minlength=n_changes)
+        mask = np.cumsum(changes[:n_mask]) > 0
 
         #??? Why are we slicing the output?
         # This appears to be because last_event_frame+1 could be larger
@@ -691,21 +707,18 @@ class EventList(object):
                                 from the first object.
 
         """
-        all_starts = np.concatenate((obj1.start_frames, obj2.start_frames))
-        all_ends = np.concatenate((obj1.end_frames, obj2.end_frames))
+        all_events = np.concatenate((obj1.events, obj2.events))
 
         # TODO: It would be good to check that events don't overlap
 
-        new_starts = np.sort(all_starts)
-        order_I = np.argsort(all_starts)
+        order_I = np.argsort(all_events['start'])
 
-        new_ends = all_ends[order_I]
+        is_from_first_object = order_I < obj1.events.size
 
-        is_from_first_object = order_I < obj1.start_frames.size
+        new_list = EventList()
+        new_list.events = all_events[order_I]
 
-        starts_stops = np.transpose(np.vstack((new_starts, new_ends)))
-
-        return (EventList(starts_stops), is_from_first_object)
+        return (new_list, is_from_first_object)
 
 
 class EventListWithFeatures(EventList):
@@ -857,21 +870,34 @@ class EventListWithFeatures(EventList):
 
         self.num_video_frames = len(self.distance_per_frame)
 
+        starts = self.start_frames
+        ends = self.end_frames
+
         # Old Name: time
-        self.event_durations = (self.end_frames - self.start_frames + 1) / fps
+        self.event_durations = (ends - starts + 1) / fps
 
         # Old Name: interTime
-        self.time_between_events = (
-            self.start_frames[1:] - self.end_frames[:-1] - 1) / fps
+        self.time_between_events = (starts[1:] - ends[:-1] - 1) / fps
+
+        # The events and the gaps between them, as slices, interleaved:
+        # event 0, gap 0, event 1, gap 1, ..., event n-1
+        # so that the distances for both are summed in one pass
+        slice_starts = np.empty(2 * starts.size - 1, dtype=np.int64)
+        slice_ends = np.empty(2 * starts.size - 1, dtype=np.int64)
+        slice_starts[0::2] = starts
+        slice_ends[0::2] = ends + 1
+        slice_starts[1::2] = ends[:-1] + 1
+        # max() as a gap slice is empty if the next event starts earlier
+        slice_ends[1::2] = np.maximum(starts[1:], slice_starts[1::2])
+
+        distance_sums, _ = h__nanSumsOverRanges(
+            np.asarray(self.distance_per_frame, dtype=float),
+            slice_starts, slice_ends)
 
         # Old Name: interDistance
         # Distance moved during events
         if compute_distance_during_event:
-            self.distance_during_events = np.zeros(self.__len__)
-            for i in range(self.__len__):
-                self.distance_during_events[i] = np.nansum(
-                    self.distance_per_frame[
-                        self.start_frames[i]:self.end_frames[i] + 1])
+            self.distance_during_events = distance_sums[0::2]
             self.data_ratio = np.nansum(self.distance_during_events) \
                 / np.nansum(self.distance_per_frame)
         else:
@@ -880,16 +906,7 @@ class EventListWithFeatures(EventList):
 
         # Old Name: distance
         # Distance moved between events
-        self.distance_between_events = np.zeros(self.__len__ - 1)
-        for i in range(self.__len__ - 1):
-            # Suppress "FutureWarning: In Numpy 1.9 the sum along empty
-            # slices will be zero."
-            with warnings.catch_warnings():
-                warnings.simplefilter('ignore', category=FutureWarning)
-                self.distance_between_events[i] = \
-                    np.nansum(
-                        self.distance_per_frame[self.end_frames[i] + 1:
-                                                self.start_frames[i + 1]])
+        self.distance_between_events = distance_sums[1::2]
 
         #self.distance_between_events[-1] = np.NaN
 
@@ -990,8 +1007,8 @@ class EventListWithFeatures(EventList):
                     ref_element = ref_array
                     frame_values[key] = [ref_element[0][0]]
 
-            self.start_frames = np.array(frame_values['start'], dtype=int)
-            self.end_frames = np.array(frame_values['end'], dtype=int)
+            self.set_events(np.array(frame_values['start'], dtype=int),
+                            np.array(frame_values['end'], dtype=int))
             self.event_durations = np.array(frame_values['time'])
             if('isVentral' in frame_values.keys()):
                 # For isVentral to even exist we must be at a signed event,
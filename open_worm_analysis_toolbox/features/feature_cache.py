@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of computed features.
+
+Each computed Feature is pickled to its own file in a cache directory. The
+file name is a content hash (key) of everything that went into computing
+the feature:
+
+    - the NormalizedWorm data (skeleton, contours and widths) and the
+      parts of its VideoInfo that are used by features
+    - the processing options that apply to the feature
+    - the feature's FeatureProcessingSpec (i.e. its row in
+      features_list.csv)
+    - the keys of the features it depends on
+      (see feature_scheduler.get_dependency_graph)
+    - the package version and CACHE_VERSION
+
+Since the keys of a feature's dependencies are part of its key, changing
+an option only invalidates the features that use that option and the
+features that depend on them. All other features are loaded from disk.
+
+Loaded files that can't be unpickled, or that don't hold the requested
+feature, are treated as a cache miss and the feature is recomputed.
+
+Usage
+-----
+cache = FeatureCache('/path/to/cache_dir', max_size=2 * 10**9)
+wf = WormFeatures(nw, cache=cache)
+
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import warnings
+
+import numpy as np
+
+from .. import utils
+from ..version import __version__
+from . import feature_scheduler
+from . import generic_features
+
+# Version of the cached features, part of every cache key. This MUST be
+# incremented whenever a change to the code changes the value of any
+# feature, or the attributes of any pickled object (e.g. EventList), as
+# files cached by older code would otherwise be loaded.
+CACHE_VERSION = 1
+
+# Processing options which apply to a feature, based on the start of the
+# feature's name. The first matching prefix is used. Options are given as
+# a path relative to FeatureProcessingOptions. Nested option objects are
+# not included unless explicitly listed, so that e.g. changing the
+# crawling bend options does not invalidate the velocity features.
+#
+# FeatureProcessingOptions.mimic_old_behaviour applies to all features.
+OPTIONS_BY_FEATURE_PREFIX = [
+    ('locomotion.crawling_bends', 'locomotion.crawling_bends'),
+    ('locomotion.foraging_bends', 'locomotion.foraging_bends'),
+    ('locomotion.turn_processor', 'locomotion.locomotion_turns'),
+    ('locomotion', 'locomotion'),
+    ('posture.amplitude_wavelength_processor', 'posture.wavelength'),
+    ('posture', 'posture')]
+
+
+class FeatureCache(object):
+    """
+    A directory of pickled features, limited in size.
+
+    When the total size of the cached files exceeds max_size the least
+    recently used files are deleted.
+
+    Attributes
+    ----------
+    cache_dir : string
+    max_size : int or None
+        Maximum size of the cache, in bytes. If None the cache is allowed
+        to grow without limit.
+
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get_key(self, wf, feature_name):
+        """
+        Returns the cache key of a feature, as a hex string.
+
+        The keys of all features are computed on the first call and saved
+        in wf._cache_keys so that the normalized worm is only hashed once
+        per WormFeatures instance.
+        """
+        keys = wf._cache_keys
+        if feature_name not in keys:
+            graph = feature_scheduler.get_dependency_graph(wf.specs)
+            nw_hash = get_normalized_worm_hash(wf.nw)
+            for name in graph:
+                self._compute_key(wf, name, graph, nw_hash)
+
+        return keys[feature_name]
+
+    def _compute_key(self, wf, feature_name, graph, nw_hash):
+        keys = wf._cache_keys
+        if feature_name in keys:
+            return keys[feature_name]
+
+        spec = wf.specs[feature_name]
+
+        h = hashlib.sha1()
+        _update_hash(h, (__version__, CACHE_VERSION))
+        _update_hash(h, nw_hash)
+        _update_hash(h, dict((k, v) for (k, v) in spec.__dict__.items()
+                             if k != 'source'))
+        _update_hash(h, wf.options.mimic_old_behaviour)
+        options = get_feature_options(wf.options, feature_name)
+        if options is not None:
+            _update_hash(h, options, shallow=True)
+
+        for dependency in graph[feature_name]:
+            _update_hash(h, self._compute_key(wf, dependency, graph,
+                                              nw_hash))
+
+        keys[feature_name] = h.hexdigest()
+        return keys[feature_name]
+
+    def load(self, wf, feature_name):
+        """
+        Returns the cached feature, or None if it has not been cached or
+        the cached file is not valid
+        """
+        file_path = self._get_file_path(self.get_key(wf, feature_name))
+        try:
+            with open(file_path, 'rb') as f:
+                cache_version, temp = pickle.load(f)
+        except Exception:
+            # Missing or corrupt files, or files written by code whose
+            # classes no longer exist
+            return None
+
+        if not (cache_version == CACHE_VERSION and
+                isinstance(temp, generic_features.Feature) and
+                getattr(temp, 'name', None) == feature_name):
+            return None
+
+        # Mark as recently used, for eviction
+        try:
+            os.utime(file_path, None)
+        except OSError:
+            pass
+
+        return temp
+
+    def save(self, wf, feature):
+        """
+        Parameters
+        ----------
+        wf : WormFeatures
+        feature : generic_features.Feature
+            A feature that has just been computed by wf
+        """
+        file_path = self._get_file_path(self.get_key(wf, feature.name))
+
+        # Write to a temporary file first so that concurrent readers never
+        # see a partially written feature
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((CACHE_VERSION, feature), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            os.rename(temp_path, file_path)
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            # Failing to cache shouldn't stop the feature from being used
+            warnings.warn('{} was NOT cached. {}'.format(feature.name, e))
+            return
+
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def evict(self, max_size):
+        """
+        Delete the least recently used files until the cache is no larger
+        than max_size bytes.
+        """
+        files = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith('.pkl'):
+                continue
+            file_path = os.path.join(self.cache_dir, file_name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                # Deleted by someone else
+                continue
+            files.append((stat.st_mtime, stat.st_size, file_path))
+
+        total_size = sum(x[1] for x in files)
+        for (_, size, file_path) in sorted(files):
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        self.evict(0)
+
+    def _get_file_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def __repr__(self):
+        return utils.print_object(self)
+
+
+def get_feature_options(options, feature_name):
+    """
+    Returns the processing options object that applies to a feature, or
+    None if only the global options apply.
+
+    See OPTIONS_BY_FEATURE_PREFIX
+    """
+    for prefix, options_path in OPTIONS_BY_FEATURE_PREFIX:
+        if feature_name == prefix or feature_name.startswith(prefix + '.'):
+            temp = options
+            for attribute in options_path.split('.'):
+                temp = getattr(temp, attribute)
+            return temp
+
+    return None
+
+
+def get_normalized_worm_hash(nw):
+    """
+    Hash of the normalized worm data that features are computed from.
+
+    Derived values (angles, length, area) are not included as they are
+    computed from the skeleton and contours.
+    """
+    h = hashlib.sha1()
+    for attribute in ['skeleton', 'ventral_contour', 'dorsal_contour',
+                      'widths']:
+        _update_hash(h, getattr(nw, attribute, None))
+
+    video_info = nw.video_info
+    for attribute in ['fps', 'ventral_mode', 'frame_code']:
+        _update_hash(h, getattr(video_info, attribute, None))
+
+    return h.hexdigest()
+
+
+def _update_hash(h, value, shallow=False):
+    """
+    Add a value to a hashlib object.
+
+    Parameters
+    ----------
+    h : hashlib hash object
+    value :
+        Can be a numpy array, a number, a string, None, a list, tuple or
+        dict of these, or an object whose attributes are any of these.
+    shallow : bool
+        If True, attributes of an object that are themselves objects
+        (e.g. nested options) are skipped.
+    """
+    if isinstance(value, np.ndarray):
+        h.update(('array%s%s' % (value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(('%s%d' % (type(value).__name__, len(value))).encode())
+        for x in value:
+            _update_hash(h, x)
+    elif isinstance(value, dict):
+        h.update(('dict%d' % len(value)).encode())
+        for key in sorted(value):
+            _update_hash(h, key)
+            _update_hash(h, value[key])
+    elif hasattr(value, '__dict__'):
+        h.update(type(value).__name__.encode())
+        d = value.__dict__
+        for key in sorted(d):
+            if shallow and hasattr(d[key], '__dict__'):
+                continue
+            _update_hash(h, key)
+            _update_hash(h, d[key])
+    else:
+        h.update(repr(value).encode())
@@ -42,6 +42,11 @@ class FeatureProcessingOptions(object):
         # that the behavior will not match even if this value is set to True.
         self.mimic_old_behaviour = True
 
+        # If True the arenas of path.duration are built as sparse matrices,
+        # which only store the visited parts of the arena. The dense arena
+        # can get very large for worms that roam the whole plate.
+        self.use_sparse_arenas = True
+
         self.locomotion = LocomotionOptions()
         self.posture = PostureOptions()
 
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Dependency aware scheduling of feature computation.
+
+Features request other features while they are being computed (see
+generic_features.Feature.get_feature). Left alone, WormFeatures resolves
+these requests recursively, one feature at a time. This module makes the
+dependencies explicit so that independent branches of the feature graph
+(e.g. morphology, path duration and curvature, the posture eigen
+projections and the locomotion velocities) can be computed concurrently.
+
+The graph is built from the 'dependencies' column of features_list.csv
+plus the implied parent feature, i.e. 'path.duration' for
+'path.duration.head'.
+
+Functions
+---------------------------------------
+get_dependency_graph
+get_computation_order
+compute_features
+
+"""
+
+import collections
+import copy
+import multiprocessing
+import multiprocessing.pool
+
+from six.moves import queue
+
+from .. import utils
+from . import generic_features
+
+
+def get_dependency_graph(specs):
+    """
+    Build the feature dependency graph.
+
+    Parameters
+    ----------
+    specs : OrderedDict of worm_features.FeatureProcessingSpec
+        Keys are the feature names
+
+    Returns
+    -------
+    OrderedDict
+        Keys are the feature names, values are lists of the names of the
+        features that need to be computed before the key feature.
+
+    """
+    graph = collections.OrderedDict()
+    for feature_name in specs:
+        dependencies = []
+
+        if '.' in feature_name:
+            parent_name = generic_features.get_parent_feature_name(
+                feature_name)
+            if parent_name in specs:
+                dependencies.append(parent_name)
+
+        for dependency in specs[feature_name].dependencies:
+            if dependency not in specs:
+                raise KeyError('Dependency "%s" of "%s" not found in the '
+                               'feature specifications' %
+                               (dependency, feature_name))
+            if dependency not in dependencies:
+                dependencies.append(dependency)
+
+        graph[feature_name] = dependencies
+
+    return graph
+
+
+def get_computation_order(graph, feature_names):
+    """
+    Returns the requested features and all of their dependencies, with
+    each feature placed after the features it depends on.
+
+    This is the same order in which the features are computed when
+    resolving the requests recursively (i.e. serially).
+
+    Parameters
+    ----------
+    graph : OrderedDict
+        Output of get_dependency_graph()
+    feature_names : list of strings
+
+    Returns
+    -------
+    list of strings
+
+    """
+    order = []
+    # Features currently on the stack, used to detect cycles
+    visiting = set()
+
+    def visit(feature_name):
+        if feature_name in order:
+            return
+        if feature_name in visiting:
+            raise Exception('Circular feature dependency involving "%s"' %
+                            feature_name)
+        visiting.add(feature_name)
+        for dependency in graph[feature_name]:
+            visit(dependency)
+        visiting.remove(feature_name)
+        order.append(feature_name)
+
+    for feature_name in feature_names:
+        visit(feature_name)
+
+    return order
+
+
+def compute_features(wf, feature_names, n_workers, use_processes=False):
+    """
+    Compute features concurrently, running each feature as soon as the
+    features it depends on have been computed.
+
+    Computed features are logged in wf as internal requests. The caller is
+    responsible for flagging the features the user actually asked for (e.g.
+    by calling wf.get_features()).
+
+    Parameters
+    ----------
+    wf : worm_features.WormFeatures
+    feature_names : list of strings
+    n_workers : int
+        Number of threads or processes to use
+    use_processes : bool (default False)
+        If True a process pool is used instead of a thread pool. The
+        normalized worm and options are sent to each process once. Only
+        supported for features computed from a NormalizedWorm (not for
+        features loaded from disk).
+
+    Returns
+    -------
+    OrderedDict
+        Names of the features that failed to compute (keys) and the
+        exception that was raised (values). Features that depend on a
+        failed feature are still attempted.
+
+    """
+    graph = get_dependency_graph(wf.specs)
+    order = get_computation_order(graph, feature_names)
+
+    # For each feature, the dependencies that are still being computed
+    pending = collections.OrderedDict()
+    dependents = collections.defaultdict(list)
+    for feature_name in order:
+        pending[feature_name] = set(
+            x for x in graph[feature_name] if x not in wf._features)
+        for dependency in graph[feature_name]:
+            dependents[dependency].append(feature_name)
+
+    if use_processes:
+        if hasattr(wf, 'h'):
+            raise ValueError('Features loaded from disk can not be computed '
+                             'in separate processes')
+        template = copy.copy(wf)
+        template._features = collections.OrderedDict()
+        template.timer = utils.ElementTimer()
+        pool = multiprocessing.Pool(n_workers, initializer=_init_worker,
+                                    initargs=(template,))
+    else:
+        pool = multiprocessing.pool.ThreadPool(n_workers)
+
+    # Completed features are passed back to this thread as
+    # (feature_name, result, exception)
+    completed = queue.Queue()
+
+    def submit(feature_name):
+        def on_success(result):
+            completed.put((feature_name, result, None))
+
+        def on_error(e):
+            completed.put((feature_name, None, e))
+
+        if use_processes:
+            parent_features = dict((x, wf._features[x])
+                                   for x in graph[feature_name]
+                                   if x in wf._features)
+            pool.apply_async(_compute_in_worker,
+                             (feature_name, parent_features),
+                             callback=on_success, error_callback=on_error)
+        else:
+            pool.apply_async(wf._get_and_log_feature, (feature_name, True),
+                             callback=on_success, error_callback=on_error)
+
+    failures = collections.OrderedDict()
+    ready = [x for x in order if x not in wf._features and not pending[x]]
+    n_running = 0
+
+    try:
+        while ready or n_running:
+            for feature_name in ready:
+                submit(feature_name)
+                n_running += 1
+            ready = []
+
+            feature_name, result, e = completed.get()
+            n_running -= 1
+            if e is not None:
+                failures[feature_name] = e
+            elif use_processes:
+                _log_worker_features(wf, result)
+
+            for dependent in dependents[feature_name]:
+                pending[dependent].discard(feature_name)
+                if not pending[dependent] and dependent not in wf._features:
+                    ready.append(dependent)
+
+            # Keep the submission order stable from run to run
+            ready.sort(key=order.index)
+    finally:
+        pool.terminate()
+
+    # Restore the order in which the features would have been logged
+    # had they been computed serially
+    logged_features = wf._features
+    wf._features = collections.OrderedDict(
+        (x, logged_features[x]) for x in order if x in logged_features)
+    for feature_name in logged_features:
+        if feature_name not in wf._features:
+            wf._features[feature_name] = logged_features[feature_name]
+
+    return failures
+
+
+def _log_worker_features(wf, features):
+    """
+    Add features computed in a worker process to wf.
+    """
+    for feature_name in features:
+        if feature_name not in wf._features:
+            temp = features[feature_name]
+            wf._features[feature_name] = temp
+            wf.timer.names.append(feature_name)
+            wf.timer.times.append(temp.computation_time)
+
+
+# WormFeatures shell in a worker process, set by _init_worker
+_worker_wf = None
+
+
+def _init_worker(wf):
+    global _worker_wf
+    _worker_wf = wf
+
+
+def _compute_in_worker(feature_name, parent_features):
+    """
+    Returns
+    -------
+    dict
+        All features computed in this call, which may include undeclared
+        dependencies of the requested feature
+    """
+    wf = copy.copy(_worker_wf)
+    wf._features = collections.OrderedDict(parent_features)
+    wf._get_and_log_feature(feature_name, internal_request=True)
+    return dict((x, wf._features[x]) for x in wf._features
+                if x not in parent_features)
@@ -31,11 +31,19 @@ from . import generic_features
 from .generic_features import Feature
 from .. import utils
 
+# The number of windows whose spectra are computed at once
+FFT_BATCH_SIZE = 64
+
+
 class BendHelper(object):
     def h__getBendData(self, avg_bend_angles, bound_info, options, fps):
         """
         Compute the bend amplitude and frequency.
 
+        The frames are grouped by the length of their bounding window, and
+        the spectra of each group are computed together, FFT_BATCH_SIZE
+        windows at a time.
+
         Parameters
         ----------
         avg_bend_angles: numpy.array
@@ -88,64 +96,98 @@ class BendHelper(object):
         right_bounds = right_bounds.astype(int)
         left_bounds = left_bounds.astype(int)
 
-        for iFrame in np.flatnonzero(~is_bad_mask):
-            windowed_data = avg_bend_angles[
-                left_bounds[iFrame]:right_bounds[iFrame]]
-            data_win_length = len(windowed_data)
-
-            #
-            # fft frequency and bandwidth
-            #
-            # Compute the real part of the STFT.
-            # These two steps take a lot of time ...
-
-            # New code:
-            fft_data = abs(np.fft.rfft(windowed_data, fft_n_samples))
-
-            # Find the peak frequency.
-            maxPeakI = np.argmax(fft_data)
-            maxPeak = fft_data[maxPeakI]
-
-            # NOTE: If this is true, we'll never bound the peak on the left.
-            # We are looking for a hump with a peak, not just a decaying
-            # signal.
-            if maxPeakI == 0:
-                continue
-
-            unsigned_freq = freq_scalar * maxPeakI
-
-            if not (min_freq <= unsigned_freq <= max_freq):
-                continue
-
-            peakStartI, peakEndI = \
-                self.h__getBandwidth(data_win_length,
-                                     fft_data,
-                                     maxPeakI,
-                                     INIT_MAX_I_FOR_BANDWIDTH)
-            
-            if np.isnan(peakStartI) or np.isnan(peakEndI):
-                #wrong indexes, next loop
-                continue
-
-            # Store data
-            #------------------------------------------------------------------
-            fenergy = fft_data**2
-            tot_energy = np.sum(fenergy)
-            peak_energy = np.sum(fenergy[peakStartI:peakEndI])
-
-            peak_amplitud_treshold = (max_amp_pct_bandwidth * maxPeak)
-            if not (# The minima can't be too big:
-                    fft_data[peakStartI] > peak_amplitud_treshold or
-                    fft_data[peakEndI] > peak_amplitud_treshold or
+        good_frames_I = np.flatnonzero(~is_bad_mask)
+        win_lengths = right_bounds[good_frames_I] - left_bounds[good_frames_I]
+
+        avg_bend_angles = np.asarray(avg_bend_angles, dtype=float)
+        stride = avg_bend_angles.strides[0]
+
+        for data_win_length in np.unique(win_lengths):
+            group_frames_I = good_frames_I[win_lengths == data_win_length]
+
+            # All windows of this length, as views into the data. The
+            # windows of the frames are then picked out of these.
+            all_windows = np.lib.stride_tricks.as_strided(
+                avg_bend_angles,
+                shape=(n_frames - data_win_length + 1, data_win_length),
+                strides=(stride, stride))
+
+            for start in range(0, group_frames_I.size, FFT_BATCH_SIZE):
+                frames_I = group_frames_I[start:start + FFT_BATCH_SIZE]
+                windowed_data = all_windows[left_bounds[frames_I]]
+                row_I = np.arange(frames_I.size)
+
+                #
+                # fft frequency and bandwidth
+                #
+                # Compute the real part of the STFT.
+                # These two steps take a lot of time ...
+                fft_data = np.abs(np.fft.rfft(windowed_data, fft_n_samples,
+                                              axis=1))
+
+                # Find the peak frequency.
+                max_peak_I = np.argmax(fft_data, axis=1)
+                max_peak = fft_data[row_I, max_peak_I]
+
+                unsigned_freq = freq_scalar * max_peak_I
+
+                # NOTE: If max_peak_I is 0, we'll never bound the peak on the
+                # left. We are looking for a hump with a peak, not just a
+                # decaying signal.
+                keep = (max_peak_I != 0) & (min_freq <= unsigned_freq) & \
+                    (unsigned_freq <= max_freq)
+
+                peak_start_I, peak_end_I = \
+                    self.h__getBandwidth(data_win_length,
+                                         fft_data[keep],
+                                         max_peak_I[keep],
+                                         INIT_MAX_I_FOR_BANDWIDTH)
+
+                # Frames without a bandwidth are dropped
+                has_bandwidth = (peak_start_I != -1) & (peak_end_I != -1)
+                keep[keep] = has_bandwidth
+                peak_start_I = peak_start_I[has_bandwidth]
+                peak_end_I = peak_end_I[has_bandwidth]
+
+                frames_I = frames_I[keep]
+                if frames_I.size == 0:
+                    continue
+                fft_data = fft_data[keep]
+                max_peak_I = max_peak_I[keep]
+                max_peak = max_peak[keep]
+                unsigned_freq = unsigned_freq[keep]
+                windowed_data = windowed_data[keep]
+                row_I = np.arange(frames_I.size)
+
+                # Store data
+                #--------------------------------------------------------------
+                fenergy = fft_data**2
+                tot_energy = np.sum(fenergy, axis=1)
+                # The peaks are usually well below the end of the spectra
+                peak_fenergy = fenergy[:, :peak_end_I.max()]
+                freq_I = np.arange(peak_fenergy.shape[1])
+                in_peak = (freq_I >= peak_start_I[:, None]) & \
+                    (freq_I < peak_end_I[:, None])
+                peak_energy = np.sum(np.where(in_peak, peak_fenergy, 0),
+                                     axis=1)
+
+                peak_amplitud_treshold = (max_amp_pct_bandwidth * max_peak)
+                is_good = ~(
+                    # The minima can't be too big:
+                    (fft_data[row_I, peak_start_I] > peak_amplitud_treshold) |
+                    (fft_data[row_I, peak_end_I] > peak_amplitud_treshold) |
                     # Needs to have enough energy:
-                    (peak_energy < (peak_energy_threshold * tot_energy))
-                    ):
+                    (peak_energy < (peak_energy_threshold * tot_energy)))
 
                 # Convert the peak to a time frequency.
-                dataSign = np.sign(np.nanmean(windowed_data))  # sign the data
-                amps[iFrame] = (2 * fft_data[maxPeakI] /
-                                data_win_length) * dataSign
-                freqs[iFrame] = unsigned_freq * dataSign
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', category=RuntimeWarning)
+                    # sign the data
+                    data_sign = np.sign(np.nanmean(windowed_data[is_good],
+                                                   axis=1))
+                amps[frames_I[is_good]] = (
+                    2 * max_peak[is_good] / data_win_length) * data_sign
+                freqs[frames_I[is_good]] = unsigned_freq[is_good] * data_sign
 
         return amps, freqs
 
@@ -160,6 +202,9 @@ class BendHelper(object):
         range of frequencies, as execution time is proportional to the length
         of the input data.  If this fails we use the full data set.
 
+        All spectra come from windows of the same length, and are processed
+        together.
+
         Called by: h__getBendData
 
         Parameters
@@ -168,11 +213,11 @@ class BendHelper(object):
           Length of real data (ignoring zero padding) that
           went into computing the FFT
 
-        fft_data
-          Output of the fft function
+        fft_data : numpy.array [n_windows x n_freqs]
+          Output of the fft function, one row per window
 
-        max_peak_I
-          Location (index) of the maximum of fft_data
+        max_peak_I : numpy.array [n_windows]
+          Location (index) of the maximum of each row of fft_data
 
         INIT_MAX_I_FOR_BANDWIDTH
           See code
@@ -180,9 +225,11 @@ class BendHelper(object):
 
         Returns
         -------
-        peak_start_I: scalar
+        peak_start_I: numpy.array [n_windows]
 
-        peak_end_I: scalar
+        peak_end_I: numpy.array [n_windows]
+
+        Invalid entries are indicated by -1.
 
 
         Notes
@@ -195,54 +242,71 @@ class BendHelper(object):
 
         """
 
-        peakWinSize = round(np.sqrt(data_win_length))
+        peakWinSize = int(round(np.sqrt(data_win_length)))
+
+        n_windows = fft_data.shape[0]
+        peak_start_I = np.full(n_windows, -1, dtype=int)
+        peak_end_I = np.full(n_windows, -1, dtype=int)
 
         # Find the peak bandwidth.
-        if max_peak_I < INIT_MAX_I_FOR_BANDWIDTH:
-            # NOTE: It is incorrect to filter by the maximum here, as we want to
-            # allow matching a peak that will later be judged invalid. If we
-            # filter here we may find another smaller peak which will not be
-            # judged invalid later on.
-            min_peaks, min_peaks_I = utils.separated_peaks(
-                fft_data[:INIT_MAX_I_FOR_BANDWIDTH],
-                peakWinSize,
-                use_max=False,
-                value_cutoff=np.inf)
-
-            del min_peaks   # this part of max_peaks_dist's return is unused
-
-            # TODO: This is wrong, replace add find to utils ...
-            peak_start_I = min_peaks_I[utils.find(min_peaks_I < max_peak_I, 1)]
-            peak_end_I = min_peaks_I[utils.find(min_peaks_I > max_peak_I, 1)]
-        else:
-            peak_start_I = np.array([])
-            peak_end_I = np.array([])
+        #
+        # NOTE: It is incorrect to filter by the maximum here, as we want to
+        # allow matching a peak that will later be judged invalid. If we
+        # filter here we may find another smaller peak which will not be
+        # judged invalid later on.
+        use_init = max_peak_I < INIT_MAX_I_FOR_BANDWIDTH
+        self.h__getBorderingMinima(
+            fft_data[use_init, :INIT_MAX_I_FOR_BANDWIDTH], peakWinSize,
+            max_peak_I[use_init], use_init, peak_start_I, peak_end_I)
 
         # NOTE: Besides checking for an empty value, we also need to ensure that
         # the minimum didn't come too close to the data border, as more data
         # could invalidate the result we have.
         #
         # NOTE: In order to save time we only look at a subset of the FFT data.
-        if (peak_end_I.size == 0) | \
-                (peak_end_I + peakWinSize >= INIT_MAX_I_FOR_BANDWIDTH):
-            # If true, then rerun on the full set of data
-            [min_peaks, min_peaks_I] = utils.separated_peaks(
-                fft_data, peakWinSize, use_max=False, value_cutoff=np.inf)
+        #
+        # NOTE: An empty value doesn't actually lead to a rerun, as this has
+        # always been tested as an empty array, which is False. This is kept
+        # so that the results don't change. This includes the windows for
+        # which we didn't look for the bandwidth above.
+        rerun = (peak_end_I != -1) & \
+            (peak_end_I + peakWinSize >= INIT_MAX_I_FOR_BANDWIDTH)
+        peak_start_I[rerun] = -1
+        peak_end_I[rerun] = -1
+        self.h__getBorderingMinima(
+            fft_data[rerun], peakWinSize, max_peak_I[rerun], rerun,
+            peak_start_I, peak_end_I)
+
+        return (peak_start_I, peak_end_I)
+
+    @staticmethod
+    def h__getBorderingMinima(fft_data, peak_win_size, max_peak_I, rows_mask,
+                              peak_start_I, peak_end_I):
+        """
+        Find the minimum 'peaks' to the left and right of the maximum of
+        each row of fft_data, and store them in peak_start_I and peak_end_I
+        at rows_mask.
 
-            del(min_peaks)  # This part of max_peaks_dist's return is unused
+        As before, the first minimum of the row is used on either side,
+        and rows with no minimum on a side are left as they are.
+        """
+        if fft_data.shape[0] == 0:
+            return
 
-            peak_start_I = min_peaks_I[utils.find(min_peaks_I < max_peak_I, 1)]
-            peak_end_I = min_peaks_I[utils.find(min_peaks_I > max_peak_I, 1)]
+        is_min_peak = utils.separated_peaks_2d(
+            fft_data, peak_win_size, use_max=False,
+            value_cutoff=np.full(fft_data.shape[0], np.inf))
 
-        assert peak_start_I.size <= 1
-        assert peak_end_I.size <= 1
-        
-        #return an array it is problematic, and can give rise to deprecation errors. Let's return a tuple instead.
-        peak_start_Int = int(peak_start_I[0]) if peak_start_I.size == 1 else np.nan
-        peak_end_Int = int(peak_end_I[0]) if peak_end_I.size == 1 else np.nan
+        freq_I = np.arange(fft_data.shape[1])
+        is_before = is_min_peak & (freq_I < max_peak_I[:, None])
+        is_after = is_min_peak & (freq_I > max_peak_I[:, None])
 
-        # TODO: Why is this not a tuple - tuple would be more consistent
-        return (peak_start_Int, peak_end_Int)
+        rows_I = np.flatnonzero(rows_mask)
+        has_start = is_before.any(axis=1)
+        has_end = is_after.any(axis=1)
+        peak_start_I[rows_I[has_start]] = \
+            np.argmax(is_before[has_start], axis=1)
+        peak_end_I[rows_I[has_end]] = np.argmax(is_after[has_end], axis=1)
 
 class LocomotionBend(object):
     """
@@ -484,6 +548,45 @@ class LocomotionCrawlingBends(BendHelper):
 #%%
 
 
+def h__getAmplitudes(nose_bend_angle_d):
+    """
+    The implementation of LocomotionForagingBends.h__getAmplitudes and
+    ForagingBends.h__getAmplitudes.
+
+    The maxima and minima of all stretches are computed at once with
+    np.maximum.reduceat and np.minimum.reduceat, and then repeated over the
+    frames of each stretch.
+
+    """
+    n_frames = len(nose_bend_angle_d)
+
+    # Suppress warnings related to finding the sign of a numpy array that
+    # may contain NaN values.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        data_sign = np.sign(nose_bend_angle_d)
+    sign_change_I = np.flatnonzero(data_sign[1:] != data_sign[:-1])
+
+    start_I = np.concatenate([[0], sign_change_I + 1])
+    end_I = np.concatenate([sign_change_I + 1, [n_frames]])
+
+    # For each stretch, get max or min, depending on whether the data is
+    # positive or negative ...
+    start_values = nose_bend_angle_d[start_I]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        chunk_amps = np.where(start_values > 0,
+                              np.maximum.reduceat(nose_bend_angle_d, start_I),
+                              np.minimum.reduceat(nose_bend_angle_d, start_I))
+
+    # All NaN values are considered sign changes, so each NaN is a stretch
+    # of its own (and the other stretches contain no NaN values). We don't
+    # want them considered, so they are left as NaN.
+    chunk_amps[np.isnan(start_values)] = np.NaN
+
+    return np.repeat(chunk_amps, end_I - start_I)
+
+
 class LocomotionForagingBends(object):
 
     """
@@ -760,45 +863,7 @@ class LocomotionForagingBends(object):
         (indentation is used here to line up the returned array for clarity)
 
         """
-        n_frames = len(nose_bend_angle_d)
-
-        # Suppress warnings related to finding the sign of a numpy array that
-        # may contain NaN values.
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            data_sign = np.sign(nose_bend_angle_d)
-        sign_change_I = np.flatnonzero(data_sign[1:] != data_sign[:-1])
-
-        start_I = np.concatenate([[0], sign_change_I + 1])
-        stop_I = np.concatenate([sign_change_I, [n_frames - 1]])
-
-        # All NaN values are considered sign changes,
-        # but we don't want them considered that way.
-        # So create a mask of items to be removed:
-        mask = np.isnan(nose_bend_angle_d[start_I])
-        # Keep only those items NOT in the mask:
-        start_I = start_I[np.flatnonzero(~mask)]
-        stop_I = stop_I[np.flatnonzero(~mask)]
-
-        # Python's array index notation requires that we specify one PAST the
-        # index of the last entry in the "run"
-        end_I = stop_I + 1
-
-        amps = np.empty(n_frames) * np.NaN
-        # For each chunk, get max or min, depending on whether the data is positive
-        # or negative ...
-        for i_chunk in range(len(start_I)):
-            cur_start = start_I[i_chunk]
-            cur_end = end_I[i_chunk]
-
-            if nose_bend_angle_d[cur_start] > 0:
-                amps[cur_start:cur_end] = max(
-                    nose_bend_angle_d[cur_start:cur_end])
-            else:
-                amps[cur_start:cur_end] = min(
-                    nose_bend_angle_d[cur_start:cur_end])
-
-        return amps
+        return h__getAmplitudes(nose_bend_angle_d)
 
     @classmethod
     def from_disk(cls, foraging_ref):
@@ -1127,45 +1192,7 @@ class ForagingBends(Feature):
         (indentation is used here to line up the returned array for clarity)
 
         """
-        n_frames = len(nose_bend_angle_d)
-
-        # Suppress warnings related to finding the sign of a numpy array that
-        # may contain NaN values.
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            data_sign = np.sign(nose_bend_angle_d)
-        sign_change_I = np.flatnonzero(data_sign[1:] != data_sign[:-1])
-
-        start_I = np.concatenate([[0], sign_change_I + 1])
-        stop_I = np.concatenate([sign_change_I, [n_frames - 1]])
-
-        # All NaN values are considered sign changes,
-        # but we don't want them considered that way.
-        # So create a mask of items to be removed:
-        mask = np.isnan(nose_bend_angle_d[start_I])
-        # Keep only those items NOT in the mask:
-        start_I = start_I[np.flatnonzero(~mask)]
-        stop_I = stop_I[np.flatnonzero(~mask)]
-
-        # Python's array index notation requires that we specify one PAST the
-        # index of the last entry in the "run"
-        end_I = stop_I + 1
-
-        amps = np.empty(n_frames) * np.NaN
-        # For each chunk, get max or min, depending on whether the data is positive
-        # or negative ...
-        for i_chunk in range(len(start_I)):
-            cur_start = start_I[i_chunk]
-            cur_end = end_I[i_chunk]
-
-            if nose_bend_angle_d[cur_start] > 0:
-                amps[cur_start:cur_end] = max(
-                    nose_bend_angle_d[cur_start:cur_end])
-            else:
-                amps[cur_start:cur_end] = min(
-                    nose_bend_angle_d[cur_start:cur_end])
-
-        return amps
+        return h__getAmplitudes(nose_bend_angle_d)
 
     @classmethod
     def from_schafer_file(cls, wf, feature_name):
@@ -1551,41 +1578,18 @@ class CrawlingBendsBoundInfo(object):
 
         BAD_INDEX_VALUE = -1
 
-        # For each element in the array, these values indicate which
-        # sign change index to use ...
-        left_sign_change_I = np.zeros(n_frames)
-
-        left_sign_change_I[sign_change_I + 1] = 1
-        # We increment at values to the right of the sign changes
-        left_sign_change_I = left_sign_change_I.cumsum() - 1
-
-        # NOTE: We need to do this after the cumsum :/
-        left_sign_change_I[:sign_change_I[0]] = BAD_INDEX_VALUE
-        # The previous line is a little Matlab trick in which
-        # something like:
-        # 0  1 0 1 0 0 1 0 0 <= sign change indices
-        # 0  1 2 3 4 5 6 7 8 <= indices
-        # becomes:
-        # -1 0 0 1 1 1 2 2 2 <= -1 is off limits, values are inclusive
-        #
-        # so now at each frame, we get the index of the value that
-        # is to the left.
+        # For each frame, these values indicate which sign change index to
+        # use. The sign change to the right of a frame is the first one at or
+        # after the frame, which we get for all frames at once with
+        # searchsorted. The one to the left is the one before that.
         #
-        # From above; sign_change_I = [0 3 6]
-        #
-        # So at index 5, the next sign change is at sign_change_I[left_change_I[5]]
-        # or sign_change_I[1] => 3
-
-        # This does:
         # 0  1 0 1 0 0 1  0  0 <= sign change indices
         # 0  1 2 3 4 5 6  7  8 <= indices
-        # 0  0 1 1 2 2 2 -1 -1 <= indices of sign change to right
-        right_sign_change_I = np.zeros(n_frames)
-        right_sign_change_I[sign_change_I[:-1] + 1] = 1
-        right_sign_change_I[0] = 1
-        right_sign_change_I = right_sign_change_I.cumsum() - 1
-        # We must have nothing to the right of the last change:
-        right_sign_change_I[sign_change_I[-1] + 1:] = BAD_INDEX_VALUE
+        # -1 0 0 1 1 1 2  2  2 <= left_sign_change_I, -1 is off limits
+        # 0  0 1 1 2 2 2  3  3 <= right_sign_change_I, 3 is off limits
+        frames_I = np.arange(n_frames)
+        right_sign_change_I = np.searchsorted(sign_change_I, frames_I)
+        left_sign_change_I = right_sign_change_I - 1
 
         # Indices that each left_sign_change_I or right_sign_change_I points to
         left_values = sign_change_I
@@ -1595,92 +1599,92 @@ class CrawlingBendsBoundInfo(object):
         back_zeros_I = np.zeros(n_frames)
         back_zeros_I[:] = BAD_INDEX_VALUE
         front_zeros_I = np.zeros(n_frames)
-        back_zeros_I[:] = BAD_INDEX_VALUE
 
-        for iFrame in range(n_frames):
-            cur_left_index = left_sign_change_I[iFrame]
-            cur_right_index = right_sign_change_I[iFrame]
-
-            if cur_left_index == BAD_INDEX_VALUE or cur_right_index == BAD_INDEX_VALUE:
-                continue
-
-            # Convert from float to int
-            cur_left_index = int(cur_left_index)
-            cur_right_index = int(cur_right_index)
-
-            back_zero_I = left_values[cur_left_index]
-            front_zero_I = right_values[cur_right_index]
-
-            use_values = True
-
-            # Expand the zero-crossing window.
-            #----------------------------------
-            # Note from @JimHokanson:
-            #
-            # TODO: Fix and move this code to old config
-            #
-            # General problem, we specify a minimum acceptable window size,
-            # and the old code needlessly expands the window past this point
-            # by doing the following comparison:
-            #
-            # - distance from right to left > min_window_size?
-            #
-            #   The following code centers on 2x the larger of the following gaps:
-            #
-            #   - distance from left to center
-            #   - distance from right to center
-            #
-            #   So we should check if either of these is half ot the
-            #   required width.
-            #
-            # half-window sizes:
-            # left_window_size  = iFrame - back_zero_I
-            # right_window_size = front_zero_I - iFrame
-            #
-            # so in reality we should use:
-            #
-            # front_zero_I - iFrame < min_number_frames_for_bend/2 and
-            # iFrame - back_zero_I < min_number_frames_for_bend/2
-            #
-            # By not doing this, we overshoot the minimum window size that
-            # we need to use. Consider window sizes that are in terms of
-            # the minimum window size.
-            #
-            # i.e. 0.5w means the left or right window is half min_number_frames_for_bend
-            #
-            # Consider we have:
-            # 0.5w left
-            # 0.3w right
-            #
-            #   total 0.8w => not at 1w, thus old code should expand
-            #
-            #   But in reality, if we stopped now we would be at twice 0.5w
-
-            while (
-                    front_zero_I -
-                    back_zero_I +
-                    1) < min_number_frames_for_bend:
-                # Expand the smaller of the two windows
-                # -------------------------------------
-                #  left_window_size       right_window_size
-                if (iFrame - back_zero_I) < (front_zero_I - iFrame):
-                    # Expand to the left:
-                    cur_left_index = cur_left_index - 1
-                    if cur_left_index == BAD_INDEX_VALUE:
-                        use_values = False
-                        break
-                    back_zero_I = left_values[cur_left_index]
-                else:
-                    # Expand to the right:
-                    cur_right_index = cur_right_index + 1
-                    if cur_right_index >= n_sign_changes:
-                        use_values = False
-                        break
-                    front_zero_I = right_values[cur_right_index]
-
-            if use_values:
-                back_zeros_I[iFrame] = back_zero_I
-                front_zeros_I[iFrame] = front_zero_I
+        # We work on the frames that are bounded on both sides, and drop
+        # frames from these arrays as they are finished
+        is_bounded = (left_sign_change_I != BAD_INDEX_VALUE) & \
+            (right_sign_change_I < n_sign_changes)
+        cur_frames_I = frames_I[is_bounded]
+        cur_left_I = left_sign_change_I[is_bounded]
+        cur_right_I = right_sign_change_I[is_bounded]
+
+        back_zero_I = left_values[cur_left_I]
+        front_zero_I = right_values[cur_right_I]
+
+        # Expand the zero-crossing window.
+        #----------------------------------
+        # Note from @JimHokanson:
+        #
+        # TODO: Fix and move this code to old config
+        #
+        # General problem, we specify a minimum acceptable window size,
+        # and the old code needlessly expands the window past this point
+        # by doing the following comparison:
+        #
+        # - distance from right to left > min_window_size?
+        #
+        #   The following code centers on 2x the larger of the following gaps:
+        #
+        #   - distance from left to center
+        #   - distance from right to center
+        #
+        #   So we should check if either of these is half ot the
+        #   required width.
+        #
+        # half-window sizes:
+        # left_window_size  = iFrame - back_zero_I
+        # right_window_size = front_zero_I - iFrame
+        #
+        # so in reality we should use:
+        #
+        # front_zero_I - iFrame < min_number_frames_for_bend/2 and
+        # iFrame - back_zero_I < min_number_frames_for_bend/2
+        #
+        # By not doing this, we overshoot the minimum window size that
+        # we need to use. Consider window sizes that are in terms of
+        # the minimum window size.
+        #
+        # i.e. 0.5w means the left or right window is half min_number_frames_for_bend
+        #
+        # Consider we have:
+        # 0.5w left
+        # 0.3w right
+        #
+        #   total 0.8w => not at 1w, thus old code should expand
+        #
+        #   But in reality, if we stopped now we would be at twice 0.5w
+
+        while cur_frames_I.size != 0:
+            # Frames whose window is large enough are done
+            is_done = (front_zero_I - back_zero_I + 1) >= \
+                min_number_frames_for_bend
+            back_zeros_I[cur_frames_I[is_done]] = back_zero_I[is_done]
+            front_zeros_I[cur_frames_I[is_done]] = front_zero_I[is_done]
+
+            keep = ~is_done
+            cur_frames_I = cur_frames_I[keep]
+            cur_left_I = cur_left_I[keep]
+            cur_right_I = cur_right_I[keep]
+            back_zero_I = back_zero_I[keep]
+            front_zero_I = front_zero_I[keep]
+
+            # Expand the smaller of the two windows
+            # -------------------------------------
+            #  left_window_size       right_window_size
+            expand_left = (cur_frames_I - back_zero_I) < \
+                (front_zero_I - cur_frames_I)
+            cur_left_I = cur_left_I - expand_left
+            cur_right_I = cur_right_I + ~expand_left
+
+            # Frames that run out of sign changes keep invalid values
+            keep = (cur_left_I != BAD_INDEX_VALUE) & \
+                (cur_right_I < n_sign_changes)
+            cur_frames_I = cur_frames_I[keep]
+            cur_left_I = cur_left_I[keep]
+            cur_right_I = cur_right_I[keep]
+
+            back_zero_I = left_values[cur_left_I]
+            front_zero_I = right_values[cur_right_I]
 
         return [back_zeros_I, front_zeros_I]
 
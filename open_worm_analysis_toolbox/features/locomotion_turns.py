@@ -718,20 +718,22 @@ class OmegaTurns(object):
 
         is_good_th_direction_value = ~np.isnan(th_angle)
 
-        lastAngle = th_angle[0]
-        gapCounter = 0
+        # For each frame, the last valid frame before it. Frame 0 is used if
+        # there is none, as the first difference is taken relative to it.
+        frame_I = np.arange(n_frames)
+        last_good_I = np.maximum.accumulate(
+            np.where(is_good_th_direction_value, frame_I, 0))
+        previous_good_I = np.concatenate(([0], last_good_I[:-1]))
 
-        th_angle_diff_temp = np.empty(th_angle.size) * np.NAN
-        for iFrame in range(n_frames)[1:]:   # formerly 2:n_frames
-            if is_good_th_direction_value[iFrame]:
-                th_angle_diff_temp[iFrame] = th_angle[iFrame] - lastAngle
-                gapCounter = 0
-                lastAngle = th_angle[iFrame]
-            else:
-                gapCounter += 1
+        # The number of invalid frames in between
+        gap_lengths = frame_I - previous_good_I - 1
 
-            if gapCounter > MAX_FRAME_JUMP_FOR_ANGLE_DIFF:
-                lastAngle = np.NaN
+        th_angle_diff_temp = np.empty(th_angle.size) * np.NAN
+        use_diff = is_good_th_direction_value & \
+            (gap_lengths <= MAX_FRAME_JUMP_FOR_ANGLE_DIFF)
+        use_diff[0] = False   # formerly 2:n_frames
+        th_angle_diff_temp[use_diff] = th_angle[use_diff] - \
+            th_angle[previous_good_I[use_diff]]
 
         #???? - what does this really mean ??????
         # I think this basically says, instead of looking for gaps in the original
@@ -746,24 +748,18 @@ class OmegaTurns(object):
         with warnings.catch_warnings():
             warnings.simplefilter('ignore')
 
-            positiveJumps = np.flatnonzero(th_angle_diff_temp > 180)
-            negativeJumps = np.flatnonzero(th_angle_diff_temp < -180)
-
-        # For example data, these are the indices I get ...
-        #P - 4625
-        #N - 3634, 4521
+            is_positive_jump = th_angle_diff_temp > 180
+            is_negative_jump = th_angle_diff_temp < -180
 
         # Fix the th_angles by unwrapping
         #----------------------------------------------------
         # NOTE: We are using the identified jumps from the fixed angles to unwrap
         # the original angle vector
-        # subtract 2pi from remainging data after positive jumps
-        for j in range(len(positiveJumps)):
-            th_angle[positiveJumps[j]:] = th_angle[positiveJumps[j]:] - 2 * 180
-
+        # subtract 2pi from remainging data after positive jumps, and
         # add 2pi to remaining data after negative jumps
-        for j in range(len(negativeJumps)):
-            th_angle[negativeJumps[j]:] = th_angle[negativeJumps[j]:] + 2 * 180
+        n_wraps = np.cumsum(is_negative_jump.astype(int) -
+                            is_positive_jump.astype(int))
+        th_angle = th_angle + n_wraps * (2 * 180)
 
         # Fix the th_angles through interpolation
         #----------------------------------------------------
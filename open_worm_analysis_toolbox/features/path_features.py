@@ -7,6 +7,7 @@ TODO: Create basic list
 """
 
 import numpy as np
+from scipy import sparse
 
 from .. import config, utils
 
@@ -180,69 +181,14 @@ class Duration(Feature):
         arena_size = (int(y_scaled_max - y_scaled_min + 1), int(x_scaled_max - x_scaled_min + 1))
         ar = Arena(sx, sy, arena_size)
 
-        #----------------------------------------------------------------------
-        def h__populateArenas(arena_size, sys, sxs, s_points, isnan_mask):
-            """
-
-            Attributes:
-            ----------------------------
-            arena_size: list
-              [2]
-            sys : numpy.int32
-              [49, n_frames]
-            sxs : numpy.int32
-              [49, n_frames]
-            s_points: list
-              [4]
-            isnan_mask: bool
-              [49, n_frames]
-
-
-            """
-
-            # NOTE: All skeleton points have been rounded to integer values for
-            # assignment to the matrix based on their values being treated as
-            # indices
-
-            # Filter out frames which have no valid values
-            #----------------------------------------------------------
-            frames_run = np.flatnonzero(np.any(~isnan_mask, axis=0))
-            n_frames_run = len(frames_run)
-
-            # 1 area for each set of skeleton indices
-            #-----------------------------------------
-            n_points = len(s_points)
-            arenas = [None] * n_points
-
-            # Loop over the different regions of the body
-            #------------------------------------------------
-            for iPoint in range(n_points):
-
-                temp_arena = np.zeros(arena_size)
-                s_indices = s_points[iPoint]
-
-                # For each frame, add +1 to the arena each time a chunk of the skeleton
-                # is located in that part
-                #--------------------------------------------------------------
-                for iFrame in range(n_frames_run):
-                    cur_frame = frames_run[iFrame]
-                    cur_x = sxs[s_indices[0]:s_indices[1], cur_frame]
-                    cur_y = sys[s_indices[0]:s_indices[1], cur_frame]
-                    
-                    temp_arena[cur_y, cur_x] += 1
-
-                # Flip y-axis to maintain consistency with Matlab
-                arenas[iPoint] = temp_arena[::-1, :]
-
-            return arenas
-        #----------------------------------------------------------------------
-
         temp_arenas = h__populateArenas(
             arena_size,
             scaled_zeroed_sy,
             scaled_zeroed_sx,
             s_points,
-            isnan_mask)
+            isnan_mask,
+            options.mimic_old_behaviour,
+            options.use_sparse_arenas)
 
         # For looking at the data
         #------------------------------------
@@ -298,6 +244,86 @@ class Duration(Feature):
         return self
 
 
+def h__populateArenas(arena_size, sys, sxs, s_points, isnan_mask,
+                      count_once_per_frame, use_sparse_arenas=True):
+    """
+
+    Attributes:
+    ----------------------------
+    arena_size: list
+      [2]
+    sys : numpy.int32
+      [49, n_frames]
+    sxs : numpy.int32
+      [49, n_frames]
+    s_points: list
+      [4]
+    isnan_mask: bool
+      [49, n_frames]
+    count_once_per_frame: bool
+      If True, skeleton points of the same frame that fall in the
+      same part of the arena only count once (the old behaviour)
+    use_sparse_arenas: bool
+      If True the arenas are returned as sparse matrices
+
+    Returns:
+    ----------------------------
+    list of 4 arenas of shape arena_size
+      The number of times a skeleton point was in each part of the arena,
+      as scipy.sparse.coo_matrix if use_sparse_arenas (only the visited
+      parts are stored, as the full arena can be very large for worms that
+      roam the whole plate), or as dense numpy arrays otherwise.
+
+    """
+
+    # NOTE: All skeleton points have been rounded to integer values for
+    # assignment to the matrix based on their values being treated as
+    # indices
+
+    n_rows, n_cols = arena_size
+    n_cells = n_rows * n_cols
+
+    # Index of each point in the arena, with the y-axis flipped to
+    # maintain consistency with Matlab
+    cell_I = (n_rows - 1 - sys) * n_cols + sxs
+    frame_I = np.broadcast_to(np.arange(sxs.shape[1]), sxs.shape)
+
+    # 1 area for each set of skeleton indices
+    #-----------------------------------------
+    n_points = len(s_points)
+    arenas = [None] * n_points
+
+    # Loop over the different regions of the body
+    #------------------------------------------------
+    for iPoint in range(n_points):
+
+        s_indices = s_points[iPoint]
+        is_valid = ~isnan_mask[s_indices[0]:s_indices[1]]
+        cur_cell_I = cell_I[s_indices[0]:s_indices[1]][is_valid]
+
+        # Add +1 to the arena each time a chunk of the skeleton is
+        # located in that part
+        #--------------------------------------------------------------
+        if count_once_per_frame:
+            cur_frame_I = frame_I[s_indices[0]:s_indices[1]][is_valid]
+            frame_cell_I = np.unique(
+                cur_frame_I.astype(np.int64) * n_cells + cur_cell_I)
+            cur_cell_I = frame_cell_I % n_cells
+
+        if use_sparse_arenas:
+            visited_I, counts = np.unique(cur_cell_I, return_counts=True)
+
+            arenas[iPoint] = sparse.coo_matrix(
+                (counts.astype(float),
+                 (visited_I // n_cols, visited_I % n_cols)),
+                shape=arena_size)
+        else:
+            arenas[iPoint] = np.bincount(cur_cell_I, minlength=n_cells).\
+                reshape(arena_size).astype(float)
+
+    return arenas
+
+
 class DurationElement(object):
     """
     Old class, please delete
@@ -309,7 +335,18 @@ class DurationElement(object):
 
         if arena_coverage is None:
             return
-            
+
+        if sparse.issparse(arena_coverage):
+            # Indices into the flattened arena, in order
+            arena_coverage = arena_coverage.tocoo()
+            indices = arena_coverage.row.astype(np.int64) * \
+                arena_coverage.shape[1] + arena_coverage.col
+            I = np.argsort(indices)
+            is_visited = arena_coverage.data[I] != 0
+            self.indices = indices[I][is_visited]
+            self.times = arena_coverage.data[I][is_visited] / fps
+            return
+
         self.indices = np.flatnonzero(arena_coverage)
         self.times = arena_coverage.flat[self.indices] / fps
 
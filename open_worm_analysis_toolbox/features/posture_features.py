@@ -18,6 +18,7 @@ import cv2
 from . import generic_features
 from .generic_features import Feature
 from .. import config, utils
+from ..prefeatures.pre_features_helpers import WormParserHelpers
 from . import events
 
 
@@ -158,6 +159,130 @@ class BendSection(object):
 
 
 
+def h__countKinks(smoothed_bend_angles, length_threshold):
+    """
+    Count the kinks of each frame, i.e. the stretches of the worm along
+    which the bend angles have the same sign and that are at least
+    length_threshold long.
+
+    Parameters
+    ----------
+    smoothed_bend_angles : numpy.array
+        [n_angles x n_frames]
+    length_threshold : float
+
+    Returns
+    -------
+    n_kinks : numpy.array
+        [n_frames] The number of kinks of each frame
+    has_zero : numpy.array of bools
+        [n_frames] Frames with an angle of exactly 0, which isn't handled
+    has_inner_nan : numpy.array of bools
+        [n_frames] Frames with NaN values between the valid angles, which
+        aren't handled. Only NaN values at the ends of the worm are.
+
+    """
+    n_angles, n_frames = smoothed_bend_angles.shape
+
+    with np.errstate(invalid='ignore'):
+        dataSign = np.sign(smoothed_bend_angles)
+
+    # I don't expect that we'll ever actually reach 0
+    # The code for zero was a bit weird, it keeps counting if no sign
+    # change i.e. + + + 0 + + + => all +
+    #
+    # but it counts for both if sign change
+    # + + 0 - - - => 3 +s and 4 -s
+    has_zero = np.any(np.equal(dataSign, 0), axis=0)
+
+    # This code is nearly identical in getForaging
+    #-------------------------------------------------------
+    frame_I, start_I, end_I = utils.find_runs(dataSign)
+
+    # The last stretch of each frame ends one past the last angle
+    end_I[end_I == n_angles - 1] = n_angles
+
+    # All NaN values are considered sign changes, remove these ...
+    is_nan = np.isnan(smoothed_bend_angles[start_I, frame_I])
+
+    # The first and last valid stretch of each frame
+    first_start_I = np.full(n_frames, n_angles)
+    np.minimum.at(first_start_I, frame_I[~is_nan], start_I[~is_nan])
+    last_start_I = np.full(n_frames, -1)
+    np.maximum.at(last_start_I, frame_I[~is_nan], start_I[~is_nan])
+    last_end_I = np.full(n_frames, -1)
+    np.maximum.at(last_end_I, frame_I[~is_nan], end_I[~is_nan])
+
+    # The old code had a provision for having NaN values in the middle
+    # of the worm. I have not translated that feature to the newer code.
+    is_inner_nan = is_nan & (start_I > first_start_I[frame_I]) & \
+        (start_I < last_end_I[frame_I])
+    has_inner_nan = np.bincount(frame_I[is_inner_nan],
+                                minlength=n_frames) > 0
+
+    #-------------------------------------------------------
+    # End of identical code ...
+
+    frame_I = frame_I[~is_nan]
+    start_I = start_I[~is_nan]
+    end_I = end_I[~is_nan]
+
+    lengths = end_I - start_I + 1
+
+    # Adjust lengths for first and last:
+    # Basically we allow NaN values to count towards the length for the
+    # first and last stretches
+    is_first = start_I == first_start_I[frame_I]
+    is_last = start_I == last_start_I[frame_I]
+    I = is_first & (start_I != 0)  # Due to leading NaNs
+    lengths[I] = end_I[I] + 1
+    I = is_last & (end_I != n_angles)  # Due to trailing NaNs
+    lengths[I] = n_angles - start_I[I]
+
+    n_kinks = np.bincount(frame_I[lengths >= length_threshold],
+                          minlength=n_frames).astype(float)
+
+    return n_kinks, has_zero, has_inner_nan
+
+
+def h__getCoils(coil_start_mask, end_coil_mask, coil_frame_threshold):
+    """
+    Find the coils: a coil starts at a coil start frame and ends at the
+    next (possible) end frame. Coil start frames within a coil are
+    ignored.
+
+    Parameters
+    ----------
+    coil_start_mask : numpy.array of bools
+    end_coil_mask : numpy.array of bools
+        Should be True for the last frame, so that all coils are closed
+    coil_frame_threshold : int
+        The minimum number of frames of a coil
+
+    Returns
+    -------
+    starts : list
+    ends : list
+        The first and last frame of each coil
+
+    """
+    frame_I = np.arange(len(coil_start_mask))
+
+    # The last coil start and possible end at (or before) each frame. A
+    # frame is in a coil if the last coil start is more recent than the
+    # last end.
+    last_start_I = np.maximum.accumulate(np.where(coil_start_mask, frame_I,
+                                                  -1))
+    last_end_I = np.maximum.accumulate(np.where(end_coil_mask, frame_I, -1))
+    in_coil = last_start_I > last_end_I
+
+    _, start_I, end_I = utils.find_runs(in_coil)
+    is_coil = in_coil[start_I] & \
+        (end_I - start_I + 1 >= coil_frame_threshold)
+
+    return list(start_I[is_coil]), list(end_I[is_coil])
+
+
 def get_worm_kinks(features_ref):
     """
     Parameters
@@ -201,73 +326,28 @@ def get_worm_kinks(features_ref):
     #(np.any(np.logical_or(mask_pos,mask_neg),axis=0)).nonzero()[0]
 
     nan_mask = np.isnan(bend_angles)
+    frames_run = (~np.all(nan_mask, axis=0)).nonzero()[0]
 
-    for iFrame in (~np.all(nan_mask, axis=0)).nonzero()[0]:
-        smoothed_bend_angles = filters.convolve1d(
-            bend_angles[:, iFrame], gauss_filter, cval=0, mode='constant')
-
-        # This code is nearly identical in getForaging
-        #-------------------------------------------------------
-        n_frames = smoothed_bend_angles.shape[0]
-
-        with np.errstate(invalid='ignore'):
-            dataSign = np.sign(smoothed_bend_angles)
+    smoothed_bend_angles = filters.convolve1d(
+        bend_angles[:, frames_run], gauss_filter, axis=0, cval=0,
+        mode='constant')
 
-        if np.any(np.equal(dataSign, 0)):
-            # I don't expect that we'll ever actually reach 0
-            # The code for zero was a bit weird, it keeps counting if no sign
-            # change i.e. + + + 0 + + + => all +
-            #
-            # but it counts for both if sign change
-            # + + 0 - - - => 3 +s and 4 -s
+    n_kinks, has_zero, has_inner_nan = h__countKinks(smoothed_bend_angles,
+                                                     length_threshold)
 
+    # The frames are checked in order; the first problem found decides
+    is_problem = has_zero | has_inner_nan
+    if np.any(is_problem):
+        if has_zero[is_problem.nonzero()[0][0]]:
             # I had to change this to a warning and returning NaNs
             # to get my corner case unit tests working, i.e. the case
             # of a perfectly straight worm.  - @MichaelCurrie
             n_kinks_all[:] = np.NaN
             #raise Warning("Unhandled code case")
             return n_kinks_all
+        raise Exception("Unhandled code case")
 
-        sign_change_I = (
-            np.not_equal(dataSign[1:], dataSign[0:-1])).nonzero()[0]
-
-        end_I = np.concatenate(
-            (sign_change_I,
-             n_frames * np.ones(1, dtype=np.result_type(sign_change_I))))
-
-        wtf1 = np.zeros(1, dtype=np.result_type(sign_change_I))
-        wtf2 = sign_change_I + 1
-        start_I = np.concatenate((wtf1, wtf2))  # +2? due to inclusion rules???
-
-        # All NaN values are considered sign changes, remove these ...
-        keep_mask = np.logical_not(np.isnan(smoothed_bend_angles[start_I]))
-
-        start_I = start_I[keep_mask]
-        end_I = end_I[keep_mask]
-
-        # The old code had a provision for having NaN values in the middle
-        # of the worm. I have not translated that feature to the newer code. I
-        # don't think it will ever happen though for a valid frame, only on the
-        # edges should you have NaN values.
-        if start_I.size != 0 and \
-           np.any(np.isnan(smoothed_bend_angles[start_I[0]:end_I[-1]])):
-            raise Exception("Unhandled code case")
-
-        #-------------------------------------------------------
-        # End of identical code ...
-
-        lengths = end_I - start_I + 1
-
-        # Adjust lengths for first and last:
-        # Basically we allow NaN values to count towards the length for the
-        # first and last stretches
-        if lengths.size != 0:
-            if start_I[0] != 0:  # Due to leading NaNs
-                lengths[0] = end_I[0] + 1
-            if end_I[-1] != n_frames:  # Due to trailing NaNs
-                lengths[-1] = n_frames - start_I[-1]
-
-        n_kinks_all[iFrame] = np.sum(lengths >= length_threshold)
+    n_kinks_all[frames_run] = n_kinks
 
     timer.toc('posture.kinks')
 
@@ -320,28 +400,8 @@ def get_worm_coils(features_ref, midbody_distance):
     np_true = ~np_false
     end_coil_mask = np.concatenate((end_coil_mask, np_true))
 
-    in_coil = False
-    coil_frame_start = -1
-    n_coils = 0
-    n_frames_plus1 = len(frame_code) + 1
-
-    starts = []
-    ends = []
-
-    for iFrame in range(n_frames_plus1):
-        if in_coil:
-            if end_coil_mask[iFrame]:
-                n_coil_frames = iFrame - coil_frame_start
-                if n_coil_frames >= COIL_FRAME_THRESHOLD:
-                    n_coils += 1
-
-                    starts.append(coil_frame_start)
-                    ends.append(iFrame - 1)
-
-                in_coil = False
-        elif coil_start_mask[iFrame]:
-            in_coil = True
-            coil_frame_start = iFrame
+    starts, ends = h__getCoils(coil_start_mask, end_coil_mask,
+                               COIL_FRAME_THRESHOLD)
 
     if options.mimic_old_behaviour:
         if (len(starts) > 0) and (ends[-1] == len(frame_code) - 1):
@@ -389,39 +449,6 @@ class EccentricityAndOrientationProcessor(Feature):
         to get an estimate of the eccentricity.
         """
         
-        def _cnt_momentum(cnt):
-            moments = cv2.moments(cnt)
-            return moments['mu11'], moments['mu20'], moments['mu02']
-            
-        def _skel_momentum(skel):
-            mat_cov = np.cov(skel.T)
-            mu20 = mat_cov[0,0]
-            mu02 = mat_cov[1,1]
-            mu11 = mat_cov[0,1]
-            return mu11, mu20, mu02
-            
-            
-        def _momentum_eccentricty_orientation(mu11, mu20, mu02):
-            a1 = (mu20 + mu02) / 2
-            a2 = np.sqrt(4 * mu11**2 +
-                         (mu20 - mu02)**2) / 2
-
-            minor_axis = a1 - a2
-            major_axis = a1 + a2
-            
-            ecc = np.sqrt(1 - minor_axis / major_axis)
-            ang = np.arctan2(2 * mu11, (mu20 - mu02)) / 2
-            ang *= 180 / np.pi
-            return ecc, ang
-
-        def _box_eccentricity_orientation(skel):
-            (CMx, CMy), (L, W), angle = cv2.minAreaRect(skel)
-            if W > L:
-                L, W = W, L  # switch if width is larger than length
-                angle += 90 # this means that the angle is shifted too
-            quirkiness = np.sqrt(1 - W**2 / L**2)
-            return quirkiness, angle
-
         self.name = feature_name
 
         wf.timer.tic()
@@ -429,36 +456,143 @@ class EccentricityAndOrientationProcessor(Feature):
         #Try to use the contour, otherwise use the skeleton
         try:
             points = wf.nw.contour_without_redundant_points
-            _get_momentum = _cnt_momentum
+            _get_momentum = self.h__contourMoments
             
         except:
             points = wf.nw.skeleton
-            _get_momentum = _skel_momentum
+            _get_momentum = self.h__skeletonMoments
         
         
         
         # OpenCV does not like float64, this actually make sense for image
         # data where we do not require a large precition in the decimal part.
         # This could save quite a lot of space
+        # (The moments are computed here rather than with OpenCV, but the
+        # same precision is kept.)
         points = points.astype(np.float32)
-        
+
+        # All frames are computed at once; frames with any NaN are NaN
+        is_valid = ~np.any(np.isnan(points), axis=(0, 1))
+
         tot = points.shape[-1]
 
         eccentricity = np.full(tot, np.nan)
         orientation = np.full(tot, np.nan)
-        for ii in range(tot):
-            frame_points = points[:, :, ii]
-            
-            if ~np.any(np.isnan(frame_points)):
-                mu11, mu20, mu02 = _get_momentum(frame_points)
-                eccentricity[ii], orientation[ii] = \
-                _momentum_eccentricty_orientation(mu11, mu20, mu02)
-                
+        mu11, mu20, mu02 = _get_momentum(points[:, :, is_valid])
+        eccentricity[is_valid], orientation[is_valid] = \
+            self.h__momentsEccentricityOrientation(mu11, mu20, mu02)
+
         wf.timer.toc(self.name)
 
         self.eccentricity = eccentricity
         self.orientation = orientation
 
+    @staticmethod
+    def h__contourMoments(contour):
+        """
+        The central moments of closed polygons, as computed by
+        cv2.moments for a contour, for all frames at once.
+
+        Parameters
+        ----------
+        contour : numpy array of shape (n_points,2,n_frames)
+
+        Returns
+        -------
+        (mu11, mu20, mu02), each a numpy array of shape (n_frames,)
+        """
+        x = contour[:, 0, :].astype(np.float64)
+        y = contour[:, 1, :].astype(np.float64)
+        # The previous point of each point, closing the polygon
+        x_prev = np.roll(x, 1, axis=0)
+        y_prev = np.roll(y, 1, axis=0)
+
+        # Green's theorem, over the edges of the polygon
+        dxy = x_prev * y - x * y_prev
+        xii = x_prev + x
+        yii = y_prev + y
+
+        a00 = np.sum(dxy, axis=0)
+        a10 = np.sum(dxy * xii, axis=0)
+        a01 = np.sum(dxy * yii, axis=0)
+        a20 = np.sum(dxy * (x_prev * xii + x**2), axis=0)
+        a11 = np.sum(dxy * (x_prev * (yii + y_prev) + x * (yii + y)), axis=0)
+        a02 = np.sum(dxy * (y_prev * yii + y**2), axis=0)
+
+        # The sign makes the moments independent of the direction of the
+        # contour. As with OpenCV, tiny (or zero) areas give zero moments.
+        sign = np.where(a00 > 0, 1.0, -1.0)
+        sign[np.abs(a00) <= np.finfo(np.float32).eps] = 0
+
+        m00 = a00 * sign / 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cx = np.where(m00 != 0, a10 * sign / 6 / m00, 0)
+            cy = np.where(m00 != 0, a01 * sign / 6 / m00, 0)
+
+        mu20 = a20 * sign / 12 - a10 * sign / 6 * cx
+        mu11 = a11 * sign / 24 - a10 * sign / 6 * cy
+        mu02 = a02 * sign / 12 - a01 * sign / 6 * cy
+
+        return mu11, mu20, mu02
+
+    @staticmethod
+    def h__skeletonMoments(skeleton):
+        """
+        The covariance of the skeleton points of all frames at once, as
+        computed by np.cov for each frame
+
+        Parameters
+        ----------
+        skeleton : numpy array of shape (n_points,2,n_frames)
+
+        Returns
+        -------
+        (mu11, mu20, mu02), each a numpy array of shape (n_frames,)
+        """
+        n_points = skeleton.shape[0]
+        centred = skeleton.astype(np.float64) - \
+            np.mean(skeleton, axis=0, dtype=np.float64)
+        x = centred[:, 0, :]
+        y = centred[:, 1, :]
+
+        mu20 = np.sum(x * x, axis=0) / (n_points - 1)
+        mu02 = np.sum(y * y, axis=0) / (n_points - 1)
+        mu11 = np.sum(x * y, axis=0) / (n_points - 1)
+
+        return mu11, mu20, mu02
+
+    @staticmethod
+    def h__momentsEccentricityOrientation(mu11, mu20, mu02):
+        """
+        The eccentricity and orientation (in degrees) of the ellipses with
+        the given central moments
+        """
+        a1 = (mu20 + mu02) / 2
+        a2 = np.sqrt(4 * mu11**2 +
+                     (mu20 - mu02)**2) / 2
+
+        minor_axis = a1 - a2
+        major_axis = a1 + a2
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ecc = np.sqrt(1 - minor_axis / major_axis)
+        ang = np.arctan2(2 * mu11, (mu20 - mu02)) / 2
+        ang *= 180 / np.pi
+        return ecc, ang
+
+    @staticmethod
+    def h__boxEccentricityOrientation(skel):
+        """
+        The eccentricity and orientation from the minimal rectangle
+        around the points of one frame, see __init__
+        """
+        (CMx, CMy), (L, W), angle = cv2.minAreaRect(skel)
+        if W > L:
+            L, W = W, L  # switch if width is larger than length
+            angle += 90 # this means that the angle is shifted too
+        quirkiness = np.sqrt(1 - W**2 / L**2)
+        return quirkiness, angle
+
     @classmethod
     def from_schafer_file(cls, wf, feature_name):
         self = cls.__new__(cls)
@@ -535,7 +669,6 @@ class AmplitudeAndWavelengthProcessor(Feature):
         # https://github.com/JimHokanson/SegwormMatlabClasses/blob/master/
         # %2Bseg_worm/%2Bfeatures/%40posture/getAmplitudeAndWavelength.m
         N_POINTS_FFT = wave_options.n_points_fft
-        HALF_N_FFT = int(N_POINTS_FFT / 2)
         MIN_DIST_PEAKS = wave_options.min_dist_peaks
         WAVELENGTH_PCT_MAX_CUTOFF = wave_options.pct_max_cutoff
         WAVELENGTH_PCT_CUTOFF = wave_options.pct_cutoff
@@ -607,82 +740,86 @@ class AmplitudeAndWavelengthProcessor(Feature):
         frames_to_calculate = \
             (np.logical_not(bad_worm_orientation)).nonzero()[0]
 
-        for cur_frame in frames_to_calculate:
-            # Create an evenly sampled x-axis, note that ds varies
-            xx = wwx[:, cur_frame]
-            yy = wwy[:, cur_frame]
-            if xx[0] > xx[-1]: #switch we want to have monotonically inceasing values
-                xx = xx[::-1]
-                yy = yy[::-1]
-            
-            iwwx = utils.colon(xx[0], ds[cur_frame], xx[-1])
-            iwwy = np.interp(iwwx, xx, yy)
-            iwwy = iwwy[::-1]
-            
-            temp = np.fft.fft(iwwy, N_POINTS_FFT)
-
-
-            if options.mimic_old_behaviour:
-                iY = temp[0:HALF_N_FFT]
-                iY = iY * np.conjugate(iY) / N_POINTS_FFT
-            else:
-                iY = np.abs(temp[0:HALF_N_FFT])
-            
-            
-            # Find peaks that are greater than the cutoff
+        # Rotated skeletons of the frames, with x increasing
+        # (n_frames_to_calculate,49)
+        xx = wwx[:, frames_to_calculate].T
+        yy = wwy[:, frames_to_calculate].T
+        is_reversed = xx[:, 0] > xx[:, -1]
+        xx[is_reversed] = xx[is_reversed, ::-1]
+        yy[is_reversed] = yy[is_reversed, ::-1]
+
+        # The spectra of all frames are computed at once, except for the
+        # odd frames that utils.colon would treat differently
+        is_batched = self.h__canResampleFramesBatch(
+            xx, ds[frames_to_calculate])
+        batch_I = is_batched.nonzero()[0]
+        loop_I = (~is_batched).nonzero()[0]
+
+        spectra = self.h__getSpectraBatch(xx[batch_I], yy[batch_I],
+                                          ds[frames_to_calculate[batch_I]],
+                                          N_POINTS_FFT, options)
+
+        # Indices of the two largest peaks of each frame's spectrum, -1
+        # if there is no such peak
+        peak_I = np.full((len(frames_to_calculate), 2), -1, dtype=int)
+
+        # Find peaks that are greater than the cutoff
+        is_peak = utils.separated_peaks_2d(
+            spectra, MIN_DIST_PEAKS, True,
+            WAVELENGTH_PCT_MAX_CUTOFF * np.amax(spectra, axis=1)
+            if len(batch_I) > 0 else np.zeros(0))
+        peak_I[batch_I] = self.h__getLargestPeaks(spectra, is_peak)
+
+        for cur_I in loop_I:
+            iY = self.h__getSpectrum(xx[cur_I], yy[cur_I],
+                                     ds[frames_to_calculate[cur_I]],
+                                     N_POINTS_FFT, options)
             peaks, indx = utils.separated_peaks(iY,
                                                 MIN_DIST_PEAKS,
                                                 True,
                                                 (WAVELENGTH_PCT_MAX_CUTOFF *
                                                  np.amax(iY)))
-            
-            # This is what the supplemental says, not what was done in
-            # the previous code. I'm not sure what was done for the actual
-            # paper, but I would guess they used power.
-            #
-            # This gets used when determining the secondary wavelength, as
-            # it must be greater than half the maximum to be considered a
-            # secondary wavelength.
-
-            # NOTE: True Amplitude = 2*abs(fft)/
-            #                    (length_real_data i.e. 48 or 49, not 512)
-            #
-            # i.e. for a sinusoid of a given amplitude, the above formula
-            # would give you the amplitude of the sinusoid
-
-            # We sort the peaks so that the largest is at the first index
-            # and will be primary, this was not done in the previous
-            # version of the code
-            I = np.argsort(-1 * peaks)
-            indx = indx[I]
-
-            frequency_values = (indx - 1) / N_POINTS_FFT * \
-                spatial_sampling_frequency[cur_frame]
+            indx = indx[np.argsort(-1 * peaks)][:2]
+            peak_I[cur_I, :len(indx)] = indx
 
-            all_wavelengths = 1 / frequency_values
+        # This is what the supplemental says, not what was done in
+        # the previous code. I'm not sure what was done for the actual
+        # paper, but I would guess they used power.
+        #
+        # This gets used when determining the secondary wavelength, as
+        # it must be greater than half the maximum to be considered a
+        # secondary wavelength.
 
-            p_temp = all_wavelengths[0]
+        # NOTE: True Amplitude = 2*abs(fft)/
+        #                    (length_real_data i.e. 48 or 49, not 512)
+        #
+        # i.e. for a sinusoid of a given amplitude, the above formula
+        # would give you the amplitude of the sinusoid
 
-            if indx.size > 1:
-                s_temp = all_wavelengths[1]
-            else:
-                s_temp = np.NaN
+        # We sort the peaks so that the largest is at the first index
+        # and will be primary, this was not done in the previous
+        # version of the code
+        with np.errstate(divide='ignore', invalid='ignore'):
+            frequency_values = (peak_I - 1) / N_POINTS_FFT * \
+                spatial_sampling_frequency[frames_to_calculate][:, None]
 
-            worm_wavelength_max = (WAVELENGTH_PCT_CUTOFF *
-                                   worm_lengths[cur_frame])
+            all_wavelengths = 1 / frequency_values
+        all_wavelengths[peak_I == -1] = np.NaN
 
-            # Cap wavelengths ...
-            if p_temp > worm_wavelength_max:
-                p_temp = worm_wavelength_max
+        worm_wavelength_max = (WAVELENGTH_PCT_CUTOFF *
+                               worm_lengths[frames_to_calculate])
 
-            # ??? Do we really want to keep this as well if p_temp == worm_2x?
-            # i.e., should the secondary wavelength be valid if the primary is
-            # also limited in this way ?????
-            if s_temp > worm_wavelength_max:
-                s_temp = worm_wavelength_max
+        # Cap wavelengths ...
+        # ??? Do we really want to keep this as well if p_temp == worm_2x?
+        # i.e., should the secondary wavelength be valid if the primary is
+        # also limited in this way ?????
+        with np.errstate(invalid='ignore'):
+            is_capped = all_wavelengths > worm_wavelength_max[:, None]
+        all_wavelengths = np.where(is_capped, worm_wavelength_max[:, None],
+                                   all_wavelengths)
 
-            primary_wavelength[cur_frame] = p_temp
-            secondary_wavelength[cur_frame] = s_temp
+        primary_wavelength[frames_to_calculate] = all_wavelengths[:, 0]
+        secondary_wavelength[frames_to_calculate] = all_wavelengths[:, 1]
 
         if options.mimic_old_behaviour:
             # In the old code, the first peak (i.e. larger wavelength,
@@ -705,6 +842,142 @@ class AmplitudeAndWavelengthProcessor(Feature):
 
         timer.toc('posture.amplitude_and_wavelength')
 
+    @staticmethod
+    def h__canResampleFramesBatch(xx, ds):
+        """
+        Whether each frame can be resampled by h__getSpectraBatch, which
+        replicates utils.colon for the usual case of a positive step that
+        fits in the frame at least once, and non-integer end points.
+
+        Parameters
+        ----------
+        xx : numpy array of shape (n,49)
+            Increasing x values of each frame
+        ds : numpy array of shape (n,)
+            The sampling step of each frame
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n_steps = ((xx[:, -1] - xx[:, 0]) +
+                       2 * np.spacing(xx[:, -1] - xx[:, 0])) // ds
+            is_whole = (np.mod(xx[:, 0], 1) == 0) & \
+                (np.mod(xx[:, -1], 1) == 0)
+            return np.isfinite(ds) & (ds > 0) & (n_steps >= 1) & ~is_whole
+
+    @staticmethod
+    def h__getSpectrum(xx, yy, ds, n_points_fft, options):
+        """
+        The spectrum of one frame, resampled with a step of ds
+
+        Parameters
+        ----------
+        xx : numpy array of shape (49,)
+            Increasing x values
+        yy : numpy array of shape (49,)
+        ds : float
+        n_points_fft : int
+        options : FeatureProcessingOptions
+        """
+        # Create an evenly sampled x-axis, note that ds varies
+        iwwx = utils.colon(xx[0], ds, xx[-1])
+        iwwy = np.interp(iwwx, xx, yy)
+        iwwy = iwwy[::-1]
+
+        temp = np.fft.fft(iwwy, n_points_fft)
+
+        half_n_fft = int(n_points_fft / 2)
+        if options.mimic_old_behaviour:
+            iY = temp[0:half_n_fft]
+            iY = iY * np.conjugate(iY) / n_points_fft
+            return iY.real
+        else:
+            return np.abs(temp[0:half_n_fft])
+
+    @staticmethod
+    def h__getSpectraBatch(xx, yy, ds, n_points_fft, options):
+        """
+        h__getSpectrum for many frames at once.
+
+        Each frame is resampled with its own step onto a grid padded to
+        the longest frame, and the spectra are computed with a single
+        FFT over all frames.
+
+        Parameters
+        ----------
+        xx : numpy array of shape (n,49)
+            Increasing x values of each frame
+        yy : numpy array of shape (n,49)
+        ds : numpy array of shape (n,)
+            See h__canResampleFramesBatch
+        n_points_fft : int
+        options : FeatureProcessingOptions
+
+        Returns
+        -------
+        numpy array of shape (n,n_points_fft/2)
+        """
+        n_frames, n_points = xx.shape
+        half_n_fft = int(n_points_fft / 2)
+        if n_frames == 0:
+            return np.zeros((0, half_n_fft))
+
+        # Same as utils.colon(xx[0], ds, xx[-1]) for each frame, which
+        # has n_steps + 1 points, padded with NaN
+        start = xx[:, 0]
+        n_steps = ((xx[:, -1] - start) +
+                   2 * np.spacing(xx[:, -1] - start)) // ds
+        stop = start + ds * n_steps
+        step = (stop - start) / n_steps
+        n_grid_points = n_steps.astype(int) + 1
+
+        grid_I = np.arange(n_grid_points.max())
+        iwwx = grid_I * step[:, None] + start[:, None]
+        iwwx[np.arange(n_frames), n_grid_points - 1] = stop
+        iwwx[grid_I >= n_grid_points[:, None]] = np.NaN
+
+        iwwy = WormParserHelpers.interp_batch(
+            iwwx, xx, yy, np.full(n_frames, n_points, dtype=int))
+
+        # Reverse each frame, and pad with zeros
+        reversed_I = n_grid_points[:, None] - 1 - grid_I
+        is_padding = reversed_I < 0
+        iwwy = iwwy[np.arange(n_frames)[:, None], reversed_I]
+        iwwy[is_padding] = 0
+
+        temp = np.fft.rfft(iwwy, n_points_fft, axis=1)
+
+        if options.mimic_old_behaviour:
+            iY = temp[:, 0:half_n_fft]
+            iY = iY * np.conjugate(iY) / n_points_fft
+            return iY.real
+        else:
+            return np.abs(temp[:, 0:half_n_fft])
+
+    @staticmethod
+    def h__getLargestPeaks(spectra, is_peak):
+        """
+        The indices of the largest and second largest peak of each frame,
+        or -1 if a frame has fewer peaks
+
+        Parameters
+        ----------
+        spectra : numpy array of shape (n,k)
+        is_peak : numpy array of bools, shape (n,k)
+            See utils.separated_peaks_2d
+
+        Returns
+        -------
+        numpy array of ints, shape (n,2)
+        """
+        n_frames = spectra.shape[0]
+        if spectra.shape[1] < 2:
+            return np.full((n_frames, 2), -1, dtype=int)
+
+        sort_values = np.where(is_peak, -1 * spectra, np.inf)
+        peak_I = np.argsort(sort_values, axis=1, kind='mergesort')[:, :2]
+        peak_I[~is_peak[np.arange(n_frames)[:, None], peak_I]] = -1
+
+        return peak_I
+
     @classmethod
     def from_schafer_file(cls, wf, feature_name):
         self = cls.__new__(cls)
@@ -856,28 +1129,8 @@ class Coils(Feature):
         np_true = ~np_false
         end_coil_mask = np.concatenate((end_coil_mask, np_true))
 
-        in_coil = False
-        coil_frame_start = -1
-        n_coils = 0
-        n_frames_plus1 = len(frame_code) + 1
-
-        starts = []
-        ends = []
-
-        for iFrame in range(n_frames_plus1):
-            if in_coil:
-                if end_coil_mask[iFrame]:
-                    n_coil_frames = iFrame - coil_frame_start
-                    if n_coil_frames >= COIL_FRAME_THRESHOLD:
-                        n_coils += 1
-
-                        starts.append(coil_frame_start)
-                        ends.append(iFrame - 1)
-
-                    in_coil = False
-            elif coil_start_mask[iFrame]:
-                in_coil = True
-                coil_frame_start = iFrame
+        starts, ends = h__getCoils(coil_start_mask, end_coil_mask,
+                                   COIL_FRAME_THRESHOLD)
 
         if options.mimic_old_behaviour:
             if (len(starts) > 0) and (ends[-1] == len(frame_code) - 1):
@@ -953,72 +1206,19 @@ class Kinks(Feature):
 
         nan_mask = np.isnan(bend_angles)
 
-        for iFrame in (~np.all(nan_mask, axis=0)).nonzero()[0]:
-            smoothed_bend_angles = filters.convolve1d(
-                bend_angles[:, iFrame], gauss_filter, cval=0, mode='constant')
-
-            # This code is nearly identical in getForaging
-            #-------------------------------------------------------
-            n_frames = smoothed_bend_angles.shape[0]
-
-            with np.errstate(invalid='ignore'):
-                dataSign = np.sign(smoothed_bend_angles)
-
-            if np.any(np.equal(dataSign, 0)):
-                # I don't expect that we'll ever actually reach 0
-                # The code for zero was a bit weird, it keeps counting if no sign
-                # change i.e. + + + 0 + + + => all +
-                #
-                # but it counts for both if sign change
-                # + + 0 - - - => 3 +s and 4 -s
-                
-                #this case does happend. I will continue (default nan) instead of risign an error (AEJ)
-                #raise Exception("Unhandled code case")
-                continue
-
-            sign_change_I = (
-                np.not_equal(dataSign[1:], dataSign[0:-1])).nonzero()[0]
-
-            end_I = np.concatenate(
-                (sign_change_I,
-                 n_frames * np.ones(1, dtype=np.result_type(sign_change_I))))
-
-            wtf1 = np.zeros(1, dtype=np.result_type(sign_change_I))
-            wtf2 = sign_change_I + 1
-            # +2? due to inclusion rules???
-            start_I = np.concatenate((wtf1, wtf2))
-
-            # All NaN values are considered sign changes, remove these ...
-            keep_mask = np.logical_not(np.isnan(smoothed_bend_angles[start_I]))
-
-            start_I = start_I[keep_mask]
-            end_I = end_I[keep_mask]
-
-            # The old code had a provision for having NaN values in the middle
-            # of the worm. I have not translated that feature to the newer code. I
-            # don't think it will ever happen though for a valid frame, only on the
-            # edges should you have NaN values.
-            if start_I.size != 0 and \
-               np.any(np.isnan(smoothed_bend_angles[start_I[0]:end_I[-1]])):
-                #this case does happend. I will continue (default nan) instead of risign an error (AEJ)
-                #raise Exception("Unhandled code case")
-                continue
-
-            #-------------------------------------------------------
-            # End of identical code ...
-
-            lengths = end_I - start_I + 1
-
-            # Adjust lengths for first and last:
-            # Basically we allow NaN values to count towards the length for the
-            # first and last stretches
-            if lengths.size != 0:
-                if start_I[0] != 0:  # Due to leading NaNs
-                    lengths[0] = end_I[0] + 1
-                if end_I[-1] != n_frames:  # Due to trailing NaNs
-                    lengths[-1] = n_frames - start_I[-1]
-
-            n_kinks_all[iFrame] = np.sum(lengths >= length_threshold)
+        frames_run = (~np.all(nan_mask, axis=0)).nonzero()[0]
+
+        smoothed_bend_angles = filters.convolve1d(
+            bend_angles[:, frames_run], gauss_filter, axis=0, cval=0,
+            mode='constant')
+
+        n_kinks, has_zero, has_inner_nan = h__countKinks(smoothed_bend_angles,
+                                                         length_threshold)
+
+        # These cases do happen. The frames are left as NaN instead of
+        # raising an error (AEJ)
+        is_ok = ~has_zero & ~has_inner_nan
+        n_kinks_all[frames_run[is_ok]] = n_kinks[is_ok]
 
         timer.toc('posture.kinks')
 
@@ -37,6 +37,7 @@ from .. import utils
 
 from . import feature_processing_options as fpo
 from . import events
+from . import feature_scheduler
 from . import generic_features
 from . import path_features
 from . import posture_features
@@ -658,13 +659,23 @@ class WormFeatures(object):
 
     """
 
-    def __init__(self, nw, processing_options=None, specs='all'):
+    def __init__(self, nw, processing_options=None, specs='all',
+                 n_workers=1, use_processes=False, cache=None):
         """
 
         Parameters
         ----------
         nw : NormalizedWorm object
         specs :
+        n_workers : int (default 1)
+            If greater than 1, features that don't depend on each other
+            are computed concurrently using this many workers.
+            See feature_scheduler.compute_features
+        use_processes : bool (default False)
+            Use a pool of processes rather than threads when n_workers > 1
+        cache : feature_cache.FeatureCache (default None)
+            If specified, features are loaded from this cache when
+            available and saved to it after being computed.
 
         #The options will most likely change. We should have the options
         #be accessible from the specs
@@ -684,12 +695,24 @@ class WormFeatures(object):
         self.options = processing_options
         self.nw = nw
         self.timer = utils.ElementTimer()
+        self.cache = cache
 
         self.initialize_features()
 
         # TODO: We should eventually support a list of specs as well
         # TODO: We might also allow transforming the specs (like changing options),
         # which this doesn't handle since we are only extracting the names
+        if isinstance(specs, pd.core.frame.DataFrame):
+            feature_names = list(specs['feature_name'])
+        else:
+            feature_names = list(self.specs.keys())
+
+        if n_workers > 1:
+            # Failures are ignored here, they are reported below when the
+            # features get requested serially
+            feature_scheduler.compute_features(self, feature_names,
+                                               n_workers, use_processes)
+
         if isinstance(specs, pd.core.frame.DataFrame):
             # This wouldn't be good if the specs have changed.
             # We would need to change the initialize_features() call
@@ -765,6 +788,7 @@ class WormFeatures(object):
 
         self = cls.__new__(cls)
         self.timer = utils.ElementTimer()
+        self.cache = None
         self.initialize_features()
 
         # I'm not thrilled about this approach. I think we should
@@ -826,6 +850,9 @@ class WormFeatures(object):
 
         self._features = collections.OrderedDict()
 
+        # See feature_cache.FeatureCache.get_key
+        self._cache_keys = {}
+
         # This will be removed soon
         self._temp_features = collections.OrderedDict()
 
@@ -904,7 +931,19 @@ class WormFeatures(object):
             raise KeyError(
                 'Specified feature name not found in the feature specifications')
 
-        temp = spec.compute_feature(self, internal_request=internal_request)
+        use_cache = self.cache is not None and spec.source == 'new'
+        temp = None
+        if use_cache:
+            temp = self.cache.load(self, feature_name)
+
+        if temp is None:
+            temp = spec.compute_feature(self,
+                                        internal_request=internal_request)
+            if use_cache:
+                self.cache.save(self, temp)
+        else:
+            temp.spec = spec
+            temp.is_user_requested = not internal_request
 
         # TODO: this will change
         # A feature can return None, which means we can't ask the feature
@@ -1095,6 +1134,9 @@ class FeatureProcessingSpec(object):
         A method instance
     flags : string
         This is a string that can be passed to the class method
+    dependencies : list
+        Names of features, other than the parent feature, that are
+        requested when computing this feature
 
     See Also
     --------
@@ -1165,6 +1207,11 @@ class FeatureProcessingSpec(object):
         self.make_zero_if_empty = d['make_zero_if_empty'] == '1'
         self.is_time_series = d['is_time_series'] == '1'
 
+        # Features requested during computation, other than the parent.
+        # See feature_scheduler.get_dependency_graph
+        dependencies = d.get('dependencies') or ''
+        self.dependencies = [x for x in dependencies.split(';') if len(x) > 0]
+
     def compute_feature(self, wf, internal_request=False):
         """
         Note, the only caller of this function should be from:
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 """
-BasicWorm, WormPartition, JSON_Serializer
+BasicWorm, WormPartition, JSON_Serializer, BinaryArrayFile
 
 Credit to Christopher R. Wagner at
 http://robotfantastic.org/serializing-python-data-to-json-some-edge-cases.html
@@ -17,6 +17,7 @@ nested_equal
 import numpy as np
 import warnings
 import copy
+import os
 import h5py
 import matplotlib.pyplot as plt
 
@@ -25,6 +26,7 @@ from collections import namedtuple, Iterable, OrderedDict
 
 from .. import config, utils
 from .pre_features import WormParsing
+from .ragged_array import RaggedArray
 from .video_info import VideoInfo
 
 #%%
@@ -35,26 +37,134 @@ class JSON_Serializer():
     A class that can save all of its attributes to a JSON file, or
     load them from a JSON file.
 
+    By default numpy arrays are written into the JSON as nested lists.
+    With binary_arrays=True they are instead written as raw little-endian
+    data to a sidecar file (JSON_path + '.bin'), and the JSON only holds
+    their dtype, shape and offset into that file. This is much faster and
+    smaller for large arrays, and the arrays are loaded without copying
+    by memory-mapping the sidecar file.
+
     """
 
     def __init__(self):
         pass
 
-    def save_to_JSON(self, JSON_path):
-        serialized_data = data_to_json(list(self.__dict__.items()))
+    def save_to_JSON(self, JSON_path, binary_arrays=False):
+        """
+        Parameters
+        ----------
+        JSON_path : string
+        binary_arrays : bool
+            If True numpy arrays are saved to a binary sidecar file
+            (JSON_path + '.bin') rather than to the JSON file.
+
+        """
+        binary_path = get_binary_sidecar_path(JSON_path)
+        if binary_arrays:
+            with open(binary_path, 'wb') as binary_file:
+                serialized_data = data_to_json(
+                    list(self.__dict__.items()),
+                    BinaryArrayFile(binary_file))
+        else:
+            serialized_data = data_to_json(list(self.__dict__.items()))
+            # Don't leave a stale sidecar file from a previous save
+            if os.path.exists(binary_path):
+                os.remove(binary_path)
 
         with open(JSON_path, 'w') as outfile:
             outfile.write(serialized_data)
 
-    def load_from_JSON(self, JSON_path):
+    def load_from_JSON(self, JSON_path, mmap_mode='c'):
+        """
+        Parameters
+        ----------
+        JSON_path : string
+        mmap_mode : {'c', 'r', 'r+', None}
+            How the binary sidecar file, if any, is memory-mapped. The
+            default 'c' (copy-on-write) gives arrays that can be modified
+            without changing the file. None reads the whole file into
+            memory.
+
+        """
         with open(JSON_path, 'r') as infile:
             serialized_data = infile.read()
 
-        member_list = json_to_data(serialized_data)
+        member_list = json_to_data(
+            serialized_data,
+            BinaryArrayFile(get_binary_sidecar_path(JSON_path), mmap_mode))
 
         for member in member_list:
             setattr(self, member[0], member[1])
 
+
+class BinaryArrayFile(object):
+    """
+    The binary sidecar file of a JSON file saved with
+    JSON_Serializer.save_to_JSON(..., binary_arrays=True).
+
+    Arrays are stored one after another as raw little-endian data, each
+    starting at a multiple of ALIGNMENT bytes.
+
+    Parameters
+    ----------
+    file : file object opened for binary writing, or string
+        A file object to write arrays to, or the path of the file to read
+        arrays from. When reading, the file is only opened when the first
+        array is requested.
+    mmap_mode : {'c', 'r', 'r+', None}
+        See JSON_Serializer.load_from_JSON
+
+    """
+
+    ALIGNMENT = 64
+
+    def __init__(self, file, mmap_mode='c'):
+        self.file = file
+        self.mmap_mode = mmap_mode
+        self._buffer = None
+        self._position = 0
+
+    def write(self, data):
+        """
+        Write an array, and return its offset in bytes
+        """
+        data = np.ascontiguousarray(data, dtype=data.dtype.newbyteorder('<'))
+        padding = -self._position % self.ALIGNMENT
+        if padding:
+            self.file.write(b'\0' * padding)
+            self._position += padding
+
+        offset = self._position
+        self.file.write(data.tobytes())
+        self._position += data.nbytes
+        return offset
+
+    def read(self, offset, dtype, shape):
+        """
+        Returns an array that is a view into the file, without copying
+        """
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if count == 0:
+            return np.empty(shape, dtype=dtype)
+
+        if self._buffer is None:
+            if not os.path.exists(self.file):
+                raise IOError('Binary sidecar file %s not found' % self.file)
+            if self.mmap_mode is None:
+                self._buffer = np.fromfile(self.file, dtype=np.uint8)
+            else:
+                self._buffer = np.memmap(self.file, dtype=np.uint8,
+                                         mode=self.mmap_mode)
+
+        return np.frombuffer(self._buffer, dtype=dtype, count=count,
+                             offset=offset).reshape(shape)
+
+
+def get_binary_sidecar_path(JSON_path):
+    return JSON_path + '.bin'
+
+
 #%%
 
 
@@ -177,11 +287,13 @@ class BasicWorm(JSON_Serializer):
 
     Attributes
     ----------
-    h_skeleton : list, where each element is a numpy array of shape (2,k_i)
+    h_skeleton : RaggedArray, where each element is a numpy array of
+                 shape (2,k_i)
         Each element of the list is a frame.
         Where k_i is the number of skeleton points in frame i.
         The first axis of the numpy array, having len 2, is the x and y.
          Missing frames should be identified by None.
+        A list of frames may be assigned; it is converted to a RaggedArray.
     h_ventral_contour:   Same type and shape as skeleton (see above)
         The vulva side of the contour.
     h_dorsal_contour: Same type and shape as skeleton (see above)
@@ -211,30 +323,20 @@ class BasicWorm(JSON_Serializer):
 
         with h5py.File(data_file_path, 'r') as h:
             # These are all HDF5 'references'
-            all_ventral_contours_refs = h['all_vulva_contours'].value
-            all_dorsal_contours_refs = h['all_non_vulva_contours'].value
-            all_skeletons_refs = h['all_skeletons'].value
+            all_ventral_contours_refs = h['all_vulva_contours'][()]
+            all_dorsal_contours_refs = h['all_non_vulva_contours'][()]
+            # NOTE: The skeletons, 'all_skeletons', are not loaded. We
+            # purposely ignore the saved skeleton information, preferring
+            # to derive it ourselves (see below).
 
             is_stage_movement = utils._extract_time_from_disk(
                 h, 'is_stage_movement')
             is_valid = utils._extract_time_from_disk(h, 'is_valid')
 
-            all_skeletons = []
-            all_ventral_contours = []
-            dorsal_contour = []
-
-            for valid_frame, iFrame in zip(is_valid, range(is_valid.size)):
-                if valid_frame:
-                    all_skeletons.append(
-                        h[all_skeletons_refs[iFrame][0]].value)
-                    all_ventral_contours.append(
-                        h[all_ventral_contours_refs[iFrame][0]].value)
-                    dorsal_contour.append(
-                        h[all_dorsal_contours_refs[iFrame][0]].value)
-                else:
-                    all_skeletons.append(None)
-                    all_ventral_contours.append(None)
-                    dorsal_contour.append(None)
+            all_ventral_contours = BasicWorm._h_read_referenced_arrays(
+                h, all_ventral_contours_refs[:, 0], is_valid)
+            dorsal_contour = BasicWorm._h_read_referenced_arrays(
+                h, all_dorsal_contours_refs[:, 0], is_valid)
 
         # Video Metadata
         is_stage_movement = is_stage_movement.astype(bool)
@@ -244,7 +346,7 @@ class BasicWorm(JSON_Serializer):
         # of the number of frames in the video.  It's unclear why
         # is_stage_movement would be longer by 1, which it was in our
         # canonical example.
-        is_stage_movement = is_stage_movement[0:len(all_skeletons)]
+        is_stage_movement = is_stage_movement[0:len(all_ventral_contours)]
 
         # 5. Derive frame_code from the two pieces of data we have,
         #    is_valid and is_stage_movement.
@@ -255,13 +357,71 @@ class BasicWorm(JSON_Serializer):
         # We purposely ignore the saved skeleton information contained
         # in the BasicWorm, preferring to derive it ourselves.
         bw.__remove_precalculated_skeleton()
-        #bw.h_skeleton = all_skeletons
 
         bw._h_ventral_contour = all_ventral_contours
         bw._h_dorsal_contour = dorsal_contour
 
         return bw
 
+    @staticmethod
+    def _h_read_referenced_arrays(h, refs, is_valid):
+        """
+        Read the arrays that a set of HDF5 object references point to.
+
+        All frames are read directly into the buffer of a RaggedArray. The
+        datasets are read in the order they are stored in the file to
+        minimize seeking.
+
+        Parameters
+        ---------------
+        h: h5py.File
+        refs: numpy array of HDF5 object references, one per frame
+        is_valid: numpy array, one value per frame
+            Only frames where this is true are read
+
+        Returns
+        ---------------
+        RaggedArray
+            One numpy array of shape (2,k_i) per frame, or None where the
+            frame is not valid
+
+        """
+        is_valid = np.asarray(is_valid).astype(bool)
+        valid_frames = np.flatnonzero(is_valid)
+        if len(valid_frames) == 0:
+            return RaggedArray.from_list([None] * len(is_valid))
+
+        # The low level h5py interface is used as the high level objects
+        # add a lot of overhead per frame
+        datasets = [h5py.h5r.dereference(refs[iFrame], h.id)
+                    for iFrame in valid_frames]
+
+        # Lay out the frames in the buffer, in frame order
+        n_points = np.zeros(len(is_valid), dtype=np.int64)
+        n_points[valid_frames] = [dataset.shape[-1] for dataset in datasets]
+        offsets = np.concatenate([[0], np.cumsum(n_points)])
+        buffer = np.empty(datasets[0].shape[:-1] + (offsets[-1],),
+                          dtype=datasets[0].dtype)
+        buffer_space = h5py.h5s.create_simple(buffer.shape)
+
+        # Datasets without a fixed location in the file (e.g. chunked
+        # datasets) are read last
+        def file_order(I):
+            file_offset = datasets[I].get_offset()
+            return (file_offset is None, file_offset or 0, I)
+
+        for I in sorted(range(len(datasets)), key=file_order):
+            iFrame = valid_frames[I]
+            if n_points[iFrame] == 0:
+                continue
+            # Select this frame's part of the buffer
+            buffer_space.select_hyperslab(
+                (0,) * (buffer.ndim - 1) + (offsets[iFrame],),
+                datasets[I].shape)
+            datasets[I].read(buffer_space, h5py.h5s.ALL, buffer)
+
+        return RaggedArray(buffer, offsets, is_valid)
+
     @classmethod
     def from_contour_factory(cls, ventral_contour, dorsal_contour):
         """
@@ -279,7 +439,7 @@ class BasicWorm(JSON_Serializer):
         """
         
         
-        if not isinstance(ventral_contour, (list,tuple)):
+        if not isinstance(ventral_contour, (list, tuple, RaggedArray)):
             # we need to change the data from a (49,2,n) array to a list of (2,49)
             assert(np.shape(ventral_contour) == np.shape(dorsal_contour))
             assert ventral_contour.shape[1] == 2
@@ -316,11 +476,12 @@ class BasicWorm(JSON_Serializer):
             #other option will be to give a list of None, but this make more obvious when there is a mistake
             bw.h_ventral_contour = None 
             bw.h_dorsal_contour = None
-            if isinstance(skeleton,  (list,tuple)):
-                bw._h_skeleton =  skeleton
+            if isinstance(skeleton, (list, tuple, RaggedArray)):
+                bw._h_skeleton = RaggedArray.as_ragged(skeleton)
             else:
                 assert skeleton.shape[1] == 2
-                bw._h_skeleton =  WormParsing._h_array2list(skeleton)
+                bw._h_skeleton = RaggedArray.from_list(
+                    WormParsing._h_array2list(skeleton))
             return bw
 
         else:
@@ -365,7 +526,7 @@ class BasicWorm(JSON_Serializer):
 
     @h_ventral_contour.setter
     def h_ventral_contour(self, x):
-        self._h_ventral_contour = x
+        self._h_ventral_contour = RaggedArray.as_ragged(x)
         self.__remove_precalculated_skeleton()
 
     @property
@@ -374,7 +535,7 @@ class BasicWorm(JSON_Serializer):
 
     @h_dorsal_contour.setter
     def h_dorsal_contour(self, x):
-        self._h_dorsal_contour = x
+        self._h_dorsal_contour = RaggedArray.as_ragged(x)
         self.__remove_precalculated_skeleton()
 
     def __remove_precalculated_skeleton(self):
@@ -413,9 +574,10 @@ class BasicWorm(JSON_Serializer):
         except AttributeError:
             # Extrapolate skeleton from contour
             # TODO: improve this: for now
-            self._h_widths, self._h_skeleton = \
+            self._h_widths, h_skeleton = \
             WormParsing.compute_skeleton_and_widths(self.h_ventral_contour, self.h_dorsal_contour)
             #how can i call _h_widths???
+            self._h_skeleton = RaggedArray.from_list(h_skeleton)
 
             return self._h_skeleton
 
@@ -631,40 +793,73 @@ def isnamedtuple(obj):
         and callable(obj._asdict)
 
 
-def serialize(data):
+def serialize(data, binary_file=None):
     """
+    Parameters
+    ----------
+    data :
+    binary_file : BinaryArrayFile, optional
+        If given, numpy arrays are written to this file rather than
+        converted to lists.
+
     """
 
     if data is None or isinstance(data, (bool, int, float, str)):
         return data
     if isinstance(data, list):
-        return [serialize(val) for val in data]
+        return [serialize(val, binary_file) for val in data]
     if isinstance(data, OrderedDict):
         return {"py/collections.OrderedDict":
-                [[serialize(k), serialize(v)] for k, v in data.items()]}
+                [[serialize(k, binary_file), serialize(v, binary_file)]
+                 for k, v in data.items()]}
     if isnamedtuple(data):
         return {"py/collections.namedtuple": {
             "type": type(data).__name__,
             "fields": list(data._fields),
-            "values": [serialize(getattr(data, f)) for f in data._fields]}}
+            "values": [serialize(getattr(data, f), binary_file)
+                       for f in data._fields]}}
     if isinstance(data, dict):
         if all(isinstance(k, str) for k in data):
-            return {k: serialize(v) for k, v in data.items()}
-        return {"py/dict": [[serialize(k), serialize(v)]
+            return {k: serialize(v, binary_file) for k, v in data.items()}
+        return {"py/dict": [[serialize(k, binary_file),
+                             serialize(v, binary_file)]
                             for k, v in data.items()]}
     if isinstance(data, tuple):
-        return {"py/tuple": [serialize(val) for val in data]}
+        return {"py/tuple": [serialize(val, binary_file) for val in data]}
     if isinstance(data, set):
-        return {"py/set": [serialize(val) for val in data]}
+        return {"py/set": [serialize(val, binary_file) for val in data]}
+    if isinstance(data, RaggedArray):
+        return {"py/RaggedArray": {
+            "data": serialize(data.data, binary_file),
+            "offsets": serialize(data.offsets, binary_file),
+            "is_valid": serialize(data.is_valid, binary_file)}}
+    if isinstance(data, VideoInfo):
+        # Underscored attributes are lazily loaded caches
+        return {"py/VideoInfo": {
+            k: serialize(v, binary_file) for k, v in data.__dict__.items()
+            if not k.startswith('_')}}
+    if isinstance(data, np.generic):
+        return data.item()
     if isinstance(data, np.ndarray):
+        if binary_file is not None and not data.dtype.hasobject:
+            return {"py/numpy.ndarray": {
+                "offset": binary_file.write(data),
+                "shape": list(data.shape),
+                "dtype": data.dtype.newbyteorder('<').str}}
         return {"py/numpy.ndarray": {
             "values": data.tolist(),
             "dtype": str(data.dtype)}}
     raise TypeError("Type %s not data-serializable" % type(data))
 
 
-def restore(dct):
+def restore(dct, binary_file=None):
     """
+    Parameters
+    ----------
+    dct : dict
+    binary_file : BinaryArrayFile, optional
+        Needed to restore numpy arrays that were saved to a binary file
+
     """
 
     if "py/dict" in dct:
@@ -678,24 +873,37 @@ def restore(dct):
         return namedtuple(data["type"], data["fields"])(*data["values"])
     if "py/numpy.ndarray" in dct:
         data = dct["py/numpy.ndarray"]
+        if "offset" in data:
+            if binary_file is None:
+                raise ValueError('Array saved to a binary file, but no '
+                                 'binary file was given')
+            return binary_file.read(data["offset"], data["dtype"],
+                                    tuple(data["shape"]))
         return np.array(data["values"], dtype=data["dtype"])
+    if "py/RaggedArray" in dct:
+        data = dct["py/RaggedArray"]
+        return RaggedArray(data["data"], data["offsets"], data["is_valid"])
+    if "py/VideoInfo" in dct:
+        video_info = VideoInfo()
+        video_info.__dict__.update(dct["py/VideoInfo"])
+        return video_info
     if "py/collections.OrderedDict" in dct:
         return OrderedDict(dct["py/collections.OrderedDict"])
     return dct
 
 
-def data_to_json(data):
+def data_to_json(data, binary_file=None):
     """
     """
 
-    return json.dumps(serialize(data))
+    return json.dumps(serialize(data, binary_file))
 
 
-def json_to_data(s):
+def json_to_data(s, binary_file=None):
     """
     """
 
-    return json.loads(s, object_hook=restore)
+    return json.loads(s, object_hook=lambda dct: restore(dct, binary_file))
 
 
 def nested_equal(v1, v2):
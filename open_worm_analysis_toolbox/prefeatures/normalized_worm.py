@@ -8,6 +8,7 @@ import numpy as np
 import scipy.io
 
 import copy
+import json
 import warnings
 import os
 import matplotlib.pyplot as plt
@@ -19,6 +20,13 @@ from .pre_features import WormParsing
 from .pre_features_helpers import WormParserHelpers
 from .video_info import VideoInfo
 
+# The arrays saved by NormalizedWorm.save_to_binary, if they are present.
+# The underscored attributes are derived values that may have been loaded
+# rather than computed (e.g. by from_schafer_file_factory).
+BINARY_ATTRIBUTES = ['skeleton', 'ventral_contour', 'dorsal_contour',
+                     'widths', '_angles', '_length', '_area']
+BINARY_METADATA_FILE = 'normalized_worm.json'
+
 
 class NormalizedWorm(WormPartition):
     """
@@ -63,7 +71,8 @@ class NormalizedWorm(WormPartition):
                 setattr(self, a, copy.deepcopy(getattr(other, a)))
 
     @classmethod
-    def from_BasicWorm_factory(cls, basic_worm, frames_to_plot_widths=[]):
+    def from_BasicWorm_factory(cls, basic_worm, frames_to_plot_widths=[],
+                               n_workers=1):
         """
         Factory classmethod for creating a normalized worm with a basic_worm
         as input.  This requires calculating all the "pre-features" of
@@ -77,6 +86,9 @@ class NormalizedWorm(WormPartition):
         frames_to_plot_widths: list of ints
             Optional list of frames to plot, to show exactly how the
             widths and skeleton were calculated.
+        n_workers: int
+            Number of processes to use to compute the skeleton and widths
+            from the contour. The result does not depend on this value.
 
         Returns
         -----------
@@ -94,7 +106,8 @@ class NormalizedWorm(WormPartition):
             nw.widths, h_skeleton = \
                 WormParsing.compute_skeleton_and_widths(bw.h_ventral_contour,
                                                         bw.h_dorsal_contour,
-                                                        frames_to_plot_widths)
+                                                        frames_to_plot_widths,
+                                                        n_workers=n_workers)
             # 3. Normalize the skeleton, widths and contour to 49 points
             #    per frame
             nw.skeleton = WormParserHelpers.\
@@ -360,6 +373,121 @@ class NormalizedWorm(WormPartition):
             
             return nw
 
+    def save_to_binary(self, dir_path, use_float32=False):
+        """
+        Save the normalized worm as a directory of .npy files, which can be
+        opened memory-mapped with NormalizedWorm.from_binary_factory.
+
+        The arrays are written as raw binary data, so for long videos this
+        is much faster and smaller than JSON. The video metadata is written
+        to a small JSON file in the same directory.
+
+        Parameters
+        ---------------------------------------
+        dir_path: string
+            The directory to save to. It is created if it doesn't exist.
+        use_float32: bool
+            If True the float arrays are saved as float32 rather than
+            float64, halving the size of the files at the cost of
+            precision.
+
+        """
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+
+        array_files = {}
+        for attribute in BINARY_ATTRIBUTES:
+            value = getattr(self, attribute, None)
+            if value is None:
+                continue
+            value = np.asarray(value)
+            if use_float32 and value.dtype.kind == 'f':
+                value = value.astype(np.float32)
+            file_name = attribute.lstrip('_') + '.npy'
+            np.save(os.path.join(dir_path, file_name), value)
+            array_files[attribute] = file_name
+
+        video_info = {}
+        for key, value in self.video_info.__dict__.items():
+            if key.startswith('_') or key == 'frame_code':
+                continue
+            if isinstance(value, np.generic):
+                value = value.item()
+            if value is None or isinstance(value, (bool, int, float, str)):
+                video_info[key] = value
+        frame_code = getattr(self.video_info, 'frame_code', None)
+        if frame_code is not None:
+            np.save(os.path.join(dir_path, 'frame_code.npy'), frame_code)
+
+        metadata = {'array_files': array_files,
+                    'video_info': video_info,
+                    'has_frame_code': frame_code is not None}
+        with open(os.path.join(dir_path, BINARY_METADATA_FILE), 'w') as f:
+            json.dump(metadata, f)
+
+    @classmethod
+    def from_binary_factory(cls, dir_path, mmap_mode='r'):
+        """
+        Load a normalized worm saved by save_to_binary.
+
+        Parameters
+        ---------------------------------------
+        dir_path: string
+        mmap_mode: {None, 'r', 'r+', 'c'}
+            Passed to np.load. By default the arrays are memory-mapped
+            read-only, so only the parts that are used are read from disk
+            and processes working on the same files share the same memory.
+            Use 'c' (copy-on-write) if the arrays need to be modified, or
+            None to read the arrays fully into memory.
+
+        Notes
+        ---------------------------------------
+        When a memory-mapped NormalizedWorm is pickled (e.g. to send it to
+        a worker process), only the file paths are pickled and the arrays
+        are memory-mapped again when unpickled.
+
+        """
+        with open(os.path.join(dir_path, BINARY_METADATA_FILE), 'r') as f:
+            metadata = json.load(f)
+
+        nw = cls()
+
+        nw._mmap_mode = mmap_mode
+        nw._mmap_files = {}
+        for attribute, file_name in metadata['array_files'].items():
+            file_path = os.path.abspath(os.path.join(dir_path, file_name))
+            setattr(nw, attribute, np.load(file_path, mmap_mode=mmap_mode))
+            nw._mmap_files[attribute] = file_path
+
+        for key, value in metadata['video_info'].items():
+            setattr(nw.video_info, key, value)
+        if metadata['has_frame_code']:
+            nw.video_info.frame_code = np.load(
+                os.path.join(dir_path, 'frame_code.npy'))
+
+        return nw
+
+    def __getstate__(self):
+        """
+        Memory-mapped arrays are pickled as their file paths, see
+        from_binary_factory
+        """
+        state = self.__dict__.copy()
+        state['_mmap_reopen'] = []
+        for attribute, file_path in getattr(self, '_mmap_files', {}).items():
+            value = state.get(attribute)
+            if isinstance(value, np.memmap) and value.filename == file_path:
+                state[attribute] = None
+                state['_mmap_reopen'].append(attribute)
+        return state
+
+    def __setstate__(self, state):
+        reopen = state.pop('_mmap_reopen', [])
+        self.__dict__.update(state)
+        for attribute in reopen:
+            setattr(self, attribute, np.load(self._mmap_files[attribute],
+                                             mmap_mode=self._mmap_mode))
+
     def get_BasicWorm(self):
         """
         Return an instance of NormalizedSkeletonAndContour containing this
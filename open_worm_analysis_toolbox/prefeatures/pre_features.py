@@ -39,12 +39,13 @@ trackers and likely reflects constraints of the bodywall muscles, their
 innervation, and cuticular rigidity (Cronin et al. 2005)."
 
 """
+import multiprocessing
 import warnings
 import numpy as np
 
 from .. import config, utils
 from .skeleton_calculator1 import SkeletonCalculatorType1
-from .pre_features_helpers import WormParserHelpers
+from .pre_features_helpers import WormParserHelpers, BATCH_SIZE
 
 #%%
 
@@ -62,7 +63,8 @@ class WormParsing(object):
     @staticmethod
     def compute_skeleton_and_widths(h_ventral_contour,
                                     h_dorsal_contour,
-                                    frames_to_plot=[]):
+                                    frames_to_plot=[],
+                                    n_workers=1):
         """
         Compute widths and a heterocardinal skeleton from a heterocardinal
         contour.
@@ -75,6 +77,10 @@ class WormParsing(object):
         frames_to_plot: list of ints
             Optional list of frames to plot, to show exactly how the
             widths and skeleton were calculated.
+        n_workers: int
+            If greater than 1, the frames are split into contiguous chunks
+            which are processed by a pool of this many processes. The
+            results are identical to those of the serial calculation.
 
         Returns
         -------------------------
@@ -88,7 +94,14 @@ class WormParsing(object):
         SkeletonCalculatorType1.  In the future we might use
         alternative algorithms so this may become the place we swap them in.
 
+        The contours are smoothed in place, both in the serial and in the
+        parallel case.
+
         """
+        if n_workers > 1:
+            return WormParsing.h__computeSkeletonAndWidthsInPool(
+                h_ventral_contour, h_dorsal_contour, n_workers)
+
         (h_widths, h_skeleton) = \
             SkeletonCalculatorType1.compute_skeleton_and_widths(
             h_ventral_contour,
@@ -96,6 +109,69 @@ class WormParsing(object):
             frames_to_plot=[])
 
         return (h_widths, h_skeleton)
+
+    @staticmethod
+    def h__computeSkeletonAndWidthsInPool(h_ventral_contour,
+                                          h_dorsal_contour,
+                                          n_workers,
+                                          n_chunks_per_worker=4):
+        """
+        Split the frames into chunks and compute the skeleton and widths of
+        each chunk in a separate process.
+
+        The skeleton calculation gives the same values for a frame no matter
+        which other frames it is computed with, so the chunks can simply be
+        put back together in order.
+
+        The smoothed contours computed by the workers are copied back into
+        h_ventral_contour and h_dorsal_contour, as happens when calling
+        SkeletonCalculatorType1.compute_skeleton_and_widths directly.
+
+        Parameters
+        -------------------------
+        h_ventral_contour: list of numpy arrays.
+        h_dorsal_contour: list of numpy arrays.
+        n_workers: int
+            The number of processes to use
+        n_chunks_per_worker: int
+            More chunks than workers keeps all workers busy when some
+            chunks take longer than others.
+
+        Returns
+        -------------------------
+        (h_widths, h_skeleton): tuple
+
+        """
+        num_frames = len(h_ventral_contour)
+        n_chunks = min(num_frames, n_workers * n_chunks_per_worker)
+        chunk_edges = np.linspace(0, num_frames, n_chunks + 1).astype(int)
+        chunks = [(h_ventral_contour[start:stop], h_dorsal_contour[start:stop])
+                  for start, stop in zip(chunk_edges[:-1], chunk_edges[1:])]
+
+        pool = multiprocessing.Pool(n_workers)
+        try:
+            results = pool.map(_compute_skeleton_and_widths_chunk, chunks)
+        finally:
+            pool.terminate()
+
+        h_widths = []
+        h_skeleton = []
+        smoothed_ventral_contour = []
+        smoothed_dorsal_contour = []
+        for chunk_result in results:
+            h_widths.extend(chunk_result[0])
+            h_skeleton.extend(chunk_result[1])
+            smoothed_ventral_contour.extend(chunk_result[2])
+            smoothed_dorsal_contour.extend(chunk_result[3])
+
+        for h_contour, smoothed_contour in \
+                [(h_ventral_contour, smoothed_ventral_contour),
+                 (h_dorsal_contour, smoothed_dorsal_contour)]:
+            for contour, smoothed in zip(h_contour, smoothed_contour):
+                if contour is not None:
+                    contour[:] = smoothed
+
+        return (h_widths, h_skeleton)
     #%%
 
     @staticmethod
@@ -163,12 +239,25 @@ class WormParsing(object):
 
         """
         #%%
-        temp_angle_list = []  # TODO: pre-allocate the space we need
-        
-        #i am changing the skeleton to a list, this function can deal with 3D numpy arrays (like in the case of normalized worm)
-        if not isinstance(h_skeleton, list):
-            h_skeleton = WormParsing._h_array2list(h_skeleton)
-            
+        # Normalized skeletons, or any skeletons where all frames have the
+        # same number of points, are computed for all frames at once
+        if isinstance(h_skeleton, np.ndarray):
+            # (49,2,n) to (n,2,49)
+            skeletons = np.transpose(h_skeleton, (2, 1, 0))
+            # An all-NaN frame is an invalid skeleton
+            is_valid = ~np.all(np.isnan(skeletons), axis=(1, 2))
+            return WormParsing.h__computeAnglesBatch(skeletons[is_valid],
+                                                     is_valid)
+
+        n_points = set(x.shape[1] for x in h_skeleton if x is not None)
+        if len(n_points) == 1:
+            is_valid = np.array([x is not None for x in h_skeleton])
+            skeletons = np.array([x for x in h_skeleton if x is not None])
+            return WormParsing.h__computeAnglesBatch(skeletons, is_valid)
+
+        # Truly heterocardinal skeletons are computed frame by frame
+        temp_angle_list = []
+
         for frame_index, cur_skeleton in enumerate(h_skeleton):
             if cur_skeleton is None:
                 temp_angle_list.append([])
@@ -226,6 +315,76 @@ class WormParsing(object):
         return  WormParserHelpers.normalize_all_frames(
             temp_angle_list, h_skeleton, config.N_POINTS_NORMALIZED)
         #%%
+    @staticmethod
+    def h__computeAnglesBatch(skeletons, is_valid):
+        """
+        compute_angles for frames that all have the same number of points
+
+        Parameters
+        ----------------
+        skeletons: numpy array of shape (m,2,k)
+            The valid frames
+        is_valid: numpy array of bools, shape (n,)
+            Which of the n frames are valid, m of them being True
+
+        Returns
+        ----------------
+        numpy array of shape (49,n)
+
+        """
+        n_norm_points = config.N_POINTS_NORMALIZED
+        angles = np.full((n_norm_points, len(is_valid)), np.NaN)
+        valid_I = utils.find(is_valid)
+
+        for start in range(0, len(valid_I), BATCH_SIZE):
+            batch_I = valid_I[start:start + BATCH_SIZE]
+            # (n_batch,2,k)
+            xy = skeletons[start:start + BATCH_SIZE]
+            n_points = np.full(len(batch_I), xy.shape[2], dtype=int)
+
+            # (n_batch,k)
+            cc = WormParserHelpers.chain_code_lengths_cum_sum_batch(xy)
+
+            # This is from the old code
+            edge_length = cc[:, -1:] / 12
+
+            # We want all vertices to be defined, and if we look starting
+            # at the left_I for a vertex, rather than vertex for left and
+            # right then we could miss all middle points on worms being
+            # vertices
+            left_lengths = cc - edge_length
+            right_lengths = cc + edge_length
+
+            with np.errstate(invalid='ignore'):
+                is_vertex = (left_lengths > cc[:, :1]) & \
+                    (right_lengths < cc[:, -1:])
+            left_lengths[~is_vertex] = np.NaN
+            right_lengths[~is_vertex] = np.NaN
+
+            # (n_batch,2,k)
+            left_xy = WormParserHelpers.interp_batch(left_lengths, cc, xy,
+                                                     n_points)
+            right_xy = WormParserHelpers.interp_batch(right_lengths, cc, xy,
+                                                      n_points)
+
+            d2 = xy - right_xy
+            d1 = left_xy - xy
+
+            frame_angles = np.arctan2(d2[:, 1], d2[:, 0]) - \
+                np.arctan2(d1[:, 1], d1[:, 0])
+
+            with np.errstate(invalid='ignore'):
+                frame_angles[frame_angles > np.pi] -= 2 * np.pi
+                frame_angles[frame_angles < -np.pi] += 2 * np.pi
+
+            # Convert to degrees
+            frame_angles *= 180 / np.pi
+
+            angles[:, batch_I] = WormParserHelpers.normalize_padded_frames(
+                frame_angles, cc, n_points, n_norm_points).T
+
+        return angles
+
     #%%
     @staticmethod
     def compute_signed_area(contour):
@@ -308,3 +467,26 @@ class WormParsing(object):
         # For each frame, sum the chain code lengths to get the total length
         return np.sum(WormParserHelpers.chain_code_lengths(skeleton),
                       axis=0)
+
+
+def _compute_skeleton_and_widths_chunk(contours):
+    """
+    Pool worker for WormParsing.h__computeSkeletonAndWidthsInPool
+
+    Parameters
+    -------------------------
+    contours: (h_ventral_contour, h_dorsal_contour) tuple
+        The contours of a chunk of frames
+
+    Returns
+    -------------------------
+    (h_widths, h_skeleton, h_ventral_contour, h_dorsal_contour) tuple
+        The contours are returned after being smoothed
+
+    """
+    h_ventral_contour, h_dorsal_contour = contours
+    (h_widths, h_skeleton) = \
+        SkeletonCalculatorType1.compute_skeleton_and_widths(h_ventral_contour,
+                                                            h_dorsal_contour)
+
+    return (h_widths, h_skeleton, h_ventral_contour, h_dorsal_contour)
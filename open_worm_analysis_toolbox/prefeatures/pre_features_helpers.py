@@ -6,6 +6,9 @@ Created on Fri Jul  3 17:15:41 2015
 """
 import numpy as np
 
+# The number of frames that are normalized together
+BATCH_SIZE = 1000
+
 
 class WormParserHelpers:
 
@@ -109,23 +112,26 @@ class WormParserHelpers:
         --------------
         numpy array of shape (49,2,n)
 
+        Notes
+        --------------
+        The frames are normalized in batches, see normalize_frames_batch
+
         """
         n_frames = len(heterocardinal_property)
         normalized_data = np.full([num_norm_points, 2, n_frames],
                                   np.NaN)
 
-        for iFrame, cur_frame_value in enumerate(heterocardinal_property):
-            if cur_frame_value is not None:
-                # We need cur_frame_value to have shape (k,2), not (2,k)
-                cur_frame_value2 = np.rollaxis(cur_frame_value, 1)
-                cc = WormParserHelpers.chain_code_lengths_cum_sum(
-                    cur_frame_value2)
-
-                # Normalize both the x and the y
-                normalized_data[:, 0, iFrame] = WormParserHelpers.normalize_parameter(
-                    cur_frame_value[0, :], cc, num_norm_points)
-                normalized_data[:, 1, iFrame] = WormParserHelpers.normalize_parameter(
-                    cur_frame_value[1, :], cc, num_norm_points)
+        valid_I = [iFrame for iFrame, cur_frame_value in
+                   enumerate(heterocardinal_property)
+                   if cur_frame_value is not None]
+        for start in range(0, len(valid_I), BATCH_SIZE):
+            batch_I = valid_I[start:start + BATCH_SIZE]
+            batch_xy = [heterocardinal_property[I] for I in batch_I]
+            # (n_batch,2,num_norm_points)
+            batch_data = WormParserHelpers.normalize_frames_batch(
+                batch_xy, batch_xy, num_norm_points)
+            normalized_data[:, :, batch_I] = np.transpose(batch_data,
+                                                          (2, 1, 0))
 
         return normalized_data
 
@@ -160,25 +166,221 @@ class WormParserHelpers:
         normalized_data_shape = [num_norm_points, len(property_to_normalize)]
         normalized_data = np.full(normalized_data_shape, np.NaN)
 
-        # Normalize one frame at a time
-        for frame_index, (cur_frame_value, cur_xy) in \
-                enumerate(zip(property_to_normalize, xy_data)):
-            if cur_xy is not None:
-                # We need cur_xy to have shape (k,2), not (2,k)
-                cur_xy_reshaped = np.rollaxis(cur_xy, axis=1)
-                running_lengths = WormParserHelpers.chain_code_lengths_cum_sum(
-                    cur_xy_reshaped)
-
-                # Normalize cur_frame_value over an evenly-spaced set of
-                # 49 values spread from running_lengths[0] to
-                #                       running_lengths[-1]
-                normalized_data[:, frame_index] = \
-                    WormParserHelpers.normalize_parameter(cur_frame_value,
-                                                          running_lengths,
-                                                          num_norm_points)
+        valid_I = [frame_index for frame_index, cur_xy in enumerate(xy_data)
+                   if cur_xy is not None]
+        for start in range(0, len(valid_I), BATCH_SIZE):
+            batch_I = valid_I[start:start + BATCH_SIZE]
+            # (n_batch,num_norm_points)
+            batch_data = WormParserHelpers.normalize_frames_batch(
+                [property_to_normalize[I] for I in batch_I],
+                [xy_data[I] for I in batch_I],
+                num_norm_points)
+            normalized_data[:, batch_I] = batch_data.T
 
         return normalized_data
 
+    #%%
+    @staticmethod
+    def normalize_frames_batch(property_to_normalize, xy_data,
+                               num_norm_points):
+        """
+        Normalize many frames at once.
+
+        The frames are padded to a common number of points and then the
+        chain code lengths, the evenly spaced lengths and the interpolation
+        are computed for all frames together. The result is the same as
+        calling chain_code_lengths_cum_sum and normalize_parameter for each
+        frame.
+
+        Parameters
+        --------------
+        property_to_normalize: list of length n, of numpy arrays of shape
+                               (ki) or (2,ki)
+        xy_data: list of length n, of numpy arrays of shape (2, ki)
+            None is not allowed.
+        num_norm_points: int
+
+        Returns
+        --------------
+        numpy array of shape (n,num_norm_points) or (n,2,num_norm_points)
+
+        """
+        xy = WormParserHelpers.pad_frames(xy_data)
+        values = WormParserHelpers.pad_frames(property_to_normalize)
+        n_points = np.array([x.shape[-1] for x in xy_data], dtype=int)
+
+        # (n,max(ki))
+        running_lengths = WormParserHelpers.chain_code_lengths_cum_sum_batch(
+            xy)
+
+        return WormParserHelpers.normalize_padded_frames(
+            values, running_lengths, n_points, num_norm_points)
+
+    #%%
+    @staticmethod
+    def normalize_padded_frames(values, running_lengths, n_points,
+                                num_norm_points):
+        """
+        normalize_frames_batch for frames that have already been padded,
+        and whose chain code lengths have already been computed.
+
+        Parameters
+        --------------
+        values: numpy array of shape (n,k) or (n,2,k)
+        running_lengths: numpy array of shape (n,k)
+            See chain_code_lengths_cum_sum_batch
+        n_points: numpy array of ints, shape (n,)
+            The number of points of each frame
+        num_norm_points: int
+
+        Returns
+        --------------
+        numpy array of shape (n,num_norm_points) or (n,2,num_norm_points)
+
+        """
+        n_frames = running_lengths.shape[0]
+
+        # Same as np.linspace(running_lengths[0], running_lengths[-1],
+        #                     num_norm_points) for each frame
+        start_lengths = running_lengths[:, 0]
+        stop_lengths = running_lengths[np.arange(n_frames), n_points - 1]
+        step = (stop_lengths - start_lengths) / (num_norm_points - 1)
+        new_lengths = np.arange(num_norm_points) * step[:, None]
+        new_lengths += start_lengths[:, None]
+        new_lengths[:, -1] = stop_lengths
+
+        return WormParserHelpers.interp_batch(new_lengths, running_lengths,
+                                              values, n_points)
+
+    #%%
+    @staticmethod
+    def pad_frames(heterocardinal_property):
+        """
+        Stack a list of frames with different numbers of points into one
+        array, padded with NaN.
+
+        Parameters
+        --------------
+        heterocardinal_property: list of length n, of numpy arrays of
+                                 shape (ki) or (2,ki)
+
+        Returns
+        --------------
+        numpy array of shape (n,max(ki)) or (n,2,max(ki))
+
+        """
+        max_n_points = max(x.shape[-1] for x in heterocardinal_property)
+        padded = np.full((len(heterocardinal_property),) +
+                         heterocardinal_property[0].shape[:-1] +
+                         (max_n_points,), np.NaN)
+        for frame_index, cur_frame_value in \
+                enumerate(heterocardinal_property):
+            padded[frame_index, ..., :cur_frame_value.shape[-1]] = \
+                cur_frame_value
+
+        return padded
+
+    #%%
+    @staticmethod
+    def chain_code_lengths_cum_sum_batch(xy):
+        """
+        chain_code_lengths_cum_sum for many frames at once.
+
+        Parameters
+        --------------
+        xy: numpy array of shape (n,2,k)
+            Padded frames, see pad_frames
+
+        Returns
+        --------------
+        numpy array of shape (n,k)
+            NaN beyond the last point of each frame
+
+        """
+        # (n,k-1)
+        distances = np.linalg.norm(np.diff(xy, axis=2), axis=1)
+        # Prepend a zero element so the cumulative sum starts at 0
+        distances = np.concatenate([np.zeros((xy.shape[0], 1)), distances],
+                                   axis=1)
+
+        return np.cumsum(distances, axis=1)
+
+    #%%
+    @staticmethod
+    def interp_batch(x, xp, fp, n_points):
+        """
+        np.interp for many frames at once.
+
+        Parameters
+        --------------
+        x: numpy array of shape (n,m)
+            The positions to interpolate at, for each frame
+        xp: numpy array of shape (n,k)
+            Non-decreasing positions of the data points. Values beyond
+            n_points for a frame are ignored.
+        fp: numpy array of shape (n,k) or (n,c,k)
+            The data to interpolate
+        n_points: numpy array of ints, shape (n,)
+            The number of data points in each frame
+
+        Returns
+        --------------
+        numpy array of shape (n,m) or (n,c,m)
+            As with np.interp, values outside of the range of xp are the
+            first or last value of fp and NaN values of x give NaN.
+
+        """
+        n_frames = x.shape[0]
+        frame_I = np.arange(n_frames)[:, None]
+        last_I = (n_points - 1)[:, None]
+
+        # Find the last data point at or before each x (binary search).
+        # The index stays at 0 for values before the first point.
+        lo = np.zeros(x.shape, dtype=int)
+        hi = np.broadcast_to(last_I, x.shape).copy()
+        with np.errstate(invalid='ignore'):
+            while np.any(lo < hi):
+                mid = (lo + hi + 1) // 2
+                is_before = xp[frame_I, mid] <= x
+                lo = np.where(is_before, mid, lo)
+                hi = np.where(is_before, hi, mid - 1)
+        lo_next = np.minimum(lo + 1, last_I)
+
+        if fp.ndim == 3:
+            x = x[:, None, :]
+            frame_I = frame_I[:, None, :]
+            channel_I = np.arange(fp.shape[1])[None, :, None]
+            lo = lo[:, None, :]
+            lo_next = lo_next[:, None, :]
+            fp_lo = fp[frame_I, channel_I, lo]
+            fp_next = fp[frame_I, channel_I, lo_next]
+            last_I = last_I[:, None, :]
+            fp_first = fp[:, :, 0:1]
+            fp_last = fp[frame_I, channel_I, last_I]
+        else:
+            fp_lo = fp[frame_I, lo]
+            fp_next = fp[frame_I, lo_next]
+            fp_first = fp[:, 0:1]
+            fp_last = fp[frame_I, last_I]
+
+        xp_lo = xp[frame_I, lo]
+        xp_next = xp[frame_I, lo_next]
+        xp_first = xp[:, 0:1]
+        xp_last = xp[frame_I, last_I]
+        if fp.ndim == 3:
+            xp_first = xp_first[:, None, :]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = (fp_next - fp_lo) / (xp_next - xp_lo)
+            values = slope * (x - xp_lo) + fp_lo
+
+            values = np.where(x == xp_lo, fp_lo, values)
+            values = np.where(x < xp_first, fp_first, values)
+            values = np.where(x >= xp_last, fp_last, values)
+        values[np.broadcast_to(np.isnan(x), values.shape)] = np.NaN
+
+        return values
+
     #%%
     @staticmethod
     def normalize_parameter(prop_to_normalize, running_lengths,
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+RaggedArray: a compact container for "heterocardinal" data, i.e. data
+with a varying number of points per frame.
+
+Rather than a list with one numpy array per frame, all frames are stored
+one after another in a single buffer. The frames are accessed as views
+into this buffer, so a RaggedArray can be used anywhere a list of
+frames is expected:
+
+    h_skeleton = RaggedArray.from_list([np.zeros((2, 10)), None,
+                                        np.ones((2, 12))])
+    len(h_skeleton)       # 3
+    h_skeleton[2].shape   # (2, 12), a view into h_skeleton.data
+    h_skeleton[1]         # None
+    for frame in h_skeleton:
+        ...
+
+Code that works on all frames at once can use the buffer directly, e.g.
+h_skeleton.data[0] holds the x coordinates of all frames.
+
+"""
+
+import numpy as np
+
+from .. import utils
+
+
+class RaggedArray(object):
+    """
+    A sequence of frames, each a numpy array of shape (..., k_i), or None
+    for missing frames.
+
+    Attributes
+    ----------
+    data : numpy array of shape (..., sum(k_i))
+        The points of all frames. Frame i is
+        data[..., offsets[i]:offsets[i + 1]]
+    offsets : numpy array of ints, shape (n + 1,)
+    is_valid : numpy array of bools, shape (n,)
+        False for missing frames (None). Missing frames have no points.
+
+    """
+
+    def __init__(self, data, offsets, is_valid):
+        self.data = data
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.is_valid = np.asarray(is_valid, dtype=bool)
+
+        assert(len(self.offsets) == len(self.is_valid) + 1)
+        assert(self.offsets[-1] == self.data.shape[-1])
+
+    @classmethod
+    def from_list(cls, frames, dtype=None):
+        """
+        Parameters
+        ----------
+        frames : list of numpy arrays of shape (..., k_i), or None
+            All frames must have the same leading dimensions, e.g. (2,) for
+            a skeleton or contour, or () for widths.
+        dtype : numpy dtype, optional
+            By default the dtype is determined from the frames.
+
+        """
+        is_valid = np.array([x is not None for x in frames], dtype=bool)
+        valid_frames = [np.asarray(x) for x in frames if x is not None]
+
+        n_points = np.zeros(len(frames), dtype=np.int64)
+        n_points[is_valid] = [x.shape[-1] for x in valid_frames]
+        offsets = np.concatenate([[0], np.cumsum(n_points)])
+
+        if dtype is None:
+            dtypes = set(x.dtype for x in valid_frames)
+            dtype = np.result_type(*dtypes) if dtypes else float
+
+        if valid_frames:
+            data = np.concatenate(valid_frames, axis=-1).astype(dtype,
+                                                                copy=False)
+        else:
+            data = np.empty((0,), dtype=dtype)
+
+        return cls(data, offsets, is_valid)
+
+    @classmethod
+    def as_ragged(cls, frames):
+        """
+        Returns frames as a RaggedArray, without copying if it already is
+        one. None is returned as None.
+        """
+        if frames is None or isinstance(frames, cls):
+            return frames
+        return cls.from_list(frames)
+
+    def to_list(self):
+        """
+        Returns a list of the frames, as views into self.data
+        """
+        return list(self)
+
+    @property
+    def n_points(self):
+        """
+        The number of points of each frame, with 0 for missing frames
+        """
+        return np.diff(self.offsets)
+
+    def frame_indices(self):
+        """
+        Returns the frame index of each point in self.data
+        """
+        return np.repeat(np.arange(len(self)), self.n_points)
+
+    def to_padded(self, fill_value=np.NaN):
+        """
+        Returns a numpy array of shape (n, ..., max(k_i)), where frames
+        with fewer points, and missing frames, are padded with fill_value.
+        """
+        n_points = self.n_points
+        max_n_points = n_points.max() if len(self) > 0 else 0
+        padded = np.full((len(self),) + self.data.shape[:-1] +
+                         (max_n_points,), fill_value)
+
+        point_I = np.arange(self.data.shape[-1]) - \
+            np.repeat(self.offsets[:-1], n_points)
+        # Move the point axis next to the frame axis for the assignment
+        padded = np.moveaxis(padded, -1, 1)
+        padded[self.frame_indices(), point_I] = np.moveaxis(self.data, -1, 0)
+
+        return np.moveaxis(padded, 1, -1)
+
+    def __len__(self):
+        return len(self.is_valid)
+
+    def __iter__(self):
+        for frame_index in range(len(self)):
+            yield self._get_frame(frame_index)
+
+    def __getitem__(self, index):
+        """
+        An integer index returns a view of the frame (or None). A slice
+        returns a RaggedArray which shares the same buffer when the slice
+        step is 1.
+        """
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                data_start = self.offsets[start]
+                data_stop = self.offsets[stop]
+                return RaggedArray(
+                    self.data[..., data_start:data_stop],
+                    self.offsets[start:stop + 1] - data_start,
+                    self.is_valid[start:stop])
+            return RaggedArray.from_list(
+                [self._get_frame(I) for I in range(start, stop, step)],
+                dtype=self.data.dtype)
+
+        return self._get_frame(self._check_index(index))
+
+    def __setitem__(self, index, value):
+        """
+        Replace one frame. This is done in place when the new frame has the
+        same number of points; otherwise the buffer is rebuilt.
+        """
+        frame_index = self._check_index(index)
+        start, stop = self.offsets[frame_index:frame_index + 2]
+
+        if value is None:
+            if not self.is_valid[frame_index]:
+                return
+        elif self.is_valid[frame_index] and \
+                np.shape(value)[-1] == stop - start:
+            self.data[..., start:stop] = value
+            return
+
+        frames = self.to_list()
+        frames[frame_index] = value
+        temp = RaggedArray.from_list(frames)
+        self.data = temp.data
+        self.offsets = temp.offsets
+        self.is_valid = temp.is_valid
+
+    def _check_index(self, index):
+        n_frames = len(self)
+        if index < 0:
+            index += n_frames
+        if index < 0 or index >= n_frames:
+            raise IndexError('Frame index out of range')
+        return index
+
+    def _get_frame(self, frame_index):
+        if not self.is_valid[frame_index]:
+            return None
+        return self.data[..., self.offsets[frame_index]:
+                         self.offsets[frame_index + 1]]
+
+    def __repr__(self):
+        return utils.print_object(self)
@@ -12,12 +12,16 @@ import matplotlib.pyplot as plt
 # check out this: http://stackoverflow.com/questions/29324814/
 # Instead we use the following statement:
 from scipy.signal import savgol_filter as sgolay
+from scipy.signal import savgol_coeffs
 
 from .. import utils
 from .pre_features_helpers import WormParserHelpers
 
 #%%
 
+# The default # of frames to match at once, see compute_skeleton_and_widths
+BATCH_SIZE = 64
+
 
 class SkeletonCalculatorType1(object):
 
@@ -30,7 +34,8 @@ class SkeletonCalculatorType1(object):
     @staticmethod
     def compute_skeleton_and_widths(h_ventral_contour,
                                     h_dorsal_contour,
-                                    frames_to_plot=[]):
+                                    frames_to_plot=[],
+                                    batch_size=BATCH_SIZE):
         """
         Compute widths and a heterocardinal skeleton from a heterocardinal
         contour.
@@ -43,6 +48,10 @@ class SkeletonCalculatorType1(object):
         frames_to_plot: list of ints
             Optional list of frames to plot, to show exactly how the
             widths and skeleton were calculated.
+        batch_size: int
+            The number of frames that are matched together in a single
+            set of array operations. Memory use scales with
+            batch_size * (max # of contour points) ** 2.
 
 
         Returns
@@ -85,6 +94,14 @@ class SkeletonCalculatorType1(object):
         Therefore, when a spike is present, the spiked side walks while the
         other sideremains still.
 
+        Implementation notes:
+        -------------------------
+        The smoothing, distance, normal vector and matching computations are
+        done on many frames at once. Smoothing is batched over frames with
+        the same number of contour points. For matching, frames are padded
+        with NaN to a common number of points. Only the walk at the head
+        and tail (h__updateEndsByWalking) is done one frame at a time.
+
         """
         FRACTION_WORM_SMOOTH = 1.0 / 12.0
         SMOOTHING_ORDER = 3
@@ -98,238 +115,210 @@ class SkeletonCalculatorType1(object):
         h_widths = [None] * num_frames
 
         profile_times = {'sgolay': 0,
-                         'transpose': 0,
-                         'h__getBounds': 0,
+                         'resampling': 0,
+                         'padding': 0,
+                         'distances': 0,
+                         'h__getBoundsBatch': 0,
                          'compute_normal_vectors': 0,
-                         'h__getMatches': 0,
+                         'h__getMatchesBatch': 0,
                          'h__updateEndsByWalking': 0,
-                         'hstack': 0,
                          'final calculations': 0}
 
-        for frame_index, (s1, s2) in \
-                enumerate(zip(h_ventral_contour, h_dorsal_contour)):
-                    
-            # If the frame has no contour values, assign no skeleton
-            # or widths values
-            if s1 is None:
-                continue
-            assert s1.shape[0] == 2 #x-y must be in the first dimension
-            
-            # Smoothing of the contour
-            #------------------------------------------
-            start = utils.timing_function()
-            # Step 1: filter
-            
-            def _smooth_vec(sv):
-                filter_width_sv = utils.round_to_odd(sv.shape[1] *
-                                                     FRACTION_WORM_SMOOTH)
-                try:
-                    sv[0, :] = sgolay(sv[0, :], window_length=filter_width_sv,
-                                      polyorder=SMOOTHING_ORDER)
-                    sv[1, :] = sgolay(sv[1, :], window_length=filter_width_sv,
-                                      polyorder=SMOOTHING_ORDER)
-                except ValueError:
-                    pass
-                return sv
-            
-            s1 = _smooth_vec(s1)
-            s2= _smooth_vec(s2)
-            
-            
-            profile_times['sgolay'] += utils.timing_function() - start
-
-            """
-            # We require the contours to be coincident at the beginning
-            # and end.  If they are not, add a middle point that joins them.
-            if (s1[:,0] - s2[:,0] != 0).any():
-                new_first_point = (s1[:,0] + s2[:,0]) / 2
-                # We must have same dimensions to concatenate, so go from
-                # shape (2,) to shape (2,1)
-                new_first_point = new_first_point[:, None]
-                # Now concatenate shape (2,1) with shape (2,k) along the
-                # second axis, for a new array of shape (2,k+1)
-                s1 = np.concatenate([new_first_point, s1], axis=1)
-                s2 = np.concatenate([new_first_point, s2], axis=1)
-
-            if (s1[:,-1] - s2[:,-1] != 0).any():
-                new_last_point = (s1[:,-1] + s2[:,-1]) / 2
-                # We must have same dimensions to concatenate, so go from
-                # shape (2,) to shape (2,1)
-                new_last_point = new_last_point[:, None]
-
-                s1 = np.concatenate([s1, new_last_point], axis=1)
-                s2 = np.concatenate([s2, new_last_point], axis=1)
-            """
-
-            # UP/DOWNSAMPLE if number of points is not betwen 49 and 250,
-            # which seem like reasonable numbers.
-            if s1.shape[1] < 49 or s1.shape[1] > 250:
-                if s1.shape[1] < 49:
-                    num_norm_points = 75
-                else:
-                    num_norm_points = 200
-                # Upsample if we have too few points
-                s1 = WormParserHelpers.normalize_all_frames_xy(
-                    [s1], num_norm_points=num_norm_points)
-
-                # There is only one frame so let's take that dimension out,
-                # and transform s1 and s2 from having shape (k,2,n) to (k,2)
-                s1 = s1[:, :, 0]
-
-                # normalized_all_frames_xy rolls the axis so let's roll it back
-                s1 = np.rollaxis(s1, 1)
+        # If the frame has no contour values, assign no skeleton
+        # or widths values
+        valid_frames = [frame_index for frame_index, s1 in
+                        enumerate(h_ventral_contour) if s1 is not None]
+        for frame_index in valid_frames:
+            # x-y must be in the first dimension
+            assert h_ventral_contour[frame_index].shape[0] == 2
+
+        # Smoothing of the contour
+        #------------------------------------------
+        # NOTE: As in the original frame by frame implementation, the
+        # smoothed values are written back into the input contours.
+        start = utils.timing_function()
+        all_s1 = [h_ventral_contour[I] for I in valid_frames]
+        all_s2 = [h_dorsal_contour[I] for I in valid_frames]
+        SkeletonCalculatorType1.h__smoothContours(all_s1,
+                                                  FRACTION_WORM_SMOOTH,
+                                                  SMOOTHING_ORDER)
+        SkeletonCalculatorType1.h__smoothContours(all_s2,
+                                                  FRACTION_WORM_SMOOTH,
+                                                  SMOOTHING_ORDER)
+        profile_times['sgolay'] += utils.timing_function() - start
+
+        # UP/DOWNSAMPLE if number of points is not betwen 49 and 250,
+        # which seem like reasonable numbers.
+        start = utils.timing_function()
+        for I in range(len(valid_frames)):
+            all_s1[I], all_s2[I] = \
+                SkeletonCalculatorType1.h__resampleSides(all_s1[I], all_s2[I])
+        profile_times['resampling'] += utils.timing_function() - start
+
+        # Frames are processed in batches of similar size to limit the
+        # amount of padding. The result for a frame does not depend on the
+        # other frames in its batch.
+        n_points = [max(s1.shape[1], s2.shape[1])
+                    for s1, s2 in zip(all_s1, all_s2)]
+        batch_order = np.argsort(n_points, kind='mergesort')
+
+        for batch_start in range(0, len(batch_order), batch_size):
+            batch_I = batch_order[batch_start:batch_start + batch_size]
+            batch_s1 = [all_s1[I] for I in batch_I]
+            batch_s2 = [all_s2[I] for I in batch_I]
 
-            if s2.shape[1] < 49 or s2.shape[1] > 250:
-                if s1.shape[1] < 49:
-                    num_norm_points = 75
-                else:
-                    num_norm_points = 200
-                # For documentation see the above for s1
-                s2 = WormParserHelpers.normalize_all_frames_xy(
-                    [s2], num_norm_points=num_norm_points)
-                s2 = s2[:, :, 0]
-                s2 = np.rollaxis(s2, 1)
+            start = utils.timing_function()
+            n_s1 = np.array([s1.shape[1] for s1 in batch_s1])
+            n_s2 = np.array([s2.shape[1] for s2 in batch_s2])
+            padded_s1 = SkeletonCalculatorType1.h__padSides(batch_s1)
+            padded_s2 = SkeletonCalculatorType1.h__padSides(batch_s2)
+            profile_times['padding'] += utils.timing_function() - start
 
             # Calculation of distances
             #-----------------------------------
             # Find the distance from each point in s1 to EVERY point in s2
-            # Thus dx_across[0,5] gives the x-distance from point 0 on s1 to
-            # point 5 on s2. The operation gives us an array of shape
-            # (s1.shape[1],s2.shape[1])
-            dx_across = np.transpose(s1[0, :][None, :]) - s2[0, :]
-            dy_across = np.transpose(s1[1, :][None, :]) - s2[1, :]
-
-            # d_across_partials has shape (ki, ji, 2)
-            d_across_partials = np.dstack([dx_across, dy_across])
-            d_across = np.linalg.norm(d_across_partials, axis=2)
-            dx_across = dx_across / d_across
-            dy_across = dy_across / d_across
+            # Thus dx_across[f,0,5] gives the x-distance from point 0 on s1
+            # to point 5 on s2 in frame f of the batch. The operation gives
+            # us arrays of shape (batch,max(ki),max(ji))
+            start = utils.timing_function()
+            dx_across = padded_s1[:, 0, :, None] - padded_s2[:, 0, None, :]
+            dy_across = padded_s1[:, 1, :, None] - padded_s2[:, 1, None, :]
+            d_across = np.sqrt(dx_across * dx_across + dy_across * dy_across)
+            dx_across /= d_across
+            dy_across /= d_across
+            profile_times['distances'] += utils.timing_function() - start
 
             # Determine search bounds for possible "projection pairs"
             #------------------------------------------------
             start = utils.timing_function()
             left_indices, right_indices = \
-                SkeletonCalculatorType1.h__getBounds(s1.shape[1],
-                                                     s2.shape[1],
-                                                     PERCENT_BACK_SEARCH,
-                                                     PERCENT_FORWARD_SEARCH)
-
-            profile_times['h__getBounds'] += utils.timing_function() - start
+                SkeletonCalculatorType1.h__getBoundsBatch(
+                    n_s1, n_s2, padded_s1.shape[2],
+                    PERCENT_BACK_SEARCH, PERCENT_FORWARD_SEARCH)
+            profile_times['h__getBoundsBatch'] += \
+                utils.timing_function() - start
+
+            # For each point on side 1, calculate normalized orthogonal
+            # values
             start = utils.timing_function()
-
-            # For each point on side 1, calculate normalized orthogonal values
-            norm_x, norm_y = utils.compute_normal_vectors(s1)
-
+            norm_x, norm_y = \
+                SkeletonCalculatorType1.h__computeNormalVectorsBatch(
+                    padded_s1, n_s1)
             profile_times[
                 'compute_normal_vectors'] += utils.timing_function() - start
-            start = utils.timing_function()
 
-            # For each point on side 1, find which side 2 the point pairs with
-            match_I1 = SkeletonCalculatorType1.h__getMatches(s1, s2,
-                                                             norm_x, norm_y,
-                                                             dx_across,
-                                                             dy_across,
-                                                             d_across,
-                                                             left_indices,
-                                                             right_indices)
-
-            profile_times['h__getMatches'] += utils.timing_function() - start
+            # For each point on side 1, find which side 2 the point pairs
+            # with
             start = utils.timing_function()
-
-            # Pair off the points from one contour to the other
-            I_1, I_2 = SkeletonCalculatorType1.h__updateEndsByWalking(
-                d_across,
-                match_I1,
-                s1, s2,
-                END_S1_WALK_PCT)
-
-            profile_times[
-                'h__updateEndsByWalking'] += utils.timing_function() - start
-
-            # We're looking to the left and to the right to ensure that
-            # things are ordered
-            #                                    current is before next
-            is_good = np.hstack((True, np.array((I_2[1:-1] <= I_2[2:]) & \
-                                                # current after previous
-                                                (I_2[1:-1] >= I_2[:-2])),
-                                 True))
-            # Filter out invalid entries
-            I_1 = I_1[is_good]
-            I_2 = I_2[is_good]
-
-            # TODO: Allow smoothing on x & y
-
-            # Create the skeleton sides
-            s1 = s1[:, I_1]
-            s1_p = s2[:, I_2]
-            # The widths are simply the distance between the sides
-            h_widths[frame_index] = np.linalg.norm(s1_p - s1, axis=0)
-            # The skeleton is simply the midpoint between the sides
-            h_skeleton[frame_index] = (s1 + s1_p) / 2
-
-            # DEBUG
-            # print("Final skeleton shape of frame %d: %s" %
-            #      (frame_index, str(h_skeleton[frame_index].shape)))
-
-            # DEBUG
-            # Optional plotting code
-            if frame_index in frames_to_plot:
-                fig = plt.figure()
-                # ARRANGE THE PLOTS AS:
-                # AX1 AX1 AX2
-                # AX1 AX1 AX3
-                ax1 = plt.subplot2grid((2, 3), (0, 0), rowspan=2, colspan=2)
-                #ax2 = plt.subplot2grid((2,3), (0,2))
-                ax3 = plt.subplot2grid((2, 3), (1, 2))
-                ax1.set_title("Frame #%d of %d" % (frame_index,
-                                                   len(h_ventral_contour)))
-
-                # The points along one side of the worm
-                ax1.scatter(s1[0, :], s1[1, :], marker='o',
-                            edgecolors='r', facecolors='none')
-                # The points along the other side
-                ax1.scatter(s2[0, :], s2[1, :], marker='o',
-                            edgecolors='b', facecolors='none')
-
-                # To plot the widths, we need to run
-                # plot([x1,x2],[y1,y2]), for each line segment
-                for i in range(s1_p.shape[1]):
-                    ax1.plot([s1_p[0, i], s1[0, i]], [s1_p[1, i], s1[1, i]],
-
-                             # ax1.plot([s1_px[i], s1_x[i]], [s1_py[i],
-                             # s1_y[i]],
-                             color='g')
-
-                skeleton = h_skeleton[frame_index]
-                # The skeleton points
-                ax1.scatter(skeleton[0, :], skeleton[1, :], marker='D',
-                            edgecolors='b', facecolors='none')
-                # The skeleton points, connected
-                ax1.plot(skeleton[0, :], skeleton[1, :], color='navy')
-
-                """
-                # TODO: Jim's original method for plotting this was:
-                # Width should really be plotted as a function of
-                # distance along the skeleton
-                cum_dist = h__getSkeletonDistance(skeleton_x, skeleton_y)
-
-                ax2.plot(cum_dist./cum_dist[-1], h_widths[frame_index],
-                         'r.-')
-                hold on
-                ax2.plot(np.linspace(0,1,49), nw_widths[:,iFrame], 'g.-')
-                hold off
-                """
-
-                # Now let's plot each of the 200+ width values as the
-                # y coordinate.
-                ax3.set_title = "Worm width at each calculation point"
-                ax3.set_xlabel("Calculation point")
-                ax3.set_ylabel("Width")
-                with plt.style.context('fivethirtyeight'):
-                    ax3.plot(h_widths[frame_index], color='green',
-                             linewidth=2)
-
-                plt.show()
+            all_match_I1 = SkeletonCalculatorType1.h__getMatchesBatch(
+                n_s1, n_s2, norm_x, norm_y, dx_across, dy_across, d_across,
+                left_indices, right_indices)
+            profile_times['h__getMatchesBatch'] += \
+                utils.timing_function() - start
+
+            for batch_index, I in enumerate(batch_I):
+                frame_index = valid_frames[I]
+                s1 = batch_s1[batch_index]
+                s2 = batch_s2[batch_index]
+                n1 = n_s1[batch_index]
+                n2 = n_s2[batch_index]
+                match_I1 = all_match_I1[batch_index, :n1].copy()
+
+                start = utils.timing_function()
+                # Pair off the points from one contour to the other
+                I_1, I_2 = SkeletonCalculatorType1.h__updateEndsByWalking(
+                    d_across[batch_index, :n1, :n2],
+                    match_I1,
+                    s1, s2,
+                    END_S1_WALK_PCT)
+
+                profile_times[
+                    'h__updateEndsByWalking'] += utils.timing_function() - start
+                start = utils.timing_function()
+
+                # We're looking to the left and to the right to ensure that
+                # things are ordered
+                #                                    current is before next
+                is_good = np.hstack((True, np.array((I_2[1:-1] <= I_2[2:]) &
+                                                    # current after previous
+                                                    (I_2[1:-1] >= I_2[:-2])),
+                                     True))
+                # Filter out invalid entries
+                I_1 = I_1[is_good]
+                I_2 = I_2[is_good]
+
+                # TODO: Allow smoothing on x & y
+
+                # Create the skeleton sides
+                s1 = s1[:, I_1]
+                s1_p = s2[:, I_2]
+                # The widths are simply the distance between the sides
+                h_widths[frame_index] = np.linalg.norm(s1_p - s1, axis=0)
+                # The skeleton is simply the midpoint between the sides
+                h_skeleton[frame_index] = (s1 + s1_p) / 2
+
+                profile_times[
+                    'final calculations'] += utils.timing_function() - start
+
+                # DEBUG
+                # Optional plotting code
+                if frame_index in frames_to_plot:
+                    fig = plt.figure()
+                    # ARRANGE THE PLOTS AS:
+                    # AX1 AX1 AX2
+                    # AX1 AX1 AX3
+                    ax1 = plt.subplot2grid((2, 3), (0, 0), rowspan=2, colspan=2)
+                    #ax2 = plt.subplot2grid((2,3), (0,2))
+                    ax3 = plt.subplot2grid((2, 3), (1, 2))
+                    ax1.set_title("Frame #%d of %d" % (frame_index,
+                                                       len(h_ventral_contour)))
+
+                    # The points along one side of the worm
+                    ax1.scatter(s1[0, :], s1[1, :], marker='o',
+                                edgecolors='r', facecolors='none')
+                    # The points along the other side
+                    ax1.scatter(s2[0, :], s2[1, :], marker='o',
+                                edgecolors='b', facecolors='none')
+
+                    # To plot the widths, we need to run
+                    # plot([x1,x2],[y1,y2]), for each line segment
+                    for i in range(s1_p.shape[1]):
+                        ax1.plot([s1_p[0, i], s1[0, i]], [s1_p[1, i], s1[1, i]],
+
+                                 # ax1.plot([s1_px[i], s1_x[i]], [s1_py[i],
+                                 # s1_y[i]],
+                                 color='g')
+
+                    skeleton = h_skeleton[frame_index]
+                    # The skeleton points
+                    ax1.scatter(skeleton[0, :], skeleton[1, :], marker='D',
+                                edgecolors='b', facecolors='none')
+                    # The skeleton points, connected
+                    ax1.plot(skeleton[0, :], skeleton[1, :], color='navy')
+
+                    """
+                    # TODO: Jim's original method for plotting this was:
+                    # Width should really be plotted as a function of
+                    # distance along the skeleton
+                    cum_dist = h__getSkeletonDistance(skeleton_x, skeleton_y)
+
+                    ax2.plot(cum_dist./cum_dist[-1], h_widths[frame_index],
+                             'r.-')
+                    hold on
+                    ax2.plot(np.linspace(0,1,49), nw_widths[:,iFrame], 'g.-')
+                    hold off
+                    """
+
+                    # Now let's plot each of the 200+ width values as the
+                    # y coordinate.
+                    ax3.set_title = "Worm width at each calculation point"
+                    ax3.set_xlabel("Calculation point")
+                    ax3.set_ylabel("Width")
+                    with plt.style.context('fivethirtyeight'):
+                        ax3.plot(h_widths[frame_index], color='green',
+                                 linewidth=2)
+
+                    plt.show()
 
         # DEBUG
         # print(profile_times)
@@ -387,146 +376,6 @@ class SkeletonCalculatorType1(object):
 
         return start_indices.astype(np.int), stop_indices.astype(np.int)
 
-    #%%
-    @staticmethod
-    def h__getMatches(s1, s2,
-                      norm_x, norm_y,
-                      dx_across, dy_across, d_across,
-                      left_I, right_I):
-        """
-        For a given frame,
-        For each point on side 1, find which side 2 the point pairs with
-
-        Parameters
-        ---------------
-        s1: list of numpy arrays, with the arrays having shape (2,ki)
-            One side of the contour.  ki is the number of points in frame i
-        s2: list of numpy arrays, with the arrays having shape (2,ji)
-            The other side of the contour.  ji is the number of points in
-            frame i
-        norm_x:
-        norm_y:
-        dx_across:
-        dy_across:
-        d_across: 2d numpy array of shape (ki, ji)
-            A lookup table giving the distance from a point on one
-            of the contour to any point on the other side.
-        left_I:
-        right_I:
-
-        Returns
-        ---------------
-        match_indices: numpy array of integers, of shape (ki) where
-            ki is the number of contour points in s1
-
-        """
-        n_s1 = s1.shape[1]
-        match_I = np.zeros(n_s1, dtype=int)
-        match_I[0] = 0
-        match_I[-1] = s2.shape[1]
-
-        dp_values = np.zeros(n_s1)
-        all_signs_used = np.zeros(n_s1)
-
-        # There is no need to do the first and last point
-        for I, (lb, rb) in enumerate(zip(left_I[1:-1], right_I[1:-1])):
-            I = I + 1
-            [abs_dp_value, dp_I, sign_used] = SkeletonCalculatorType1.\
-                h__getProjectionIndex(norm_x[I], norm_y[I],
-                                      dx_across[I, lb:rb], dy_across[I, lb:rb],
-                                      lb,
-                                      d_across[I, lb:rb], 0)
-            all_signs_used[I] = sign_used
-            dp_values[I] = abs_dp_value
-            match_I[I] = dp_I
-
-        if not np.all(all_signs_used[1:-1] == all_signs_used[1]):
-            if np.sum(all_signs_used) > 0:
-                sign_use = 1
-                I_bad = utils.find(all_signs_used[1:-1] != 1) + 1
-            else:
-                I_bad = utils.find(all_signs_used[1:-1] != -1) + 1
-                sign_use = -1
-
-            for I in I_bad:
-                lb = left_I[I]
-                rb = right_I[I]
-                [abs_dp_value, dp_I, sign_used] = SkeletonCalculatorType1.\
-                    h__getProjectionIndex(norm_x[I], norm_y[I],
-                                          dx_across[I, lb:rb], dy_across[I, lb:rb],
-                                          lb,
-                                          d_across[I, lb:rb], sign_use)
-                all_signs_used[I] = sign_used
-                dp_values[I] = abs_dp_value
-                match_I[I] = dp_I
-
-        return match_I
-
-    #%%
-    @staticmethod
-    def h__getProjectionIndex(vc_dx_ortho, vc_dy_ortho,
-                              dx_across_worm, dy_across_worm,
-                              left_I, d_across, sign_use):
-        """
-
-        Matlab code:
-        nvc_local = nvc(nvc_indices_use,:);
-
-        dx_across_worm = cur_point(1) - nvc_local(:,1);
-        dy_across_worm = cur_point(2) - nvc_local(:,2);
-
-        d_magnitude = sqrt(dx_across_worm.^2+dy_across_worm.^2);
-
-        dx_across_worm = dx_across_worm./d_magnitude;
-        dy_across_worm = dy_across_worm./d_magnitude;
-
-        """
-
-        # SPEED: Compute normalized distances for all pairs ...
-        # Might need to downsample
-
-        dp = dx_across_worm * vc_dx_ortho + dy_across_worm * vc_dy_ortho
-
-        # I'd like to not have to do this step, it has to do with
-        # the relationship between the vulva and non-vulva side. This
-        # should be consistent across the entire animal and could be
-        # passed in, unless the worm rolls.
-        sign_used = -1
-        if sign_use == 0 and np.sum(dp) > 0:
-            # Instead of multiplying by -1 we could hardcode the flip of
-            # the logic below (e.g. max instead of min, > vs <)
-            dp = -1 * dp
-            sign_used = 1
-        elif sign_use == 1:
-            dp = -1 * dp
-            sign_used = 1
-
-        # This is slow, presumably due to the memory allocation ...
-        #                   < right
-        # possible = [dp(1:end-1) < dp(2:end) false] & \
-        #                   < left
-        #           [false dp(2:end) < dp(1:end-1)]
-
-        # In Matlab:
-        # possible = (dp(2:end-1) < dp(3:end)) & (dp(2:end-1) < dp(1:end-2));
-        possible = (dp[1:-2] < dp[2:-1]) & (dp[1:-2] < dp[0:-3])
-
-        Ip = utils.find(possible)
-        if len(Ip) == 1:
-            dp_I = Ip + 1
-            dp_value = dp[dp_I]
-        elif len(Ip) > 1:
-            temp_I = np.argmin(d_across[Ip])
-            dp_I = Ip[temp_I] + 1
-            dp_value = dp[dp_I]
-        else:
-            dp_I = np.argmin(dp)
-            dp_value = dp[dp_I]
-
-        I = left_I + dp_I
-
-        return (dp_value, I, sign_used)
-
     #%%
     @staticmethod
     def h__updateEndsByWalking(d_across, match_I1, s1, s2, END_S1_WALK_PCT):
@@ -766,3 +615,326 @@ class SkeletonCalculatorType1(object):
         return (p1_I, p2_I)
         #p1_I[cur_p_I+1:] = []
         #p2_I[cur_p_I+1:] = []
+
+    #%%
+    @staticmethod
+    def h__smoothContours(contours, fraction_worm_smooth, smoothing_order):
+        """
+        Savitzky-Golay smoothing of the x and y coordinates of contour sides.
+
+        Frames with the same number of points share a filter width and are
+        smoothed together. The interior points are filtered with a single
+        call to sgolay. The points within half a filter width of either end
+        are the values of a polynomial fit to the first (or last) window,
+        as with sgolay's default 'interp' mode. These fits are applied as a
+        fixed set of coefficients so that the result for a frame does not
+        depend on which other frames are smoothed with it.
+
+        Parameters
+        ----------
+        contours: list of numpy arrays of shape (2,ki)
+            These are smoothed in place. Frames with too few points to be
+            smoothed are left as is.
+        fraction_worm_smooth: float
+            Filter width, as a fraction of the number of points.
+        smoothing_order: int
+
+        """
+        frames_by_n_points = {}
+        for I, sv in enumerate(contours):
+            frames_by_n_points.setdefault(sv.shape[1], []).append(I)
+
+        for n_points, frame_I in frames_by_n_points.items():
+            filter_width = utils.round_to_odd(n_points * fraction_worm_smooth)
+            half_width = filter_width // 2
+            if filter_width > n_points:
+                continue
+
+            # (n_frames, 2, n_points)
+            all_sv = np.array([contours[I] for I in frame_I], dtype=float)
+            try:
+                smoothed = sgolay(all_sv, window_length=filter_width,
+                                  polyorder=smoothing_order, axis=-1,
+                                  mode='constant')
+                left_coeffs = np.array(
+                    [savgol_coeffs(filter_width, smoothing_order, pos=pos,
+                                   use='dot')
+                     for pos in range(half_width)])
+                right_coeffs = np.array(
+                    [savgol_coeffs(filter_width, smoothing_order, pos=pos,
+                                   use='dot')
+                     for pos in range(filter_width - half_width,
+                                      filter_width)])
+            except ValueError:
+                # e.g. the polynomial order is too high for the filter width
+                continue
+
+            if half_width > 0:
+                smoothed[:, :, :half_width] = np.einsum(
+                    'ij,...j->...i', left_coeffs, all_sv[:, :, :filter_width])
+                smoothed[:, :, -half_width:] = np.einsum(
+                    'ij,...j->...i', right_coeffs,
+                    all_sv[:, :, -filter_width:])
+
+            for I, sv in zip(frame_I, smoothed):
+                contours[I][:] = sv
+
+    #%%
+    @staticmethod
+    def h__resampleSides(s1, s2):
+        """
+        UP/DOWNSAMPLE if number of points is not betwen 49 and 250,
+        which seem like reasonable numbers.
+
+        Parameters
+        ----------
+        s1: numpy array of shape (2,ki)
+        s2: numpy array of shape (2,ji)
+
+        Returns
+        -------
+        (s1, s2) tuple
+            The (possibly) resampled sides, also of shape (2,k)
+
+        """
+        if s1.shape[1] < 49 or s1.shape[1] > 250:
+            if s1.shape[1] < 49:
+                num_norm_points = 75
+            else:
+                num_norm_points = 200
+            # Upsample if we have too few points
+            s1 = WormParserHelpers.normalize_all_frames_xy(
+                [s1], num_norm_points=num_norm_points)
+
+            # There is only one frame so let's take that dimension out,
+            # and transform s1 and s2 from having shape (k,2,n) to (k,2)
+            s1 = s1[:, :, 0]
+
+            # normalized_all_frames_xy rolls the axis so let's roll it back
+            s1 = np.rollaxis(s1, 1)
+
+        if s2.shape[1] < 49 or s2.shape[1] > 250:
+            # NOTE: This checks s1, as was done in the original code
+            if s1.shape[1] < 49:
+                num_norm_points = 75
+            else:
+                num_norm_points = 200
+            # For documentation see the above for s1
+            s2 = WormParserHelpers.normalize_all_frames_xy(
+                [s2], num_norm_points=num_norm_points)
+            s2 = s2[:, :, 0]
+            s2 = np.rollaxis(s2, 1)
+
+        return s1, s2
+
+    #%%
+    @staticmethod
+    def h__padSides(sides):
+        """
+        Stack contour sides of different lengths into one array.
+
+        Parameters
+        ----------
+        sides: list of numpy arrays of shape (2,ki)
+
+        Returns
+        -------
+        numpy array of shape (n_frames,2,max(ki))
+            Points beyond the end of a side are NaN
+
+        """
+        max_n_points = max(x.shape[1] for x in sides)
+        padded = np.full((len(sides), 2, max_n_points), np.NaN)
+        for I, sv in enumerate(sides):
+            padded[I, :, :sv.shape[1]] = sv
+
+        return padded
+
+    #%%
+    @staticmethod
+    def h__getBoundsBatch(n1, n2, max_n1, percent_left_search,
+                          percent_right_search):
+        """
+        h__getBounds for many frames at once.
+
+        Parameters
+        ----------
+        n1: numpy array of ints, shape (n_frames,)
+            number of points along one side of the contour, for each frame
+        n2: numpy array of ints, shape (n_frames,)
+            number of points along the other side of the contour
+        max_n1: int
+            The padded size of the first side
+        percent_left_search: float
+        percent_right_search: float
+
+        Returns
+        -------
+        (start_indices, stop_indices): integer numpy arrays of shape
+                                       (n_frames,max_n1)
+            Entries beyond the end of a side are 0.
+
+        """
+        start_indices = np.zeros((len(n1), max_n1), dtype=int)
+        stop_indices = np.zeros((len(n1), max_n1), dtype=int)
+
+        # The bounds only depend on the # of points, which is often shared
+        # by many frames
+        bounds = {}
+        for I, n_pair in enumerate(zip(n1, n2)):
+            if n_pair not in bounds:
+                bounds[n_pair] = SkeletonCalculatorType1.h__getBounds(
+                    n_pair[0], n_pair[1],
+                    percent_left_search, percent_right_search)
+            start_indices[I, :n_pair[0]], stop_indices[I, :n_pair[0]] = \
+                bounds[n_pair]
+
+        return start_indices, stop_indices
+
+    #%%
+    @staticmethod
+    def h__computeNormalVectorsBatch(padded_s1, n1):
+        """
+        utils.compute_normal_vectors for many frames at once.
+
+        Parameters
+        ----------
+        padded_s1: numpy array of shape (n_frames,2,max(ki))
+            See h__padSides
+        n1: numpy array of ints, shape (n_frames,)
+            The # of points of each frame
+
+        Returns
+        -------
+        (norm_x, norm_y) tuple of numpy arrays of shape (n_frames,max(ki))
+
+        """
+        # Same as np.gradient but the last point of each frame, which may
+        # not be the last column, needs to use a one sided difference
+        gradient = np.empty_like(padded_s1)
+        gradient[:, :, 1:-1] = (padded_s1[:, :, 2:] -
+                                padded_s1[:, :, :-2]) / 2.
+        gradient[:, :, 0] = padded_s1[:, :, 1] - padded_s1[:, :, 0]
+        frame_I = np.arange(len(n1))
+        gradient[frame_I, :, n1 - 1] = padded_s1[frame_I, :, n1 - 1] - \
+            padded_s1[frame_I, :, n1 - 2]
+
+        dx = gradient[:, 0, :]
+        dy = gradient[:, 1, :]
+
+        # Rotate clockwise, as in utils.compute_normal_vectors
+        curve_gradient_magnitude = np.sqrt(dy * dy + dx * dx)
+
+        # The padding is NaN
+        with np.errstate(invalid='ignore'):
+            norm_x = dy / curve_gradient_magnitude
+            norm_y = -dx / curve_gradient_magnitude
+
+        return norm_x, norm_y
+
+    #%%
+    @staticmethod
+    def h__getMatchesBatch(n1, n2, norm_x, norm_y,
+                           dx_across, dy_across, d_across,
+                           left_I, right_I):
+        """
+        For many frames at once, for each point on side 1, find which
+        side 2 the point pairs with.
+
+        For each point this looks for local minima of the projection of the
+        (normalized) vectors across the worm onto the normal vector, within
+        the search bounds. With several minima, the one closest to the
+        point is used; with none, the minimum of the window.
+
+        The projection is flipped when its sum over the window is positive.
+        This has to do with the relationship between the vulva and
+        non-vulva side, and should be consistent across the entire animal.
+        When it is not consistent along the worm, the majority sign is used
+        for all points.
+
+        Parameters
+        ----------
+        n1: numpy array of ints, shape (n_frames,)
+        n2: numpy array of ints, shape (n_frames,)
+        norm_x: numpy array of shape (n_frames,max(ki))
+        norm_y:
+        dx_across: numpy array of shape (n_frames,max(ki),max(ji))
+        dy_across:
+        d_across:
+        left_I: integer numpy array of shape (n_frames,max(ki))
+        right_I:
+
+        Returns
+        -------
+        match_indices: integer numpy array of shape (n_frames,max(ki))
+
+        """
+        n_frames, max_n1, max_n2 = d_across.shape
+
+        # The first and last points are not matched
+        row_I = np.arange(max_n1)
+        is_matched_point = (row_I >= 1) & (row_I < n1[:, None] - 1)
+
+        column_I = np.arange(max_n2)
+        lb = left_I[:, :, None]
+        rb = right_I[:, :, None]
+        # Equivalent to the slice [lb:rb]
+        in_window = (column_I >= lb) & (column_I < rb)
+
+        dp = dx_across * norm_x[:, :, None] + dy_across * norm_y[:, :, None]
+
+        # Sign of the projection for each point
+        #---------------------------------------
+        # dp is flipped (sign_used = 1) when its sum over the search window
+        # is positive. A sequential sum (cumsum) is used so that the result
+        # does not depend on the padding. NaN values give a NaN sum, which is
+        # not positive.
+        dp_in_window = np.where(in_window, dp, 0)
+        is_nan_window = np.isnan(dp_in_window)
+        dp_in_window[is_nan_window] = 0
+        window_sum = np.cumsum(dp_in_window, axis=2)[:, :, -1]
+        window_sum[np.any(is_nan_window, axis=2)] = np.NaN
+        with np.errstate(invalid='ignore'):
+            sign_used = np.where(window_sum > 0, 1, -1)
+        sign_used[~is_matched_point] = 0
+
+        # Points that don't agree with the rest are recomputed using the
+        # majority sign, which means that all points in a frame end up
+        # using the same sign
+        first_sign = sign_used[:, 1:2]
+        is_consistent = np.all((sign_used == first_sign) | ~is_matched_point,
+                               axis=1)
+        frame_sign = np.where(np.sum(sign_used, axis=1) > 0, 1, -1)
+        frame_sign[is_consistent] = first_sign[is_consistent, 0]
+
+        dp[frame_sign == 1] *= -1
+
+        # Local minima within the window
+        #---------------------------------------
+        # possible = (dp[1:-2] < dp[2:-1]) & (dp[1:-2] < dp[0:-3]) within
+        # the window, i.e. at columns lb+1 to rb-3 (inclusive)
+        possible = np.zeros(dp.shape, dtype=bool)
+        with np.errstate(invalid='ignore'):
+            possible[:, :, 1:-1] = (dp[:, :, 1:-1] < dp[:, :, 2:]) & \
+                (dp[:, :, 1:-1] < dp[:, :, :-2])
+        possible &= (column_I >= lb + 1) & (column_I <= rb - 3)
+        has_possible = np.any(possible, axis=2)
+
+        # With one or more local minima, use the one with the smallest
+        # distance. NOTE: As in the original frame by frame code the
+        # distance is taken from one point before the minimum.
+        d_previous = np.full(d_across.shape, np.inf)
+        d_previous[:, :, 1:] = d_across[:, :, :-1]
+        possible_match_I = np.argmin(np.where(possible, d_previous, np.inf),
+                                     axis=2)
+
+        # Otherwise use the minimum of the window
+        window_match_I = np.argmin(np.where(in_window, dp, np.inf), axis=2)
+
+        match_I = np.where(has_possible, possible_match_I, window_match_I)
+
+        match_I[~is_matched_point] = 0
+        match_I[:, 0] = 0
+        match_I[np.arange(n_frames), n1 - 1] = n2
+
+        return match_I
@@ -51,6 +51,8 @@ class Histogram(object):
     pdf: numpy array of floats
     mean: float
     num_samples: int
+    sum_of_values: float
+    sum_of_squares: float
     bin_boundaries: numpy array
     bin_midpoints: numpy array
     first_bin_midpoint: float
@@ -380,6 +382,33 @@ class Histogram(object):
 
             return self._std
 
+    @property
+    def sum_of_values(self):
+        """
+        The sum of the data. Unlike the mean, sums can simply be added
+        when merging histograms.
+
+        """
+        try:
+            return self._sum_of_values
+        except AttributeError:
+            self._sum_of_values = np.sum(self.data)
+
+            return self._sum_of_values
+
+    @property
+    def sum_of_squares(self):
+        """
+        The sum of the squared data.
+
+        """
+        try:
+            return self._sum_of_squares
+        except AttributeError:
+            self._sum_of_squares = np.sum(np.square(self.data))
+
+            return self._sum_of_squares
+
     @property
     def num_videos(self):
         """
@@ -389,6 +418,43 @@ class Histogram(object):
         """
         return 1
 
+    def compact(self, keep_counts=True):
+        """
+        Compute the counts and the summary statistics, and then drop the
+        underlying data.
+
+        The histogram can still be merged afterwards, but it is much
+        smaller to keep around or to send between processes.
+
+        Parameters
+        ----------------
+        keep_counts: bool (default True)
+            If False the bins and the counts are dropped as well, leaving
+            only the summary statistics (mean, std, num_samples and the
+            sums). The histogram can then no longer be merged.
+
+        Returns
+        ----------------
+        self
+
+        """
+        if self.data is not None:
+            # Populate the lazily computed values before the data goes
+            self.num_samples
+            self.counts
+            self.mean
+            self.std
+            self.sum_of_values
+            self.sum_of_squares
+            self.data = None
+
+        if not keep_counts:
+            for name in ('bin_boundaries', '_bin_midpoints', '_counts',
+                         '_pdf'):
+                self.__dict__.pop(name, None)
+
+        return self
+
 
 ###############################################################################
 #%%
@@ -397,6 +463,12 @@ class MergedHistogram(Histogram):
     A Histogram, plus some extra data about the individual histograms
     that make it up.
 
+    Unlike a Histogram, the counts (and the pdf) are over the samples
+    of all the videos, and the underlying data is only kept if all of the
+    merged histograms still have theirs (see Histogram.compact). This
+    way the size of a merged histogram depends on the number of bins and
+    videos, and not on the number of samples.
+
     Extra attributes:
     --------------------
     mean_per_video: numpy array of floats
@@ -405,6 +477,9 @@ class MergedHistogram(Histogram):
     std_per_video: numpy array of floats
         Same as mean_per_video but for standard deviation.
     num_samples_per_video: numpy array of ints
+    pooled_mean: float
+        The mean over the samples of all videos.
+    pooled_std: float
     num_videos: int
     num_valid_videos: int
     all_videos_valid: bool
@@ -443,13 +518,18 @@ class MergedHistogram(Histogram):
         always setting bin edges at multiples of the bin_width. This was
         not done in the original Schafer Lab code.
 
+        Merged histograms can be merged again, in which case all of
+        their videos are carried over. Merging is associative, i.e.
+        merging [a, b, c] is the same as merging [merge(a, b), c] or
+        [a, merge(b, c)], so histograms can be merged incrementally.
+
         Parameters
         ------------------
-        histograms: a list of Histogram objects
+        histograms: a list of Histogram (or MergedHistogram) objects
 
         Returns
         ------------------
-        A Histogram object
+        A MergedHistogram object
 
         """
         # Create an output object with same meta properties
@@ -458,60 +538,95 @@ class MergedHistogram(Histogram):
         # Let's concatenate all the underlying data in case anyone downstream
         # wants to see it.  It's not needed for the bin and count calculation,
         # since we do that efficiently by aligning the bins.
-        merged_hist.data = np.concatenate([x.data for x in histograms])
+        # (The data is not available if the histograms have been compacted)
+        if all(x.data is not None for x in histograms):
+            merged_hist.data = np.concatenate([x.data for x in histograms])
+
+        per_video_values = [cls.h__getPerVideoValues(x) for x in histograms]
 
         # Align all bins
         # ---------------------------------------------------------------
-        num_bins = [x.num_bins for x in histograms]
-        first_bin_midpoints = [x.first_bin_midpoint for x in histograms]
+        num_bins = np.array([x.num_bins for x in histograms])
+        first_bin_midpoints = np.array([x.first_bin_midpoint
+                                        for x in histograms])
         min_bin_midpoint = min(first_bin_midpoints)
-        max_bin_midpoint = max([x.last_bin_midpoint for x in histograms])
 
         cur_bin_width = merged_hist.specs.bin_width
-        new_bin_midpoints = np.arange(min_bin_midpoint,
-                                      max_bin_midpoint + cur_bin_width,
-                                      step=cur_bin_width)
 
         # Colon operator was giving warnings about non-integer indices :/
         # - @JimHokanson
         start_indices = ((first_bin_midpoints - min_bin_midpoint) /
                          cur_bin_width)
-        start_indices = start_indices.round()
+        start_indices = start_indices.round().astype(int)
         end_indices = start_indices + num_bins
 
-        num_histograms = len(histograms)
-        new_counts = np.zeros((num_histograms, len(new_bin_midpoints)))
-
-        for i in range(num_histograms):
-            cur_start = start_indices[i]
-            if not np.isnan(cur_start):
-                cur_end = end_indices[i]
-                new_counts[i, cur_start:cur_end] = histograms[i].counts
+        new_bin_midpoints = min_bin_midpoint + \
+            cur_bin_width * np.arange(max(end_indices))
 
-        num_samples_array = np.array([x.num_samples for x in histograms])
+        new_counts = np.zeros(len(new_bin_midpoints), dtype=int)
+        for i, x in enumerate(histograms):
+            new_counts[start_indices[i]:end_indices[i]] += x.counts
 
         # Update final properties
-        # Note that each of these is now no longer a scalar as in the
-        # single-video case; it is now a numpy array
+        # Note that the per-video values are now no longer a scalar as in
+        # the single-video case; they are now a numpy array, with one entry
+        # for each video
         # ---------------------------------------------------------------
         merged_hist._bin_midpoints = new_bin_midpoints
         merged_hist._counts = new_counts
-        merged_hist._pdf = (sum(merged_hist._counts, 0) /
-                            sum(num_samples_array))
 
         merged_hist.mean_per_video = \
-            np.array([x.mean for x in histograms])
+            np.concatenate([x[0] for x in per_video_values])
 
         merged_hist.std_per_video = \
-            np.array([x.std for x in histograms])
+            np.concatenate([x[1] for x in per_video_values])
 
         merged_hist.num_samples_per_video = \
-            np.array([x.num_samples for x in histograms])
+            np.concatenate([x[2] for x in per_video_values])
 
         merged_hist._num_samples = sum(merged_hist.num_samples_per_video)
 
+        merged_hist._sum_of_values = sum(x.sum_of_values for x in histograms)
+        merged_hist._sum_of_squares = sum(x.sum_of_squares
+                                          for x in histograms)
+
+        merged_hist._pdf = merged_hist._counts / merged_hist._num_samples
+
         return merged_hist
 
+    @classmethod
+    def merge(cls, hist1, hist2):
+        """
+        Merge two histograms, either of which may be a MergedHistogram.
+
+        See merged_histogram_factory.
+
+        Returns
+        ------------------
+        A MergedHistogram object
+
+        """
+        return cls.merged_histogram_factory([hist1, hist2])
+
+    @staticmethod
+    def h__getPerVideoValues(histogram):
+        """
+        Returns
+        ------------------
+        (mean_per_video, std_per_video, num_samples_per_video)
+            With one entry for each video of histogram, which is just one
+            for a (not merged) Histogram.
+
+        """
+        if isinstance(histogram, MergedHistogram):
+            return (histogram.mean_per_video,
+                    histogram.std_per_video,
+                    histogram.num_samples_per_video)
+        else:
+            return (np.array([histogram.mean]),
+                    np.array([histogram.std]),
+                    np.array([histogram.num_samples]))
+
     @property
     def mean(self):
         try:
@@ -534,6 +649,31 @@ class MergedHistogram(Histogram):
 
             return self._std
 
+    @property
+    def pooled_mean(self):
+        """
+        The mean over the samples of all videos, from the merged sums.
+
+        """
+        return self.sum_of_values / self.num_samples
+
+    @property
+    def pooled_std(self):
+        """
+        The standard deviation over the samples of all videos, from the
+        merged sums.
+
+        """
+        num_samples = self.num_samples
+        if num_samples == 1:
+            return 0
+
+        sum_of_squared_deviations = (self.sum_of_squares -
+                                     self.sum_of_values**2 / num_samples)
+
+        # Rounding can leave a tiny negative value for constant data
+        return np.sqrt(max(sum_of_squared_deviations, 0) / (num_samples - 1))
+
     @property
     def valid_videos_mask(self):
         return ~np.isnan(self.mean_per_video)
@@ -19,6 +19,9 @@ than just having a list of histograms.
 Formerly SegwormMatlabClasses/+seg_worm/+stats/@hist/manager.m
 
 """
+import functools
+import multiprocessing
+
 import h5py
 import numpy as np
 import six  # For compatibility with Python 2.x
@@ -69,40 +72,36 @@ class HistogramManager(object):
     """
     #%%
 
-    def __init__(self, feature_path_or_object_list, verbose=False):
+    def __init__(self, feature_path_or_object_list, verbose=False,
+                 n_workers=1, keep_data=False):
         """
         Parameters
         ----------
         feature_path_or_object_list: list of strings or feature objects
             Full paths to all feature files making up this histogram, or
             their in-memory object equivalents.
+        n_workers: int (default 1)
+            If greater than 1, the feature files are loaded and histogrammed
+            in a pool of this many processes.
+        keep_data: bool (default False)
+            If False only the summaries of the features are kept, i.e. the
+            merged histograms only hold their counts and sums, and the
+            histograms in hist_cell_array only their mean, std, number of
+            samples and sums (see Histogram.compact). This keeps the memory
+            used independent of the number of samples per video.
+            If True the underlying data is kept as well.
 
         """
         if verbose:
             print("Number of feature files passed into the histogram manager:",
                   len(feature_path_or_object_list))
 
-        # This will have shape (len(feature_path_or_object_list), 726)
-        self.hist_cell_array = []
-
-        # Loop over all feature files and get histogram objects for each
-        for feature_path_or_object in feature_path_or_object_list:
-            worm_features = None
-
-            if isinstance(feature_path_or_object, six.string_types):
-                # If we have a string, it's a filepath to an HDF5 feature file
-                file_path = feature_path_or_object
-                worm_features = WormFeaturesDos.from_disk(file_path)
-            else:
-                # Otherwise the worm features have been passed directly
-                # as an instance of WormFeatures (we hope)
-                worm_features = feature_path_or_object
+        self.keep_data = keep_data
 
-            # TODO: Need to add on info to properties
-            # worm_features.info -> obj.info
-
-            new_histogram_set = self.init_histograms(worm_features)
-            self.hist_cell_array.append(new_histogram_set)
+        # This will have shape (len(feature_path_or_object_list), 726)
+        self.hist_cell_array = \
+            self.h__computeHistogramSets(feature_path_or_object_list,
+                                         n_workers, keep_data)
 
         # JAH TODO: I'm not sure what this is doing ..., add documentation
         #----------------------------------------------------------------
@@ -123,6 +122,81 @@ class HistogramManager(object):
         self.merged_histograms = \
             HistogramManager.merge_histograms(self.hist_cell_array)
 
+        if not keep_data:
+            self.h__dropVideoCounts(self.hist_cell_array)
+
+    @classmethod
+    def merge(cls, hist_manager1, hist_manager2):
+        """
+        Combine two histogram managers, e.g. computed separately on two
+        batches of videos, without recomputing any of the histograms.
+
+        Parameters
+        ----------
+        hist_manager1, hist_manager2: HistogramManager objects
+            Computed on the same features.
+
+        Returns
+        ----------
+        A HistogramManager object holding the videos of both
+
+        """
+        hist_manager = cls.__new__(cls)
+        hist_manager.keep_data = (hist_manager1.keep_data and
+                                  hist_manager2.keep_data)
+        hist_manager.hist_cell_array = \
+            np.concatenate((hist_manager1.hist_cell_array,
+                            hist_manager2.hist_cell_array))
+        hist_manager.merged_histograms = \
+            cls.h__mergeMergedHistograms(hist_manager1.merged_histograms,
+                                         hist_manager2.merged_histograms)
+
+        return hist_manager
+
+    def add_videos(self, feature_path_or_object_list, n_workers=1):
+        """
+        Add videos to this histogram manager. Only the histograms of
+        the new videos are computed; they are then merged into the
+        existing merged histograms.
+
+        Parameters
+        ----------
+        feature_path_or_object_list: list of strings or feature objects
+            As in __init__
+        n_workers: int (default 1)
+            As in __init__
+
+        """
+        new_hist_cell_array = np.array(
+            self.h__computeHistogramSets(feature_path_or_object_list,
+                                         n_workers, self.keep_data))
+
+        self.merged_histograms = self.h__mergeMergedHistograms(
+            self.merged_histograms,
+            HistogramManager.merge_histograms(new_hist_cell_array))
+
+        if not self.keep_data:
+            self.h__dropVideoCounts(new_hist_cell_array)
+
+        self.hist_cell_array = np.concatenate((self.hist_cell_array,
+                                               new_hist_cell_array))
+
+    @staticmethod
+    def h__mergeMergedHistograms(merged_histograms1, merged_histograms2):
+        """
+        Merge two arrays of merged histograms, feature by feature. As in
+        merge_histograms, a feature is None if it is None in either array.
+
+        """
+        merged_histograms = np.array([None] * len(merged_histograms1))
+        for feature_index, (hist1, hist2) in \
+                enumerate(zip(merged_histograms1, merged_histograms2)):
+            if hist1 is not None and hist2 is not None:
+                merged_histograms[feature_index] = \
+                    MergedHistogram.merge(hist1, hist2)
+
+        return merged_histograms
+
     def __getitem__(self, index):
         return self.merged_histograms[index]
 
@@ -174,15 +248,50 @@ class HistogramManager(object):
         # Give a more human-readable column name
         df.columns = ['Video %d mean' % i for i in range(self.num_videos)]
 
-        feature_spec = WormFeaturesDos.get_feature_spec(extended=True)
+        feature_spec = WormFeatures.get_feature_spec(extended=True)
         feature_spec = feature_spec[['feature_field',
                                      'data_type',
                                      'motion_type']]
 
         return feature_spec.join(df)
 
+    @staticmethod
+    def h__computeHistogramSets(feature_path_or_object_list, n_workers=1,
+                                keep_data=False):
+        """
+        Returns a list with the histograms of each feature file or object,
+        see init_histograms. Unless keep_data is True the histograms are
+        compacted, so each video's data can be freed as soon as it has
+        been histogrammed.
+        """
+        compute_histograms = functools.partial(_histograms_in_worker,
+                                               keep_data=keep_data)
+        if n_workers > 1:
+            pool = multiprocessing.Pool(n_workers)
+            try:
+                # One video at a time, as each video is a lot of work
+                return pool.map(compute_histograms,
+                                feature_path_or_object_list, chunksize=1)
+            finally:
+                pool.terminate()
+
+        return [compute_histograms(feature_path_or_object)
+                for feature_path_or_object in feature_path_or_object_list]
+
+    @staticmethod
+    def h__dropVideoCounts(hist_cell_array):
+        """
+        Once they have been merged, the counts of the histograms of each
+        video are no longer needed, only their summary statistics.
+        """
+        for histograms in hist_cell_array:
+            for hist in histograms:
+                if hist is not None:
+                    hist.compact(keep_counts=False)
+
     #%%
-    def init_histograms(self, worm_features):
+    @staticmethod
+    def init_histograms(worm_features):
         """
 
         #TODO: Add documentation
@@ -228,11 +337,9 @@ class HistogramManager(object):
 
         Notes
         -------------------------
-        Currently each histogram object to be merged should only contain
-        a single "video", i.e. a single set of data, and thus a single mean.
-        Perhaps in the future this could be changed so we can merge
-        MergedHistogram objects, but for now we can only merge an array
-        of (not merged) Histogram objects.
+        The histograms to be merged may themselves be MergedHistogram
+        objects, in which case all of their videos are carried over
+        (see MergedHistogram.merged_histogram_factory).
 
         Formerly objs = seg_worm.stats.hist.mergeObjects(hist_cell_array)
 
@@ -245,15 +352,6 @@ class HistogramManager(object):
         # Make sure that the hist_cell_array is a numpy array
         hist_cell_array = np.array(hist_cell_array)
 
-        # Check that we don't have any multiple videos in any histogram,
-        # since it's not implemented to merge already-merged histograms
-        num_videos_per_histogram = np.array([hist.num_videos for hist
-                                             in hist_cell_array.flatten()
-                                             if hist is not None])
-        if np.count_nonzero(num_videos_per_histogram != 1) > 0:
-            raise Exception("Merging already-merged histograms is not yet "
-                            "implemented")
-
         # Let's assign some nicer names to the dimensions of hist_cell_array
         (num_histograms_per_feature, num_features) = hist_cell_array.shape
 
@@ -347,3 +445,35 @@ class HistogramManager(object):
         sns.heatmap(valid_2d_mask, square=True)
 
         # ax.legend().set_visible(False)  # this doesn't seem to work
+
+
+def h__loadFeatures(feature_path_or_object):
+    """
+    Returns the worm features, loading them first if we were given a path
+    """
+    if isinstance(feature_path_or_object, six.string_types):
+        # If we have a string, it's a filepath to an HDF5 feature file
+        return WormFeatures.from_disk(feature_path_or_object)
+    else:
+        # Otherwise the worm features have been passed directly
+        # as an instance of WormFeatures (we hope)
+        #
+        # TODO: Need to add on info to properties
+        # worm_features.info -> obj.info
+        return feature_path_or_object
+
+
+def _histograms_in_worker(feature_path_or_object, keep_data=False):
+    """
+    Load and histogram one video, possibly in a worker process. Unless
+    keep_data is True the histograms are compacted so that the raw feature
+    values are not kept (or sent back).
+    """
+    histograms = HistogramManager.init_histograms(
+        h__loadFeatures(feature_path_or_object))
+    if not keep_data:
+        for hist in histograms:
+            if hist is not None:
+                hist.compact()
+
+    return histograms
@@ -13,6 +13,8 @@ A translation of Matlab code written by Jim Hokanson,
 in the SegwormMatlabClasses GitHub repo.
 
 """
+import multiprocessing
+
 import numpy as np
 import scipy as sp
 
@@ -25,6 +27,17 @@ import pandas as pd
 from .. import utils
 from .histogram import Histogram
 
+# The permutations and bootstrap resamples are split into chunks of this
+# many, each with its own random seed, so that the results don't depend on
+# the number of workers.
+RESAMPLING_CHUNK_SIZE = 100
+
+# Within a chunk the resamples are evaluated in batches, for all features
+# at once, using about this many bytes of memory (per worker). The random
+# numbers are drawn one resample after the other, so the results don't
+# depend on the batch size either.
+RESAMPLING_MEMORY_BUDGET = 2**26
+
 #%%
 
 
@@ -33,13 +46,23 @@ class StatisticsManager(object):
     A class that encapsulates a statistical comparison between two
     arrays of histograms, experiment histograms and control histograms.
 
-    This class stores WormStatistics objects for each of the 726 features,
-    and some shared statistical properties.
+    This class computes the statistics of all 726 features at once, from
+    (features x videos) matrices of the video means, and stores them in
+    arrays with one entry per feature.  The WormStatistics object of each
+    feature gives access to its entries.
 
     Attributes
     ---------------------------------------
     worm_statistics_objects: numpy array of WormStatistics objects
         one object for each of 726 features
+    p_studentst_array, p_wilcoxon_array: numpy arrays
+    z_score_experiment_array, t_statistic_array: numpy arrays
+    fisher_p_array: numpy array
+    is_exclusive_array: numpy array of bool
+    exp_means, ctl_means: numpy arrays of shape (726, max # of videos)
+        The mean of each video, padded with NaN
+    exp_valid, ctl_valid: numpy arrays of bool
+        Which of the means are valid (i.e. non-NaN) video means
     min_p_wilcoxon: float
         minimum p_wilcoxon from all objects in worm_statistics_objects
     min_q_wilcoxon: float
@@ -59,6 +82,10 @@ class StatisticsManager(object):
     ---------------------------------------
     __init__
         Initializer
+    permutation_test
+        Permutation test p-values
+    bootstrap_confidence_intervals
+        Bootstrap confidence intervals of the difference of the means
     plot
         Plot the histograms against each other and display statistics
 
@@ -68,7 +95,8 @@ class StatisticsManager(object):
 
     """
 
-    def __init__(self, exp_histogram_manager, ctl_histogram_manager):
+    def __init__(self, exp_histogram_manager, ctl_histogram_manager,
+                 USE_OLD_CODE=False):
         """
         Initializes the Manager class.
 
@@ -78,6 +106,10 @@ class StatisticsManager(object):
             Experiment
         ctl_histogram_manager: HistogramManager object
             Control
+            (Any sequence of MergedHistogram objects, or None, will do for
+            either of these)
+        USE_OLD_CODE: bool
+            Use old code (i.e. Schafer Lab code) for the z-scores
 
         Notes
         ---------------------------------------
@@ -88,37 +120,429 @@ class StatisticsManager(object):
                len(ctl_histogram_manager))
         num_features = len(exp_histogram_manager)
 
-        # Initialize a WormStatistics object for each of 726 features,
-        # comparing experiment and control.
-        self.worm_statistics_objects = np.array([None] * num_features)
-        for feature_index in range(num_features):
-            self.worm_statistics_objects[feature_index] = WormStatistics(
-                exp_histogram_manager[feature_index],
-                ctl_histogram_manager[feature_index])
+        exp_histograms = [exp_histogram_manager[i]
+                          for i in range(num_features)]
+        ctl_histograms = [ctl_histogram_manager[i]
+                          for i in range(num_features)]
+
+        # All the statistics are computed at once, over matrices of the
+        # video means with one row per feature.
+        self.h__computeStatistics(exp_histograms, ctl_histograms,
+                                  USE_OLD_CODE)
 
         # Q-values, as introduced by Storey et al. (2002), attempt to
         # account for the False Discovery Rate from multiple hypothesis
         # testing on the same subjects.  So we must calculate here across
-        # all WormStatistics objects, then assign the values to the
-        # individual WormStatistics objects.
+        # all features.
         self.q_studentst_array = utils.compute_q_values(self.p_studentst_array)
         self.q_wilcoxon_array = utils.compute_q_values(self.p_wilcoxon_array)
+
+        # A WormStatistics object for each of 726 features, comparing
+        # experiment and control.  Each one just looks up its values in
+        # the arrays above.
+        self.worm_statistics_objects = np.array([None] * num_features)
         for feature_index in range(num_features):
-            self.worm_statistics_objects[feature_index].q_studentst = \
-                self.q_studentst_array[feature_index]
-            self.worm_statistics_objects[feature_index].q_wilcoxon = \
-                self.q_wilcoxon_array[feature_index]
+            self.worm_statistics_objects[feature_index] = WormStatistics(
+                exp_histograms[feature_index],
+                ctl_histograms[feature_index],
+                statistics_manager=self,
+                feature_index=feature_index)
 
     def __getitem__(self, index):
         return self.worm_statistics_objects[index]
 
-    @property
-    def p_studentst_array(self):
-        return np.array([x.p_studentst for x in self.worm_statistics_objects])
+    def h__computeStatistics(self, exp_histograms, ctl_histograms,
+                             USE_OLD_CODE):
+        """
+        Compute the statistics of all features, see the corresponding
+        WormStatistics properties for the rules that are followed.
 
-    @property
-    def p_wilcoxon_array(self):
-        return np.array([x.p_wilcoxon for x in self.worm_statistics_objects])
+        All the values are NaN for features for which the experiment or
+        the control histogram is None.
+
+        Sets
+        ---------------------------------------
+        is_exclusive_array, fisher_p_array, t_statistic_array,
+        p_studentst_array, p_wilcoxon_array, z_score_experiment_array
+
+        """
+        exp_means, exp_present = self.h__getMeansMatrix(exp_histograms)
+        ctl_means, ctl_present = self.h__getMeansMatrix(ctl_histograms)
+
+        exp_valid = exp_present & ~np.isnan(exp_means)
+        ctl_valid = ctl_present & ~np.isnan(ctl_means)
+
+        # Kept for the resampling tests
+        self.exp_means = exp_means
+        self.ctl_means = ctl_means
+        self.exp_valid = exp_valid
+        self.ctl_valid = ctl_valid
+
+        num_exp_videos = exp_present.sum(axis=1)
+        num_ctl_videos = ctl_present.sum(axis=1)
+        num_exp_valid = exp_valid.sum(axis=1)
+        num_ctl_valid = ctl_valid.sum(axis=1)
+
+        is_missing = np.array([exp is None or ctl is None for exp, ctl
+                               in zip(exp_histograms, ctl_histograms)],
+                              dtype=bool)
+
+        # Either the experiment has all valid means but the control has
+        # none, or vice versa
+        self.is_exclusive_array = ~is_missing & (
+            ((num_exp_valid == 0) & (num_ctl_valid == num_ctl_videos)) |
+            ((num_ctl_valid == 0) & (num_exp_valid == num_exp_videos)))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.fisher_p_array = self.h__fisherExact(num_exp_videos,
+                                                      num_ctl_videos)
+
+            self.t_statistic_array, p_studentst = \
+                self.h__tTest(exp_means, exp_valid, ctl_means, ctl_valid)
+
+            p_wilcoxon = \
+                self.h__rankSums(exp_means, exp_valid, ctl_means, ctl_valid)
+
+            # The means and stds of the merged histograms, i.e. over all
+            # of their videos (so NaN if any video is NaN)
+            exp_mean = self.h__meanOverRows(exp_means, exp_present)
+            ctl_mean = self.h__meanOverRows(ctl_means, ctl_present)
+            ctl_std = np.sqrt(self.h__meanOverRows(
+                (ctl_means - ctl_mean[:, None])**2, ctl_present))
+
+            z_score = (exp_mean - ctl_mean) / ctl_std
+
+        # Measurements found exclusively in the experiment have a z-score
+        # of infinity, and those exclusively found in the control -infinity
+        if USE_OLD_CODE:
+            exp_only = ctl_only = self.is_exclusive_array
+        else:
+            exp_only = num_exp_valid > 1
+            ctl_only = num_ctl_valid > 1
+
+        z_score[np.isnan(ctl_mean)] = np.where(exp_only, np.Inf,
+                                               np.NaN)[np.isnan(ctl_mean)]
+        z_score[np.isnan(exp_mean)] = np.where(ctl_only, -np.Inf,
+                                               np.NaN)[np.isnan(exp_mean)]
+        self.z_score_experiment_array = z_score
+
+        # Fall back to Fisher's exact test for the exclusive features, and
+        # only do the rank-sum test if there is a mean in both
+        self.p_studentst_array = np.where(self.is_exclusive_array,
+                                          self.fisher_p_array, p_studentst)
+
+        p_wilcoxon[(num_exp_valid == 0) | (num_ctl_valid == 0)] = np.NaN
+        self.p_wilcoxon_array = np.where(self.is_exclusive_array,
+                                         self.fisher_p_array, p_wilcoxon)
+
+        for array in (self.fisher_p_array, self.t_statistic_array,
+                      self.p_studentst_array, self.p_wilcoxon_array,
+                      self.z_score_experiment_array):
+            array[is_missing] = np.NaN
+
+    @staticmethod
+    def h__getMeansMatrix(histograms):
+        """
+        Returns
+        ---------------------------------------
+        (means, is_present)
+            numpy arrays of shape (num_features, max # of videos) of the
+            mean_per_video of each histogram, padded with NaN, and of
+            whether there is a video at each position.  A None histogram
+            has no videos.
+
+        """
+        num_videos = np.array([0 if x is None else x.num_videos
+                               for x in histograms], dtype=int)
+
+        means = np.full((len(histograms), max(num_videos.max(), 1)), np.NaN)
+        is_present = np.arange(means.shape[1]) < num_videos[:, None]
+
+        for feature_index, histogram in enumerate(histograms):
+            if histogram is not None:
+                means[feature_index, :num_videos[feature_index]] = \
+                    histogram.mean_per_video
+
+        return means, is_present
+
+    @staticmethod
+    def h__meanOverRows(values, mask):
+        """
+        The mean of each row of values over the entries where mask is True.
+
+        """
+        return (np.sum(np.where(mask, values, 0), axis=1) /
+                np.sum(mask, axis=1))
+
+    @staticmethod
+    def h__tTest(exp_means, exp_valid, ctl_means, ctl_valid):
+        """
+        Student's t-test of the valid means of each row, as in
+        sp.stats.ttest_ind, i.e. two-sided and with a pooled variance.
+
+        Returns
+        ---------------------------------------
+        (t_statistic, p_value)
+
+        """
+        n1 = exp_valid.sum(axis=1)
+        n2 = ctl_valid.sum(axis=1)
+
+        m1 = StatisticsManager.h__meanOverRows(exp_means, exp_valid)
+        m2 = StatisticsManager.h__meanOverRows(ctl_means, ctl_valid)
+
+        ss1 = np.sum(np.where(exp_valid, (exp_means - m1[:, None])**2, 0),
+                     axis=1)
+        ss2 = np.sum(np.where(ctl_valid, (ctl_means - m2[:, None])**2, 0),
+                     axis=1)
+
+        # The pooled variance is computed from the sums of squares, rather
+        # than from the variance of each group, which is undefined for a
+        # group of one video
+        df = n1 + n2 - 2
+        pooled_var = (ss1 + ss2) / df
+
+        t_statistic = (m1 - m2) / np.sqrt(pooled_var * (1 / n1 + 1 / n2))
+        p_value = 2 * sp.stats.t.sf(np.abs(t_statistic), df)
+
+        return t_statistic, p_value
+
+    @staticmethod
+    def h__rankSums(exp_means, exp_valid, ctl_means, ctl_valid):
+        """
+        Wilcoxon rank-sum test of the valid means of each row, as in
+        sp.stats.ranksums (i.e. using the normal approximation, with tied
+        values given their average rank).
+
+        Returns
+        ---------------------------------------
+        p_value
+
+        """
+        num_exp_columns = exp_means.shape[1]
+
+        # Invalid means are sorted to the end of each row, after the
+        # valid ones, where they don't affect the ranks of the others
+        all_means = np.concatenate((np.where(exp_valid, exp_means, np.NaN),
+                                    np.where(ctl_valid, ctl_means, np.NaN)),
+                                   axis=1)
+        order = np.argsort(all_means, axis=1, kind='mergesort')
+        sorted_means = all_means[np.arange(len(all_means))[:, None], order]
+
+        # Tied values get the average of the ranks they span
+        columns = np.arange(sorted_means.shape[1])
+        is_group_start = np.ones(sorted_means.shape, dtype=bool)
+        is_group_start[:, 1:] = sorted_means[:, 1:] != sorted_means[:, :-1]
+        is_group_end = np.ones(sorted_means.shape, dtype=bool)
+        is_group_end[:, :-1] = is_group_start[:, 1:]
+
+        group_start = np.maximum.accumulate(
+            np.where(is_group_start, columns, 0), axis=1)
+        group_end = np.minimum.accumulate(
+            np.where(is_group_end, columns, columns[-1])[:, ::-1],
+            axis=1)[:, ::-1]
+        ranks = (group_start + group_end) / 2 + 1
+
+        is_exp = (order < num_exp_columns) & ~np.isnan(sorted_means)
+        exp_rank_sum = np.sum(np.where(is_exp, ranks, 0), axis=1)
+
+        n1 = exp_valid.sum(axis=1)
+        n2 = ctl_valid.sum(axis=1)
+
+        expected = n1 * (n1 + n2 + 1) / 2
+        z = (exp_rank_sum - expected) / np.sqrt(n1 * n2 * (n1 + n2 + 1) / 12)
+
+        return 2 * sp.stats.norm.sf(np.abs(z))
+
+    @staticmethod
+    def h__fisherExact(num_exp_videos, num_ctl_videos):
+        """
+        Fisher's exact test for a feature found exclusively in the
+        experiment or in the control.
+
+        Notes
+        ---------------------------------------
+        Original Matlab version
+        self.p_wilcoxon = seg_worm.stats.helpers.fexact(*params)
+        with params = [num_exp_videos, num_videos, num_exp_videos,
+                       num_exp_videos]
+
+        fexact(x, M, K, N) is the probability of drawing at least x of the
+        K marked items in N draws from M items, i.e. the upper tail of the
+        hypergeometric distribution.
+
+        """
+        num_videos = num_exp_videos + num_ctl_videos
+
+        return sp.stats.hypergeom.sf(num_exp_videos - 1, num_videos,
+                                     num_exp_videos, num_exp_videos)
+
+    def permutation_test(self, num_permutations=10000, random_state=None,
+                         n_workers=1):
+        """
+        Two-sided permutation test of the difference between the mean of
+        the valid experiment video means and that of the control, for all
+        features.
+
+        For each permutation the valid video means of a feature are
+        shuffled between experiment and control (keeping the number of
+        videos in each), for all features at once.
+
+        Parameters
+        ---------------------------------------
+        num_permutations: int
+        random_state: None, int or np.random.RandomState
+            For reproducible results
+        n_workers: int (default 1)
+            If greater than 1, the permutations are evaluated in a pool
+            of this many processes.
+
+        Returns
+        ---------------------------------------
+        numpy array of floats
+            The p-value of each feature, i.e. the fraction of the
+            permutations (counting the observed one) with an absolute
+            difference at least as large as the observed one. NaN if the
+            experiment or the control has no valid means.
+
+        """
+        pooled_means, num_exp, num_valid = self.h__poolValidMeans(
+            self.exp_means, self.exp_valid, self.ctl_means, self.ctl_valid)
+
+        is_exp = np.arange(pooled_means.shape[1]) < num_exp[:, None]
+        observed = h__meanDifferences(
+            np.sum(np.where(is_exp, pooled_means, 0), axis=1),
+            np.sum(pooled_means, axis=1), num_exp, num_valid)
+
+        counts = self.h__resample(_permutation_counts_in_worker,
+                                  (pooled_means, num_exp, num_valid,
+                                   observed),
+                                  num_permutations, random_state, n_workers)
+
+        with np.errstate(invalid='ignore'):
+            p_values = (1 + sum(counts)) / (1 + num_permutations)
+
+        p_values[np.isnan(observed)] = np.NaN
+
+        return p_values
+
+    def bootstrap_confidence_intervals(self, num_bootstraps=10000,
+                                       confidence_level=0.95,
+                                       random_state=None, n_workers=1):
+        """
+        Percentile bootstrap confidence intervals of the difference between
+        the mean of the valid experiment video means and that of the
+        control, for all features.
+
+        The video means of the experiment and of the control are resampled
+        (with replacement) separately, for all features at once.
+
+        Parameters
+        ---------------------------------------
+        num_bootstraps: int
+        confidence_level: float
+        random_state: None, int or np.random.RandomState
+            For reproducible results
+        n_workers: int (default 1)
+            If greater than 1, the resamples are evaluated in a pool of
+            this many processes.
+
+        Returns
+        ---------------------------------------
+        numpy array of shape (num_features, 2)
+            The lower and upper bounds of the interval of each feature,
+            NaN if the experiment or the control has no valid means.
+
+        """
+        exp_means, num_exp = self.h__packValidMeans(self.exp_means,
+                                                    self.exp_valid)
+        ctl_means, num_ctl = self.h__packValidMeans(self.ctl_means,
+                                                    self.ctl_valid)
+
+        differences = self.h__resample(_bootstrap_in_worker,
+                                       (exp_means, num_exp,
+                                        ctl_means, num_ctl),
+                                       num_bootstraps, random_state,
+                                       n_workers)
+        differences = np.concatenate(differences)
+
+        is_valid = (num_exp > 0) & (num_ctl > 0)
+        alpha = 1 - confidence_level
+
+        intervals = np.full((len(is_valid), 2), np.NaN)
+        if np.any(is_valid):
+            intervals[is_valid] = np.percentile(differences[:, is_valid],
+                                                [100 * alpha / 2,
+                                                 100 * (1 - alpha / 2)],
+                                                axis=0).T
+
+        return intervals
+
+    @staticmethod
+    def h__resample(worker_function, args, num_resamples, random_state,
+                    n_workers):
+        """
+        Run worker_function on the chunks of the resamples, each with
+        its own seed drawn from random_state.
+
+        Returns
+        ---------------------------------------
+        A list with the result of each chunk
+
+        """
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+
+        chunk_sizes = [RESAMPLING_CHUNK_SIZE] * \
+            (num_resamples // RESAMPLING_CHUNK_SIZE)
+        if num_resamples % RESAMPLING_CHUNK_SIZE:
+            chunk_sizes.append(num_resamples % RESAMPLING_CHUNK_SIZE)
+
+        seeds = random_state.randint(2**31 - 1, size=len(chunk_sizes))
+        tasks = [args + (chunk_size, seed)
+                 for chunk_size, seed in zip(chunk_sizes, seeds)]
+
+        if n_workers > 1:
+            pool = multiprocessing.Pool(n_workers)
+            try:
+                return pool.map(worker_function, tasks)
+            finally:
+                pool.terminate()
+
+        return [worker_function(task) for task in tasks]
+
+    @staticmethod
+    def h__packValidMeans(means, valid):
+        """
+        Move the valid means of each row to the front.
+
+        Returns
+        ---------------------------------------
+        (packed_means, num_valid)
+            packed_means is padded with zeros
+
+        """
+        order = np.argsort(~valid, axis=1, kind='mergesort')
+        rows = np.arange(len(means))[:, None]
+        packed_means = np.where(valid[rows, order], means[rows, order], 0)
+
+        return packed_means, valid.sum(axis=1)
+
+    @staticmethod
+    def h__poolValidMeans(exp_means, exp_valid, ctl_means, ctl_valid):
+        """
+        Returns
+        ---------------------------------------
+        (pooled_means, num_exp, num_valid)
+            pooled_means has the valid experiment means of each row,
+            followed by the valid control means, padded with zeros.
+
+        """
+        pooled_means, num_valid = StatisticsManager.h__packValidMeans(
+            np.concatenate((exp_means, ctl_means), axis=1),
+            np.concatenate((exp_valid, ctl_valid), axis=1))
+
+        return pooled_means, exp_valid.sum(axis=1), num_valid
 
     @property
     def valid_p_studentst_array(self):
@@ -185,6 +609,130 @@ class StatisticsManager(object):
             hspace=0.6)  # blank space between plots
 
 
+def h__meanDifferences(exp_sum, total, num_exp, num_valid):
+    """
+    The differences of the experiment and the control means, given the sum
+    of the experiment values and the total of the num_valid values.
+
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return exp_sum / num_exp - (total - exp_sum) / (num_valid - num_exp)
+
+
+def h__getBatchSize(bytes_per_resample):
+    """
+    The number of resamples to evaluate at once, to stay within
+    RESAMPLING_MEMORY_BUDGET.
+
+    """
+    return max(1, RESAMPLING_MEMORY_BUDGET // max(bytes_per_resample, 1))
+
+
+def _permutation_counts_in_worker(task):
+    """
+    Count, for each feature, the permutations of a chunk with an absolute
+    difference of means at least as large as the observed one.
+    """
+    (pooled_means, num_exp, num_valid, observed,
+     num_permutations, seed) = task
+    random_state = np.random.RandomState(seed)
+
+    num_features, n = pooled_means.shape
+    features = np.arange(num_features)
+    total = np.sum(pooled_means, axis=1)
+
+    # A permutation is determined by which of the valid values of each row
+    # go to the smaller of the two groups, so only those are drawn
+    num_ctl = num_valid - num_exp
+    is_exp_drawn = num_exp <= num_ctl
+    num_drawn = np.where(is_exp_drawn, num_exp, num_ctl)
+    max_num_drawn = num_drawn.max()
+
+    # The taken flags, and the random numbers
+    batch_size = h__getBatchSize(num_features * (n + 8 * max_num_drawn))
+
+    counts = np.zeros(num_features, dtype=int)
+    for start in range(0, num_permutations, batch_size):
+        cur_batch_size = min(batch_size, num_permutations - start)
+        permutations = np.arange(cur_batch_size)[:, None]
+
+        uniform = random_state.rand(cur_batch_size, max_num_drawn,
+                                    num_features)
+        is_taken = np.zeros((cur_batch_size, num_features, n), dtype=bool)
+        drawn_sum = np.zeros((cur_batch_size, num_features))
+
+        # Floyd's algorithm for drawing without replacement: draw one of
+        # the first j + 1 values, and if it was already taken take the
+        # jth value instead
+        for i in range(max_num_drawn):
+            is_drawing = i < num_drawn
+            j = np.where(is_drawing, num_valid - num_drawn + i, 0)
+            drawn = (uniform[:, i, :] * (j + 1)).astype(int)
+            drawn = np.where(is_taken[permutations, features, drawn],
+                             j, drawn)
+            is_taken[permutations, features, drawn] |= is_drawing
+            drawn_sum += np.where(is_drawing,
+                                  pooled_means[features, drawn], 0)
+
+        exp_sum = np.where(is_exp_drawn, drawn_sum, total - drawn_sum)
+        differences = h__meanDifferences(exp_sum, total, num_exp, num_valid)
+
+        # Allow for rounding errors, since the sums are in a different order
+        with np.errstate(invalid='ignore'):
+            is_extreme = (np.abs(differences) >=
+                          np.abs(observed) * (1 - 1e-9) - 1e-12)
+
+        counts += np.sum(is_extreme, axis=0)
+
+    return counts
+
+
+def _bootstrap_in_worker(task):
+    """
+    Bootstrap the differences of means for a chunk of resamples.
+    """
+    (exp_means, num_exp, ctl_means, num_ctl,
+     num_bootstraps, seed) = task
+    random_state = np.random.RandomState(seed)
+
+    num_features, n_exp = exp_means.shape
+
+    # Resample the experiment and the control columns together
+    means = np.concatenate((exp_means, ctl_means), axis=1)
+    n = means.shape[1]
+    num_samples = np.concatenate(
+        (np.repeat(num_exp[:, None], n_exp, axis=1),
+         np.repeat(num_ctl[:, None], n - n_exp, axis=1)), axis=1)
+    column_offsets = np.where(np.arange(n) < n_exp, 0, n_exp)
+    is_padding = (np.arange(n) - column_offsets) >= num_samples
+
+    # Offsets of the values each column is resampled from, in the
+    # flattened means
+    offsets = column_offsets + n * np.arange(num_features)[:, None]
+
+    # The random numbers, the indices and the resampled means
+    batch_size = h__getBatchSize(24 * num_features * n)
+
+    differences = []
+    for start in range(0, num_bootstraps, batch_size):
+        cur_batch_size = min(batch_size, num_bootstraps - start)
+
+        indices = random_state.rand(cur_batch_size, num_features, n)
+        indices *= num_samples
+        indices = indices.astype(np.intp)
+        indices += offsets
+        resampled = means.ravel().take(indices)
+        del indices
+        resampled[:, is_padding] = 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            differences.append(
+                np.sum(resampled[:, :, :n_exp], axis=2) / num_exp -
+                np.sum(resampled[:, :, n_exp:], axis=2) / num_ctl)
+
+    return np.concatenate(differences)
+
+
 #%%
 class WormStatistics(object):
     """
@@ -223,7 +771,8 @@ class WormStatistics(object):
     """
 
     #%%
-    def __init__(self, exp_histogram, ctl_histogram, USE_OLD_CODE=False):
+    def __init__(self, exp_histogram, ctl_histogram, USE_OLD_CODE=False,
+                 statistics_manager=None, feature_index=0):
         """
         Initializer for StatisticsManager
 
@@ -235,6 +784,10 @@ class WormStatistics(object):
             "control"
         USE_OLD_CODE: bool
             Use old code (i.e. Schafer Lab code)
+        statistics_manager: StatisticsManager object (optional)
+            The manager holding the statistics of this feature, at
+            feature_index.  If not given the statistics are computed
+            for this feature alone, without the q-values.
 
         Notes
         ------------------
@@ -246,31 +799,34 @@ class WormStatistics(object):
         seg_worm.stats.helpers.swtest
 
         """
-        if exp_histogram is None or ctl_histogram is None:
-            self._z_score_experiment = np.NaN
-            self._p_wilcoxon = np.NaN
-            self._p_studentst = np.NaN
-            self._t_statistic = np.NaN
-            self._fisher_p = np.NaN
-
-            return
-
-        # Ensure that we are comparing the same feature!
-        assert(exp_histogram.specs.name ==
-               ctl_histogram.specs.name)
-        #assert(exp_histogram.histogram_type == ctl_histogram.histogram_type)
-        #assert(exp_histogram.motion_type == ctl_histogram.motion_type)
-        #assert(exp_histogram.data_type == ctl_histogram.data_type)
+        if exp_histogram is not None and ctl_histogram is not None:
+            # Ensure that we are comparing the same feature!
+            assert(exp_histogram.specs.name ==
+                   ctl_histogram.specs.name)
+            #assert(exp_histogram.histogram_type == ctl_histogram.histogram_type)
+            #assert(exp_histogram.motion_type == ctl_histogram.motion_type)
+            #assert(exp_histogram.data_type == ctl_histogram.data_type)
+
+        if statistics_manager is None:
+            # Just the statistics, as q-values only make sense across
+            # many features
+            statistics_manager = StatisticsManager.__new__(StatisticsManager)
+            statistics_manager.h__computeStatistics([exp_histogram],
+                                                    [ctl_histogram],
+                                                    USE_OLD_CODE)
+            feature_index = 0
 
         self.exp_histogram = exp_histogram
         self.ctl_histogram = ctl_histogram
         self.USE_OLD_CODE = USE_OLD_CODE
+        self.statistics_manager = statistics_manager
+        self.feature_index = feature_index
 
     #%%
     @property
     def z_score_experiment(self):
         """
-        Calculate the z-score experiment value.
+        The z-score experiment value.
 
         Returns
         ------------
@@ -289,34 +845,12 @@ class WormStatistics(object):
         a zScore of infinity and those found exclusively found in the
         control are -infinity."
 
-        """
-        try:
-            return self._z_score_experiment
-        except AttributeError:
-            USE_OLD_CODE = self.USE_OLD_CODE
-
-            if np.isnan(self.exp_histogram.mean):
-                if ((USE_OLD_CODE and self.is_exclusive) or (
-                        ~USE_OLD_CODE and self.ctl_histogram.num_valid_videos > 1)):
-                    self._z_score_experiment = -np.Inf
-                else:
-                    self.z_score_experiment = np.NaN
-
-            elif np.isnan(self.ctl_histogram.mean):
-                if ((USE_OLD_CODE and self.is_exclusive) or (
-                        ~USE_OLD_CODE and self.exp_histogram.num_valid_videos > 1)):
-                    self._z_score_experiment = np.Inf
-                else:
-                    self._z_score_experiment = np.NaN
+        This might need to be means_per_video, not the mean ...
+        - @JimHokanson
 
-            else:
-                # This might need to be means_per_video, not the mean ...
-                # - @JimHokanson
-                self._z_score_experiment = (
-                    (self.exp_histogram.mean - self.ctl_histogram.mean) /
-                    self.ctl_histogram.std)
-
-            return self._z_score_experiment
+        """
+        return self.statistics_manager.z_score_experiment_array[
+            self.feature_index]
 
     #%%
     @property
@@ -367,25 +901,12 @@ class WormStatistics(object):
         This test assumes that the populations have identical variances.
 
         """
-        try:
-            return self._p_studentst
-        except AttributeError:
-            # Scenario 1
-            if self.is_exclusive:
-                return self.fisher_p
-
-            # Scenario 2
-            else:
-                _, self._p_studentst = \
-                    sp.stats.ttest_ind(self.exp_histogram.valid_mean_per_video,
-                                       self.ctl_histogram.valid_mean_per_video)
-
-            return self._p_studentst
+        return self.statistics_manager.p_studentst_array[self.feature_index]
 
     @property
     def p_wilcoxon(self):
         """
-        p-value calculated using the Wilcoxon signed-rank test.
+        p-value calculated using the Wilcoxon rank-sum test.
 
         Rules:
 
@@ -393,30 +914,21 @@ class WormStatistics(object):
             Use Fisher's exact test.
 
         2. If at least one mean exists in both:
-            Use the Wilcoxon signed-rank test.
+            Use the Wilcoxon rank-sum test.
 
         3. If no valid means exist in either:
             NaN.
 
         """
-        try:
-            return self._p_wilcoxon
-        except AttributeError:
-            # Scenario 1
-            if self.is_exclusive:
-                return self.fisher_p
-
-            # Scenario 2
-            elif not (self.exp_histogram.no_valid_videos or
-                      self.ctl_histogram.no_valid_videos):
-                _, self._p_wilcoxon = \
-                    sp.stats.ranksums(self.exp_histogram.valid_mean_per_video,
-                                      self.ctl_histogram.valid_mean_per_video)
-            # Scenario 3
-            else:
-                self._p_wilcoxon = np.NaN
-
-            return self._p_wilcoxon
+        return self.statistics_manager.p_wilcoxon_array[self.feature_index]
+
+    @property
+    def q_studentst(self):
+        return self.statistics_manager.q_studentst_array[self.feature_index]
+
+    @property
+    def q_wilcoxon(self):
+        return self.statistics_manager.q_wilcoxon_array[self.feature_index]
     #%%
 
     @property
@@ -447,39 +959,14 @@ class WormStatistics(object):
 
         Notes
         ---------------
-        Original Matlab version
-        self.p_wilcoxon = seg_worm.stats.helpers.fexact(*params)
+        See StatisticsManager.h__fisherExact
 
         """
-        try:
-            return self._fisher_p
-        except AttributeError:
-            # This is a literal translation of the code (I think)
-            # I'm a bit confused by it ...  - @JimHokanson
-            num_exp_videos = self.exp_histogram.num_videos
-            num_ctl_videos = self.ctl_histogram.num_videos
-            num_videos = num_exp_videos + num_ctl_videos
-
-            # This is a strange step, I don't know what it means...
-            # Why this specific list of values, it's strange.
-            # -@MichaelCurrie
-            params = np.array([num_exp_videos, num_videos,
-                               num_exp_videos, num_exp_videos])
-
-            _, self._fisher_p = sp.stats.fisher_exact(params)
-
-            return self._fisher_p
+        return self.statistics_manager.fisher_p_array[self.feature_index]
 
     @property
     def t_statistic(self):
-        try:
-            return self._t_statistic
-        except AttributeError:
-            self._t_statistic, _ = \
-                sp.stats.ttest_ind(self.exp_histogram.valid_mean_per_video,
-                                   self.ctl_histogram.valid_mean_per_video)
-
-            return self._t_statistic
+        return self.statistics_manager.t_statistic_array[self.feature_index]
 
     @property
     def is_exclusive(self):
@@ -488,15 +975,7 @@ class WormStatistics(object):
         control has none, or vice versa.
 
         """
-        try:
-            return self._is_exclusive
-        except AttributeError:
-            self._is_exclusive = ((self.exp_histogram.no_valid_videos and
-                                   self.ctl_histogram.all_videos_valid) or
-                                  (self.ctl_histogram.no_valid_videos and
-                                   self.exp_histogram.all_videos_valid))
-
-            return self._is_exclusive
+        return self.statistics_manager.is_exclusive_array[self.feature_index]
 
     def __repr__(self):
         return utils.print_object(self)
@@ -566,6 +1045,10 @@ class WormStatistics(object):
         -----------------------
         ax: A matplotlib.axes.Axes object
             This is the handle where we'll make the plot
+        use_alternate_plot: bool (default False)
+            If True a hexbin plot of the experiment data against the control
+            data is made instead. This requires the HistogramManagers to
+            have been created with keep_data=True.
         exp_hist: A Histogram object
             The "experiment"
         ctl_hist: A Histogram object
@@ -609,6 +1092,11 @@ class WormStatistics(object):
             x = self.exp_histogram.data
             y = self.ctl_histogram.data
 
+            if x is None or y is None:
+                raise Exception("The alternate plot needs the underlying "
+                                "data of the histograms; create the "
+                                "HistogramManagers with keep_data=True")
+
             truncated_length = min(len(x), len(y))
 
             df = pd.DataFrame(data={'Experiment': x[:truncated_length],
@@ -13,6 +13,7 @@ import os
 import sys
 import time
 import csv
+import threading
 
 import numpy as np
 import scipy as sp
@@ -25,6 +26,8 @@ __ALL__ = ['scatter',
            'plotx',
            'imagesc',
            'separated_peaks',
+           'separated_peaks_2d',
+           'find_runs',
            'gausswin',
            'colon',
            'print_object'
@@ -250,6 +253,151 @@ def separated_peaks(x, dist, use_max, value_cutoff):
     return (peaks, indices)
 
 
+def separated_peaks_2d(x, dist, use_max, value_cutoff):
+    """
+    separated_peaks for each row of a 2D array, computed for all rows at
+    once.
+
+    Parameters
+    ---------------------------------------
+    x: numpy array of shape (m,k)
+      The values to be searched for peaks, one row at a time
+    dist
+      The minimum distance between peaks
+    use_max: boolean
+      True: find the maximum peaks
+      False: find the minimum peaks
+    value_cutoff: numpy array of shape (m,)
+      The cutoff for each row
+
+    Returns
+    ---------------------------------------
+    numpy array of bools, shape (m,k)
+      True at the peaks of each row, i.e. at the indices that
+      separated_peaks returns for that row
+
+    Notes
+    ---------------------------------------
+    Candidate peaks of equal value are taken in order of index, as
+    separated_peaks does for the small number of candidates it usually
+    has.
+
+    """
+    n_rows, n_points = x.shape
+    row_I = np.arange(n_rows)
+
+    if n_points < 2 * dist + 1:
+        is_peak_mask = np.zeros(x.shape, dtype=bool)
+        is_peak_mask[row_I, np.argmax(x, axis=1)] = True
+        return is_peak_mask
+
+    # Look for maxima of xt, whether or not we want the maxima of x
+    if use_max:
+        xt = x
+        cutoff = value_cutoff
+    else:
+        xt = -1 * x
+        cutoff = -1 * value_cutoff
+
+    # A point can't be a peak if it is smaller than either of its neighbors
+    with np.errstate(invalid='ignore'):
+        could_be_a_peak = xt > cutoff[:, None]
+        could_be_a_peak[:, 1:] &= xt[:, 1:] > xt[:, :-1]
+        could_be_a_peak[:, :-1] &= xt[:, :-1] > xt[:, 1:]
+
+    too_close = dist - 1
+
+    # The candidates of each row, from largest to smallest, as a
+    # (n_rows, max number of candidates) array padded with -1
+    cand_row_I, cand_I = np.nonzero(could_be_a_peak)
+    order_I = np.lexsort((cand_I, -1 * xt[cand_row_I, cand_I], cand_row_I))
+    cand_row_I = cand_row_I[order_I]
+    cand_I = cand_I[order_I]
+
+    n_candidates = np.bincount(cand_row_I, minlength=n_rows)
+    rank_I = np.arange(cand_I.size) - \
+        np.repeat(np.cumsum(n_candidates) - n_candidates, n_candidates)
+    max_n_candidates = n_candidates.max() if n_rows > 0 else 0
+    candidates = np.full((n_rows, max_n_candidates), -1, dtype=np.int64)
+    candidates[cand_row_I, rank_I] = cand_I
+
+    # Go through the candidates of all rows from largest to smallest. Each
+    # one that hasn't been taken by a larger candidate takes the points
+    # in its window, [i - too_close, i + too_close), as used by
+    # separated_peaks.
+    is_used = np.zeros(candidates.shape, dtype=bool)
+    for rank in range(max_n_candidates):
+        cur_I = candidates[:, rank:rank + 1]
+        is_taken = is_used[:, :rank] & \
+            (cur_I >= candidates[:, :rank] - too_close) & \
+            (cur_I < candidates[:, :rank] + too_close)
+        is_used[:, rank] = (cur_I[:, 0] != -1) & ~is_taken.any(axis=1)
+
+    # A used candidate is a peak if it is the largest value in its window
+    used_row_I, used_rank_I = np.nonzero(is_used)
+    used_I = candidates[used_row_I, used_rank_I]
+
+    window_I = used_I[:, None] + np.arange(-too_close, too_close)
+    is_in_data = (window_I >= 0) & (window_I < n_points)
+    window_values = np.where(
+        is_in_data,
+        xt[used_row_I[:, None], np.clip(window_I, 0, n_points - 1)],
+        -np.inf)
+    if window_values.shape[1] == 0:
+        window_max = np.full(used_I.shape, -np.inf)
+    else:
+        window_max = np.max(window_values, axis=1)
+
+    is_peak_mask = np.zeros(x.shape, dtype=bool)
+    with np.errstate(invalid='ignore'):
+        is_peak_mask[used_row_I, used_I] = \
+            window_max == xt[used_row_I, used_I]
+
+    return is_peak_mask
+
+
+def find_runs(x):
+    """
+    Run-length encoding of an array, or of each column of a 2D array.
+
+    A run is a stretch of consecutive equal values. As NaN is not equal to
+    anything, each NaN value is a run of its own.
+
+    Parameters
+    ---------------------------------------
+    x: numpy array of shape (n,) or (n,m)
+
+    Returns
+    ---------------------------------------
+    column_I: numpy array of ints
+      The column of each run, all 0 for a 1D array
+    start_I: numpy array of ints
+      The index of the first value of each run
+    end_I: numpy array of ints
+      The index of the last value of each run
+
+    The runs are ordered by column, and then by start_I.
+
+    """
+    n_values = x.shape[0]
+    x = x.reshape((n_values, -1))
+
+    is_start = np.ones(x.shape, dtype=bool)
+    with np.errstate(invalid='ignore'):
+        is_start[1:] = np.not_equal(x[1:], x[:-1])
+
+    # Transpose so that the runs are ordered by column
+    column_I, start_I = np.nonzero(is_start.T)
+
+    end_I = np.empty_like(start_I)
+    end_I[:-1] = start_I[1:] - 1
+    is_last_of_column = np.ones(start_I.shape, dtype=bool)
+    is_last_of_column[:-1] = column_I[1:] != column_I[:-1]
+    end_I[is_last_of_column] = n_values - 1
+
+    return column_I, start_I, end_I
+
+
 def colon(r1, inc, r2):
     """
       Matlab's colon operator, althought it doesn't although inc is required
@@ -929,12 +1077,18 @@ class ElementTimer(object):
     def __init__(self):
         self.names = []
         self.times = []
+        # Start times are tracked per thread so that features can be
+        # timed while being computed concurrently
+        # (see features.feature_scheduler)
+        self.start_times = {}
 
     def tic(self):
-        self.start_time = timing_function()
+        self.start_times[threading.current_thread().ident] = \
+            timing_function()
 
     def toc(self, name):
-        elapsed_time = timing_function() - self.start_time
+        start_time = self.start_times[threading.current_thread().ident]
+        elapsed_time = timing_function() - start_time
         self.times.append(elapsed_time)
         self.names.append(name)
         return elapsed_time
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the loading of the contours of a BasicWorm from HDF5 references
+
+"""
+import sys
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import h5py
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.prefeatures.basic_worm import BasicWorm
+
+
+def _write_referenced_contours(h):
+    """
+    Write one contour dataset per frame, in a different order than the
+    frames, and return the references and which frames are valid.
+    """
+    rng = np.random.RandomState(0)
+    n_frames = 12
+    is_valid = np.ones(n_frames, dtype=bool)
+    is_valid[[2, 7, 8]] = False
+
+    refs = np.empty(n_frames, dtype=h5py.special_dtype(ref=h5py.Reference))
+    group = h.create_group('contours')
+    for iFrame in rng.permutation(n_frames):
+        name = 'frame_%d' % iFrame
+        if iFrame == 2:
+            # An invalid frame without a contour
+            refs[iFrame] = h5py.Reference()
+            continue
+        elif iFrame == 7:
+            # MATLAB writes empty arrays as their size
+            dataset = group.create_dataset(name, data=np.zeros(2, 'uint64'))
+        elif iFrame == 5:
+            # A valid frame without any points
+            dataset = group.create_dataset(name, data=np.empty((2, 0)))
+        elif iFrame == 9:
+            # Chunked datasets don't have a single offset in the file
+            dataset = group.create_dataset(name, data=rng.randn(2, 40),
+                                           chunks=(2, 10))
+        else:
+            dataset = group.create_dataset(
+                name, data=rng.randn(2, rng.randint(20, 60)))
+        refs[iFrame] = dataset.ref
+
+    return refs, is_valid
+
+
+def test_read_referenced_arrays():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with h5py.File(os.path.join(temp_dir, 'contours.hdf5'), 'w') as h:
+            refs, is_valid = _write_referenced_contours(h)
+
+            contours = BasicWorm._h_read_referenced_arrays(h, refs, is_valid)
+
+            assert(len(contours) == len(refs))
+            for iFrame, contour in enumerate(contours):
+                if not is_valid[iFrame]:
+                    assert(contour is None)
+                else:
+                    # The frames are read in file order, but come back in
+                    # frame order
+                    assert(np.array_equal(contour, h[refs[iFrame]][...]))
+            assert(contours[5].shape == (2, 0))
+
+            # No valid frames at all
+            contours = BasicWorm._h_read_referenced_arrays(
+                h, refs, np.zeros(len(refs)))
+            assert(all(contour is None for contour in contours))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_read_referenced_arrays()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of finding events with EventFinder
+
+"""
+import sys
+import os
+import operator
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.features import events
+
+
+def test_start_stop_indices():
+    ef = events.EventFinder()
+    data = np.array([np.NaN, 0, 1, 1, 0, 1, 1, 1, 0, np.NaN])
+    mask = np.nan_to_num(data) > 0.5
+    assert(np.array_equal(ef.get_start_stop_indices(data, mask),
+                          [[2, 3], [5, 7]]))
+
+    # Leading and trailing NaNs are swallowed into the first/last event
+    data = np.array([np.NaN, np.NaN, 1, 0, 1, np.NaN])
+    mask = np.nan_to_num(data) > 0.5
+    assert(np.array_equal(ef.get_start_stop_indices(data, mask),
+                          [[0, 2], [4, 5]]))
+
+    assert(ef.get_start_stop_indices(data, np.nan_to_num(data) > 2).size == 0)
+
+
+def test_remove_gaps():
+    ef = events.EventFinder()
+    candidates = np.array([[0, 2], [4, 5], [8, 9], [11, 11]])
+    assert(np.array_equal(ef.remove_gaps(candidates, 1, operator.le),
+                          [[0, 5], [8, 11]]))
+    assert(np.array_equal(ef.remove_gaps(candidates, 1, operator.lt),
+                          candidates))
+
+
+def test_remove_events_by_data_sum():
+    ef = events.EventFinder()
+    ef.min_distance_threshold = np.array([1, 1, np.NaN, 3, 3, 3])
+    candidates = np.array([[0, 2], [3, 5]])
+    distance = np.array([0.5, np.NaN, 0.6, 1, 1, 1])
+
+    # The first event sums to 1.1 > 1, the second to 3 <= 3
+    assert(np.array_equal(ef.remove_events_by_data_sum(candidates, distance),
+                          [[0, 2]]))
+
+
+def test_event_list():
+    event_list = events.EventList(np.array([[1, 2], [5, 5], [7, 9]]))
+    assert(event_list.events.dtype == events.EVENT_DTYPE)
+    assert(np.array_equal(event_list.start_frames, [1, 5, 7]))
+    assert(np.array_equal(event_list.starts_and_stops,
+                          [[1, 2], [5, 5], [7, 9]]))
+
+    assert(np.array_equal(np.flatnonzero(event_list.get_event_mask()),
+                          [1, 2, 5, 7, 8, 9]))
+    # The mask is truncated or padded to the number of frames
+    assert(np.array_equal(np.flatnonzero(event_list.get_event_mask(8)),
+                          [1, 2, 5, 7]))
+    assert(event_list.get_event_mask(12).size == 12)
+
+    other = events.EventList(np.array([[3, 3]]))
+    merged, is_from_first = events.EventList.merge(event_list, other)
+    assert(np.array_equal(merged.start_frames, [1, 3, 5, 7]))
+    assert(np.array_equal(is_from_first, [True, False, True, True]))
+
+    assert(events.EventList().get_event_mask(4).sum() == 0)
+
+
+def test_event_list_features():
+    event_list = events.EventList(np.array([[1, 2], [5, 5], [7, 9]]))
+    distance = np.array([1, 2, 3, np.NaN, 5, 6, 7, 8, 9, 10], dtype=float)
+    with_features = events.EventListWithFeatures(10, event_list, distance,
+                                                 True)
+
+    assert(np.allclose(with_features.event_durations, [0.2, 0.1, 0.3]))
+    assert(np.allclose(with_features.time_between_events, [0.2, 0.1]))
+    assert(np.allclose(with_features.distance_during_events, [5, 6, 27]))
+    assert(np.allclose(with_features.distance_between_events, [5, 7]))
+    assert(np.isclose(with_features.data_ratio, 38 / 51))
+    assert(np.isclose(with_features.time_ratio, 0.6))
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_start_stop_indices()
+    test_remove_gaps()
+    test_remove_events_by_data_sum()
+    test_event_list()
+    test_event_list_features()
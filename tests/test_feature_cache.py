@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the cache keys used by the on-disk feature cache.
+
+"""
+import sys
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.features import feature_cache
+from open_worm_analysis_toolbox.features.generic_features import Feature
+
+
+def _get_features_shell(nw, options):
+    # We only need the keys, so we skip computing the features
+    wf = mv.WormFeatures.__new__(mv.WormFeatures)
+    wf.nw = nw
+    wf.options = options
+    wf.initialize_features()
+    return wf
+
+
+def test_cache_keys():
+    n_frames = 20
+    skeleton = np.random.random((49, 2, n_frames))
+    widths = np.random.random((49, n_frames))
+    nw = mv.NormalizedWorm.from_normalized_array_factory(
+        skeleton, widths, skeleton + 1, skeleton - 1)
+
+    cache = mv.FeatureCache(tempfile.mkdtemp())
+
+    wf1 = _get_features_shell(nw, mv.FeatureProcessingOptions())
+    options = mv.FeatureProcessingOptions()
+    options.locomotion.crawling_bends.peak_energy_threshold = 0.6
+    wf2 = _get_features_shell(nw, options)
+
+    changed = [x for x in wf1.specs
+               if cache.get_key(wf1, x) != cache.get_key(wf2, x)]
+
+    assert('locomotion.crawling_bends.head.amplitude' in changed)
+    assert('locomotion.velocity.midbody.speed' not in changed)
+    assert('morphology.length' not in changed)
+    assert(all(x.startswith('locomotion.crawling_bends') for x in changed))
+
+    # Changing the worm changes everything
+    nw.skeleton = nw.skeleton + 1
+    wf3 = _get_features_shell(nw, mv.FeatureProcessingOptions())
+    assert(all(cache.get_key(wf1, x) != cache.get_key(wf3, x)
+               for x in wf1.specs))
+
+
+
+def test_invalid_cache_files():
+    n_frames = 20
+    skeleton = np.random.random((49, 2, n_frames))
+    widths = np.random.random((49, n_frames))
+    nw = mv.NormalizedWorm.from_normalized_array_factory(
+        skeleton, widths, skeleton + 1, skeleton - 1)
+
+    cache = mv.FeatureCache(tempfile.mkdtemp())
+    wf = _get_features_shell(nw, mv.FeatureProcessingOptions())
+
+    feature_name = 'morphology.length'
+    feature = Feature()
+    feature.name = feature_name
+    feature.value = np.arange(n_frames, dtype=float)
+
+    cache.save(wf, feature)
+    loaded = cache.load(wf, feature_name)
+    assert(np.array_equal(loaded.value, feature.value))
+
+    # Files written by older versions of the code are never used
+    key = cache.get_key(wf, feature_name)
+    cache_version = feature_cache.CACHE_VERSION
+    feature_cache.CACHE_VERSION += 1
+    try:
+        wf._cache_keys = {}
+        assert(cache.get_key(wf, feature_name) != key)
+        assert(cache.load(wf, feature_name) is None)
+    finally:
+        feature_cache.CACHE_VERSION = cache_version
+        wf._cache_keys = {}
+
+    # Files that don't hold the requested feature are cache misses
+    other_feature = Feature()
+    other_feature.name = 'morphology.area'
+    file_path = cache._get_file_path(key)
+    for contents in [b'not a pickle',
+                     pickle.dumps(feature),
+                     pickle.dumps((cache_version + 1, feature)),
+                     pickle.dumps((cache_version, other_feature)),
+                     pickle.dumps((cache_version, np.zeros(3)))]:
+        with open(file_path, 'wb') as f:
+            f.write(contents)
+        assert(cache.load(wf, feature_name) is None)
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_cache_keys()
+    test_invalid_cache_files()
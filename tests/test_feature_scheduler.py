@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the feature dependency graph used for computing features in
+parallel.
+
+"""
+import sys
+import os
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.features import feature_scheduler
+
+
+def _get_graph():
+    wf = mv.WormFeatures.__new__(mv.WormFeatures)
+    wf.initialize_features()
+    return feature_scheduler.get_dependency_graph(wf.specs)
+
+
+def test_dependency_graph():
+    graph = _get_graph()
+
+    assert(graph['morphology.length'] == [])
+    assert(graph['path.duration.head'] == ['path.duration'])
+    assert(graph['locomotion.motion_events.is_paused'] ==
+           ['locomotion.motion_mode'])
+
+    # Parent features should come before their children
+    order = feature_scheduler.get_computation_order(graph, list(graph))
+    assert(sorted(order) == sorted(graph))
+    for feature_name in graph:
+        for dependency in graph[feature_name]:
+            assert(order.index(dependency) < order.index(feature_name))
+
+
+def test_computation_order_subset():
+    graph = _get_graph()
+    order = feature_scheduler.get_computation_order(
+        graph, ['locomotion.crawling_bends.head.amplitude'])
+
+    assert(order[-1] == 'locomotion.crawling_bends.head.amplitude')
+    assert('locomotion.velocity.avg_body_angle' in order)
+    assert('posture.eccentricity' not in order)
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_dependency_graph()
+    test_computation_order_subset()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of HistogramManager and the histograms it merges
+
+"""
+import sys
+import os
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+
+
+class _Spec(object):
+    def __init__(self, name, bin_width):
+        self.name = name
+        self.bin_width = bin_width
+
+
+class _Feature(object):
+    """
+    Just enough of a generic_features.Feature to be histogrammed
+    """
+
+    def __init__(self, name, value, bin_width=1):
+        self.value = value
+        self.spec = _Spec(name, bin_width)
+
+
+def _get_videos(n_videos=4):
+    rng = np.random.RandomState(0)
+    videos = []
+    for i in range(n_videos):
+        videos.append([_Feature('a', rng.randn(200) * 10 + i),
+                       _Feature('b', rng.rand(50) * 3, bin_width=0.5)])
+    return videos
+
+
+def test_histogram_manager():
+    videos = _get_videos()
+    hist_manager = mv.HistogramManager(videos, keep_data=True)
+
+    assert(len(hist_manager) == 2)
+    assert(hist_manager.num_videos == 4)
+    merged = hist_manager[0]
+    assert(np.allclose(merged.mean_per_video,
+                       [np.mean(x[0].value) for x in videos]))
+    assert(np.array_equal(merged.num_samples_per_video, [200] * 4))
+    assert(np.sum(merged.counts) == 800)
+    assert(merged.data.size == 800)
+
+    all_data = np.concatenate([x[0].value for x in videos])
+    assert(np.array_equal(merged.counts,
+                          np.histogram(all_data,
+                                       bins=merged.bin_midpoints.size,
+                                       range=(merged.bin_midpoints[0] - 0.5,
+                                              merged.bin_midpoints[-1] + 0.5)
+                                       )[0]))
+    assert(np.isclose(merged.pooled_mean, np.mean(all_data)))
+    assert(np.isclose(merged.pooled_std, np.std(all_data, ddof=1)))
+
+
+def test_summary_histogram_manager():
+    videos = _get_videos()
+    hist_manager = mv.HistogramManager(videos, keep_data=True)
+    summary_manager = mv.HistogramManager(videos)
+
+    for merged, summary_merged in zip(hist_manager, summary_manager):
+        assert(summary_merged.data is None)
+        assert(np.array_equal(merged.counts, summary_merged.counts))
+        assert(np.isclose(merged.pooled_std, summary_merged.pooled_std))
+
+    # Only the summary statistics of each video are kept
+    video_hist = summary_manager.hist_cell_array[0, 0]
+    assert(video_hist.data is None)
+    assert(not hasattr(video_hist, '_counts'))
+    assert(video_hist.mean == np.mean(videos[0][0].value))
+    assert(np.array_equal(summary_manager.valid_2d_mask,
+                          np.ones((4, 2), dtype=bool)))
+
+
+def test_parallel_histogram_manager():
+    videos = _get_videos()
+    hist_manager = mv.HistogramManager(videos, keep_data=True)
+    parallel_manager = mv.HistogramManager(videos, n_workers=2)
+
+    for merged, parallel_merged in zip(hist_manager, parallel_manager):
+        assert(parallel_merged.data is None)
+        assert(np.array_equal(merged.counts, parallel_merged.counts))
+        assert(np.array_equal(merged.bin_midpoints,
+                              parallel_merged.bin_midpoints))
+        assert(np.array_equal(merged.mean_per_video,
+                              parallel_merged.mean_per_video))
+        assert(np.array_equal(merged.std_per_video,
+                              parallel_merged.std_per_video))
+
+
+def _assert_same_merged_histogram(merged, other):
+    assert(np.allclose(merged.counts, other.counts))
+    assert(np.allclose(merged.bin_midpoints, other.bin_midpoints))
+    assert(np.allclose(merged.pdf, other.pdf))
+    assert(np.array_equal(merged.mean_per_video, other.mean_per_video))
+    assert(np.array_equal(merged.std_per_video, other.std_per_video))
+    assert(np.array_equal(merged.num_samples_per_video,
+                          other.num_samples_per_video))
+
+
+def test_merge_merged_histograms():
+    videos = _get_videos()
+    a, b, c, d = [mv.Histogram.create_histogram(x[0]) for x in videos]
+    d.compact()
+    merge = mv.MergedHistogram.merge
+
+    merged = mv.MergedHistogram.merged_histogram_factory([a, b, c, d])
+    _assert_same_merged_histogram(merged, merge(merge(merge(a, b), c), d))
+    _assert_same_merged_histogram(merged, merge(merge(a, b), merge(c, d)))
+    _assert_same_merged_histogram(merged, merge(a, merge(b, merge(c, d))))
+    assert(merged.data is None)
+    assert(np.array_equal(merge(a, merge(b, c)).data,
+                          np.concatenate([a.data, b.data, c.data])))
+
+
+def test_add_videos():
+    videos = _get_videos(6)
+    hist_manager = mv.HistogramManager(videos)
+
+    incremental_manager = mv.HistogramManager(videos[:2], keep_data=True)
+    incremental_manager.add_videos(videos[2:5])
+    incremental_manager.add_videos(videos[5:])
+    assert(incremental_manager.num_videos == 6)
+    for merged, other in zip(hist_manager, incremental_manager):
+        _assert_same_merged_histogram(merged, other)
+
+    combined_manager = mv.HistogramManager.merge(
+        mv.HistogramManager(videos[:3]),
+        mv.HistogramManager(videos[3:], n_workers=2))
+    assert(combined_manager.num_videos == 6)
+    for merged, other in zip(hist_manager, combined_manager):
+        _assert_same_merged_histogram(merged, other)
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_histogram_manager()
+    test_summary_histogram_manager()
+    test_parallel_histogram_manager()
+    test_merge_merged_histograms()
+    test_add_videos()
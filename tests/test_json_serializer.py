@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of saving a BasicWorm to JSON, with and without a binary sidecar
+file for the numpy arrays
+
+"""
+import sys
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+
+
+def _get_basic_worm():
+    rng = np.random.RandomState(0)
+    frames = [rng.randn(2, 5), None, rng.randn(2, 3), rng.randn(2, 8)]
+    bw = mv.BasicWorm.from_contour_factory(frames, frames)
+    bw.video_info.fps = 30
+    bw.video_info.frame_code = np.array([1, 3, 1, 1])
+    return bw, frames
+
+
+def _check_basic_worm(bw, frames):
+    for contour in [bw.h_ventral_contour, bw.h_dorsal_contour]:
+        assert(len(contour) == len(frames))
+        for frame, loaded_frame in zip(frames, contour):
+            if frame is None:
+                assert(loaded_frame is None)
+            else:
+                assert(np.array_equal(frame, loaded_frame))
+    assert(bw.video_info.fps == 30)
+    assert(np.array_equal(bw.video_info.frame_code, [1, 3, 1, 1]))
+
+
+def test_JSON_round_trip():
+    bw, frames = _get_basic_worm()
+    dir_path = tempfile.mkdtemp()
+    try:
+        JSON_path = os.path.join(dir_path, 'worm.JSON')
+        bw.save_to_JSON(JSON_path)
+        assert(not os.path.exists(JSON_path + '.bin'))
+
+        bw2 = mv.BasicWorm()
+        bw2.load_from_JSON(JSON_path)
+        _check_basic_worm(bw2, frames)
+    finally:
+        shutil.rmtree(dir_path)
+
+
+def test_JSON_binary_arrays():
+    bw, frames = _get_basic_worm()
+    dir_path = tempfile.mkdtemp()
+    try:
+        JSON_path = os.path.join(dir_path, 'worm.JSON')
+        bw.save_to_JSON(JSON_path, binary_arrays=True)
+        assert(os.path.exists(JSON_path + '.bin'))
+
+        bw2 = mv.BasicWorm()
+        bw2.load_from_JSON(JSON_path)
+        _check_basic_worm(bw2, frames)
+
+        # The default copy-on-write mapping never changes the file
+        bw2.h_ventral_contour[0][:] = 0
+        bw3 = mv.BasicWorm()
+        bw3.load_from_JSON(JSON_path, mmap_mode=None)
+        _check_basic_worm(bw3, frames)
+
+        # Saving again as plain JSON removes the sidecar file
+        bw.save_to_JSON(JSON_path)
+        assert(not os.path.exists(JSON_path + '.bin'))
+    finally:
+        shutil.rmtree(dir_path)
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_JSON_round_trip()
+    test_JSON_binary_arrays()
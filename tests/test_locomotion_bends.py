@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the helpers used for the crawling and foraging bend features
+
+"""
+import sys
+import os
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.features import locomotion_bends
+from open_worm_analysis_toolbox.features import feature_processing_options
+
+
+def test_foraging_amplitudes():
+    data = np.array([1, 2, 3, 2, 1, -1, -2, -1, 1, 2, 2, 5], dtype=float)
+    amps = locomotion_bends.h__getAmplitudes(data)
+    assert(np.array_equal(amps, [3, 3, 3, 3, 3, -2, -2, -2, 5, 5, 5, 5]))
+
+    # NaN values stay NaN and split the stretches around them
+    data = np.array([np.NaN, 1, 4, np.NaN, 2, 0, 0, -3, -1])
+    amps = locomotion_bends.h__getAmplitudes(data)
+    assert(np.array_equal(np.isnan(amps), np.isnan(data)))
+    assert(np.array_equal(amps[~np.isnan(data)], [4, 4, 2, 0, 0, -3, -3]))
+
+
+def test_bounding_zero_indices():
+    # Sign changes are between frames 2-3, 4-5 and 8-9
+    data = np.array([1, 1, 1, -1, -1, 1, 1, 1, 1, -1, -1, -1], dtype=float)
+    get_bounds = locomotion_bends.CrawlingBendsBoundInfo.\
+        h__getBoundingZeroIndices
+
+    back_zeros_I, front_zeros_I = get_bounds(None, data, 1)
+    assert(np.array_equal(back_zeros_I,
+                          [-1, -1, -1, 2, 2, 4, 4, 4, 4, -1, -1, -1]))
+    assert(np.array_equal(front_zeros_I[3:9], [5, 5, 9, 9, 9, 9]))
+
+    # Windows are expanded on the smaller side until they are large enough,
+    # and are invalid if they run out of sign changes
+    back_zeros_I, front_zeros_I = get_bounds(None, data, 6)
+    assert(np.array_equal(back_zeros_I[3:9], [-1, 2, 4, 4, 4, 4]))
+    assert(np.array_equal(front_zeros_I[4:9], [9, 9, 9, 9, 9]))
+
+
+def test_bend_data():
+    # A 0.5 Hz sine wave
+    fps = 25
+    data = 10 * np.sin(np.pi * np.arange(500) / fps)
+    options = feature_processing_options.LocomotionCrawlingBends()
+    bound_info = locomotion_bends.CrawlingBendsBoundInfo(
+        data, np.zeros(data.size, dtype=bool), options, fps)
+
+    bend_helper = locomotion_bends.BendHelper()
+    amps, freqs = bend_helper.h__getBendData(data, bound_info, options, fps)
+    is_valid = ~np.isnan(freqs)
+    assert(np.sum(is_valid) > 100)
+    assert(np.all((np.abs(freqs[is_valid]) > 0.4) &
+                  (np.abs(freqs[is_valid]) < 0.55)))
+    assert(np.all((np.abs(amps[is_valid]) > 9) &
+                  (np.abs(amps[is_valid]) < 11)))
+
+    # The spectra don't depend on how the windows are batched
+    batch_size = locomotion_bends.FFT_BATCH_SIZE
+    try:
+        locomotion_bends.FFT_BATCH_SIZE = 1
+        amps2, freqs2 = bend_helper.h__getBendData(data, bound_info,
+                                                   options, fps)
+    finally:
+        locomotion_bends.FFT_BATCH_SIZE = batch_size
+    assert(np.array_equal(np.isnan(amps), np.isnan(amps2)))
+    assert(np.allclose(amps[is_valid], amps2[is_valid]))
+    assert(np.array_equal(freqs[is_valid], freqs2[is_valid]))
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_foraging_amplitudes()
+    test_bounding_zero_indices()
+    test_bend_data()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the helpers used for the turn features
+
+"""
+import sys
+import os
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.features import locomotion_turns
+
+
+class _HeadTailWorm(object):
+    """
+    Just enough of a NormalizedWorm for h_getHeadTailDirectionChange
+    """
+
+    def __init__(self, angles):
+        self.partitions = {
+            'head': (np.cos(angles)[None, :], np.sin(angles)[None, :]),
+            'tail': (np.zeros((1, angles.size)), np.zeros((1, angles.size)))}
+
+    def get_partition(self, partition_key, data_key,
+                      split_spatial_dimensions):
+        return self.partitions[partition_key]
+
+
+def test_head_tail_direction_change():
+    fps = 20
+
+    # Turning slowly, through several wraps of the angle
+    angles = np.deg2rad(np.arange(1000) * 2.0)
+    worm = _HeadTailWorm(angles)
+    is_change = locomotion_turns.OmegaTurns.h_getHeadTailDirectionChange(
+        None, worm, fps)
+    assert(not np.any(is_change))
+
+    # A quick reversal of the direction, after a short gap
+    angles[500:] = angles[500:] + np.pi
+    angles[490:500] = np.NaN
+    worm = _HeadTailWorm(angles)
+    is_change = locomotion_turns.OmegaTurns.h_getHeadTailDirectionChange(
+        None, worm, fps)
+    assert(np.all(is_change[490:500]))
+    assert(not np.any(is_change[:470]) and not np.any(is_change[520:]))
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_head_tail_direction_change()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of saving a NormalizedWorm to, and memory-mapping it from, binary
+files
+
+"""
+import sys
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+
+
+def _get_normalized_worm(n_frames=20):
+    rng = np.random.RandomState(0)
+    skeleton = rng.randn(49, 2, n_frames)
+    widths = rng.rand(49, n_frames)
+    ventral_contour = skeleton + 0.1
+    dorsal_contour = skeleton - 0.1
+    nw = mv.NormalizedWorm.from_normalized_array_factory(
+        skeleton, widths, ventral_contour, dorsal_contour)
+    nw.video_info.fps = 25.8
+    return nw
+
+
+def test_binary_round_trip():
+    nw = _get_normalized_worm()
+    dir_path = tempfile.mkdtemp()
+    try:
+        nw.save_to_binary(dir_path)
+        nw2 = mv.NormalizedWorm.from_binary_factory(dir_path)
+
+        assert(isinstance(nw2.skeleton, np.memmap))
+        for attribute in ['skeleton', 'ventral_contour', 'dorsal_contour',
+                          'widths']:
+            assert(np.array_equal(getattr(nw2, attribute),
+                                  getattr(nw, attribute)))
+        assert(nw2.video_info.fps == nw.video_info.fps)
+        assert(np.array_equal(nw2.video_info.frame_code,
+                              nw.video_info.frame_code))
+
+        # Pickling only stores the file paths; the arrays are re-mapped
+        nw3 = pickle.loads(pickle.dumps(nw2))
+        assert(isinstance(nw3.skeleton, np.memmap))
+        assert(np.array_equal(nw3.widths, nw.widths))
+
+        nw4 = mv.NormalizedWorm.from_binary_factory(dir_path, mmap_mode=None)
+        assert(not isinstance(nw4.skeleton, np.memmap))
+        assert(np.array_equal(nw4.dorsal_contour, nw.dorsal_contour))
+    finally:
+        shutil.rmtree(dir_path)
+
+
+def test_binary_float32():
+    nw = _get_normalized_worm()
+    dir_path = tempfile.mkdtemp()
+    try:
+        nw.save_to_binary(dir_path, use_float32=True)
+        nw2 = mv.NormalizedWorm.from_binary_factory(dir_path)
+
+        assert(nw2.skeleton.dtype == np.float32)
+        assert(np.allclose(nw2.skeleton, nw.skeleton, atol=1e-6))
+        assert(nw2.video_info.frame_code.dtype == nw.video_info.frame_code.dtype)
+    finally:
+        shutil.rmtree(dir_path)
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_binary_round_trip()
+    test_binary_float32()
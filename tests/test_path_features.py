@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the arenas of the path duration feature
+
+"""
+import sys
+import os
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.features import path_features
+
+
+def _get_trajectory():
+    """
+    A hand-built trajectory of 3 skeleton points over 3 frames, in an
+    arena of 3 rows by 4 columns.
+    """
+    arena_size = (3, 4)
+    sxs = np.array([[0, 1, 3],
+                    [0, 2, 3],
+                    [1, 2, 3]])
+    sys = np.array([[0, 1, 2],
+                    [0, 1, 2],
+                    [0, 1, 2]])
+    # In the second frame the middle point is NaN, and the last frame
+    # is all NaN
+    isnan_mask = np.array([[False, False, True],
+                           [False, True, True],
+                           [False, False, True]])
+    s_points = [(0, 3), (0, 1)]
+
+    return arena_size, sys, sxs, s_points, isnan_mask
+
+
+def _get_arenas(count_once_per_frame, use_sparse_arenas=True):
+    arena_size, sys, sxs, s_points, isnan_mask = _get_trajectory()
+    arenas = path_features.h__populateArenas(arena_size, sys, sxs, s_points,
+                                             isnan_mask, count_once_per_frame,
+                                             use_sparse_arenas)
+    if use_sparse_arenas:
+        arenas = [x.toarray() for x in arenas]
+
+    return arenas
+
+
+def test_populate_arenas():
+    # The y-axis is flipped, so y = 0 is the last row
+    expected_worm_arena = np.zeros((3, 4))
+    # The first frame has 2 points in the same part of the arena
+    expected_worm_arena[2, 0] = 2
+    expected_worm_arena[2, 1] = 1
+    # The NaN point of the second frame is skipped
+    expected_worm_arena[1, 1] = 1
+    expected_worm_arena[1, 2] = 1
+
+    worm_arena, head_arena = _get_arenas(count_once_per_frame=False)
+    assert(np.array_equal(worm_arena, expected_worm_arena))
+    assert(np.array_equal(np.flatnonzero(head_arena), [5, 8]))
+
+    # The old behaviour only counts each part of the arena once per frame
+    worm_arena, _ = _get_arenas(count_once_per_frame=True)
+    expected_worm_arena[2, 0] = 1
+    assert(np.array_equal(worm_arena, expected_worm_arena))
+
+
+def test_sparse_and_dense_arenas():
+    for count_once_per_frame in (False, True):
+        sparse_arenas = path_features.h__populateArenas(
+            *_get_trajectory(), count_once_per_frame=count_once_per_frame)
+        dense_arenas = _get_arenas(count_once_per_frame,
+                                   use_sparse_arenas=False)
+
+        for sparse_arena, dense_arena in zip(sparse_arenas, dense_arenas):
+            assert(np.array_equal(sparse_arena.toarray(), dense_arena))
+
+            sparse_element = path_features.DurationElement(sparse_arena, 25)
+            dense_element = path_features.DurationElement(dense_arena, 25)
+            assert(np.array_equal(sparse_element.indices,
+                                  dense_element.indices))
+            assert(np.array_equal(sparse_element.times, dense_element.times))
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_populate_arenas()
+    test_sparse_and_dense_arenas()
@@ -10,9 +10,15 @@ they are the same:   i.e. nw == nw_calculated
 """
 import sys
 import os
+import copy
+
+import numpy as np
 
 sys.path.append('..')
 import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.prefeatures.pre_features import WormParsing
+from open_worm_analysis_toolbox.prefeatures.pre_features_helpers import \
+    WormParserHelpers
 
 
 def test_pre_features():
@@ -40,6 +46,80 @@ def test_pre_features():
     assert(is_test_passed)
 
 
+def test_pre_features_parallel():
+    """
+    Computing the skeleton and widths in several processes should give
+    exactly the same normalized worm as computing them serially.
+    """
+    base_path = os.path.abspath(mv.user_config.EXAMPLE_DATA_PATH)
+    schafer_bw_file_path = os.path.join(
+        base_path, "example_contour_and_skeleton_info.mat")
+    bw = mv.BasicWorm.from_schafer_file_factory(schafer_bw_file_path)
+
+    # The contours are smoothed in place so each calculation needs its own
+    # copy
+    nw_serial = mv.NormalizedWorm.from_BasicWorm_factory(copy.deepcopy(bw))
+    nw_parallel = mv.NormalizedWorm.from_BasicWorm_factory(copy.deepcopy(bw),
+                                                           n_workers=2)
+
+    for attribute in ['skeleton', 'widths', 'ventral_contour',
+                      'dorsal_contour']:
+        assert(np.array_equal(np.isnan(getattr(nw_serial, attribute)),
+                              np.isnan(getattr(nw_parallel, attribute))))
+        assert(np.array_equal(np.nan_to_num(getattr(nw_serial, attribute)),
+                              np.nan_to_num(getattr(nw_parallel, attribute))))
+
+
+def test_normalize_all_frames_xy():
+    """
+    The batched normalization should agree exactly with normalizing each
+    frame on its own.
+    """
+    helpers = WormParserHelpers
+    rng = np.random.RandomState(0)
+    h_skeleton = []
+    for frame_index in range(50):
+        if frame_index % 10 == 3:
+            h_skeleton.append(None)
+        else:
+            n_points = rng.randint(1, 200)
+            h_skeleton.append(np.cumsum(rng.randn(2, n_points), axis=1))
+
+    normalized = helpers.normalize_all_frames_xy(h_skeleton, 49)
+
+    for frame_index, cur_skeleton in enumerate(h_skeleton):
+        if cur_skeleton is None:
+            assert(np.all(np.isnan(normalized[:, :, frame_index])))
+            continue
+        cc = helpers.chain_code_lengths_cum_sum(cur_skeleton.T)
+        expected = helpers.normalize_parameter(cur_skeleton, cc, 49)
+        assert(np.array_equal(normalized[:, :, frame_index], expected))
+
+
+def test_compute_angles():
+    """
+    Angles of skeletons with the same number of points in every frame are
+    computed all at once; they should agree exactly with the frame by
+    frame computation used for heterocardinal skeletons.
+    """
+    rng = np.random.RandomState(0)
+    skeleton = np.cumsum(rng.randn(49, 2, 30), axis=0)
+    skeleton[:, :, 4] = np.NaN
+
+    angles = WormParsing.compute_angles(skeleton)
+    assert(angles.shape == (49, 30))
+    assert(np.all(np.isnan(angles[:, 4])))
+
+    # An extra frame with fewer points makes the skeleton heterocardinal
+    h_skeleton = WormParsing._h_array2list(skeleton)
+    h_skeleton.append(np.cumsum(rng.randn(2, 20), axis=1))
+    h_angles = WormParsing.compute_angles(h_skeleton)
+
+    assert(np.array_equal(np.isnan(angles), np.isnan(h_angles[:, :30])))
+    assert(np.array_equal(np.nan_to_num(angles),
+                          np.nan_to_num(h_angles[:, :30])))
+
+
 def _test_nw_to_bw_to_nw(nw):
     """
     Returns
@@ -80,5 +160,8 @@ if __name__ == '__main__':
     print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
     start_time = mv.utils.timing_function()
     test_pre_features()
+    test_pre_features_parallel()
+    test_normalize_all_frames_xy()
+    test_compute_angles()
     print("\nTime elapsed: %.2fs" %
           (mv.utils.timing_function() - start_time))
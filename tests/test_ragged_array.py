@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of RaggedArray, the container used for heterocardinal data
+
+"""
+import sys
+import os
+import pickle
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.prefeatures.ragged_array import RaggedArray
+
+
+def _get_frames():
+    rng = np.random.RandomState(0)
+    return [rng.randn(2, 5), None, rng.randn(2, 3), rng.randn(2, 8), None]
+
+
+def test_list_facade():
+    frames = _get_frames()
+    h_data = RaggedArray.from_list(frames)
+
+    assert(len(h_data) == len(frames))
+    assert(list(h_data.n_points) == [5, 0, 3, 8, 0])
+    for frame, ragged_frame in zip(frames, h_data):
+        if frame is None:
+            assert(ragged_frame is None)
+        else:
+            assert(np.array_equal(frame, ragged_frame))
+    assert(np.array_equal(h_data[-2], frames[-2]))
+
+    # Frames are views, so changes are seen in the buffer
+    h_data[0][:] = 0
+    assert(np.all(h_data.data[:, :5] == 0))
+
+    # Slices share the buffer
+    h_slice = h_data[2:4]
+    assert(len(h_slice) == 2)
+    assert(np.may_share_memory(h_slice.data, h_data.data))
+    assert(np.array_equal(h_slice[1], frames[3]))
+
+    # Replacing a frame with a different number of points
+    h_data[1] = np.ones((2, 4))
+    assert(list(h_data.n_points) == [5, 4, 3, 8, 0])
+    assert(np.array_equal(h_data[2], frames[2]))
+    h_data[3] = None
+    assert(h_data[3] is None)
+
+
+def test_padded_and_pickle():
+    frames = _get_frames()
+    h_data = RaggedArray.from_list(frames)
+
+    padded = h_data.to_padded()
+    assert(padded.shape == (5, 2, 8))
+    assert(np.array_equal(padded[2, :, :3], frames[2]))
+    assert(np.all(np.isnan(padded[2, :, 3:])))
+    assert(np.all(np.isnan(padded[1])))
+
+    h_data2 = pickle.loads(pickle.dumps(h_data))
+    assert(np.array_equal(h_data2.data, h_data.data))
+    assert(np.array_equal(h_data2.offsets, h_data.offsets))
+    assert(np.array_equal(h_data2.is_valid, h_data.is_valid))
+
+
+def test_basic_worm_contours():
+    frames = _get_frames()
+    bw = mv.BasicWorm.from_contour_factory(frames, frames)
+    assert(isinstance(bw.h_ventral_contour, RaggedArray))
+    assert(bw.h_dorsal_contour[1] is None)
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_list_facade()
+    test_padded_and_pickle()
+    test_basic_worm_contours()
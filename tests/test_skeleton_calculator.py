@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the batched contour matching of SkeletonCalculatorType1, against
+the original frame by frame implementation
+
+"""
+import sys
+import os
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox.prefeatures.skeleton_calculator1 import \
+    SkeletonCalculatorType1
+
+
+def _get_projection_index(vc_dx_ortho, vc_dy_ortho,
+                          dx_across_worm, dy_across_worm,
+                          left_I, d_across, sign_use):
+    """
+    The original frame by frame h__getProjectionIndex, for one point
+    """
+    dp = dx_across_worm * vc_dx_ortho + dy_across_worm * vc_dy_ortho
+
+    sign_used = -1
+    if sign_use == 0 and np.sum(dp) > 0:
+        dp = -1 * dp
+        sign_used = 1
+    elif sign_use == 1:
+        dp = -1 * dp
+        sign_used = 1
+
+    possible = (dp[1:-2] < dp[2:-1]) & (dp[1:-2] < dp[0:-3])
+
+    Ip = np.flatnonzero(possible)
+    if len(Ip) == 1:
+        dp_I = Ip + 1
+    elif len(Ip) > 1:
+        temp_I = np.argmin(d_across[Ip])
+        dp_I = Ip[temp_I] + 1
+    else:
+        dp_I = np.argmin(dp)
+
+    return (left_I + dp_I, sign_used)
+
+
+def _get_matches(s1, s2, norm_x, norm_y, dx_across, dy_across, d_across,
+                 left_I, right_I):
+    """
+    The original frame by frame h__getMatches
+    """
+    n_s1 = s1.shape[1]
+    match_I = np.zeros(n_s1, dtype=int)
+    match_I[-1] = s2.shape[1]
+
+    all_signs_used = np.zeros(n_s1)
+
+    # There is no need to do the first and last point
+    for I in range(1, n_s1 - 1):
+        lb = left_I[I]
+        rb = right_I[I]
+        match_I[I], all_signs_used[I] = _get_projection_index(
+            norm_x[I], norm_y[I], dx_across[I, lb:rb], dy_across[I, lb:rb],
+            lb, d_across[I, lb:rb], 0)
+
+    if not np.all(all_signs_used[1:-1] == all_signs_used[1]):
+        if np.sum(all_signs_used) > 0:
+            sign_use = 1
+            I_bad = np.flatnonzero(all_signs_used[1:-1] != 1) + 1
+        else:
+            I_bad = np.flatnonzero(all_signs_used[1:-1] != -1) + 1
+            sign_use = -1
+
+        for I in I_bad:
+            lb = left_I[I]
+            rb = right_I[I]
+            match_I[I], all_signs_used[I] = _get_projection_index(
+                norm_x[I], norm_y[I],
+                dx_across[I, lb:rb], dy_across[I, lb:rb],
+                lb, d_across[I, lb:rb], sign_use)
+
+    return match_I
+
+
+def _get_contours(n_frames=30):
+    """
+    Two sides of a wavy worm, with a varying number of points per side.
+    In some frames the sides cross, so that the sign of the projections is
+    not consistent along the worm.
+    """
+    rng = np.random.RandomState(0)
+    all_s1 = []
+    all_s2 = []
+    for frame_index in range(n_frames):
+        sides = []
+        for offset in (-30, 30):
+            n_points = rng.randint(60, 90)
+            x = np.linspace(0, 1000, n_points)
+            if frame_index % 3 == 0:
+                offset = offset * np.cos(x / 400)
+            y = 80 * np.sin(x / 150 + frame_index / 5) + offset + \
+                rng.randn(n_points)
+            sides.append(np.vstack((x, y)))
+        all_s1.append(sides[0])
+        all_s2.append(sides[1])
+
+    return all_s1, all_s2
+
+
+def test_get_matches_batch():
+    all_s1, all_s2 = _get_contours()
+
+    n_s1 = np.array([s1.shape[1] for s1 in all_s1])
+    n_s2 = np.array([s2.shape[1] for s2 in all_s2])
+    padded_s1 = SkeletonCalculatorType1.h__padSides(all_s1)
+    padded_s2 = SkeletonCalculatorType1.h__padSides(all_s2)
+
+    dx_across = padded_s1[:, 0, :, None] - padded_s2[:, 0, None, :]
+    dy_across = padded_s1[:, 1, :, None] - padded_s2[:, 1, None, :]
+    d_across = np.sqrt(dx_across * dx_across + dy_across * dy_across)
+    dx_across /= d_across
+    dy_across /= d_across
+
+    left_I, right_I = SkeletonCalculatorType1.h__getBoundsBatch(
+        n_s1, n_s2, padded_s1.shape[2], 0.3, 0.3)
+    norm_x, norm_y = SkeletonCalculatorType1.h__computeNormalVectorsBatch(
+        padded_s1, n_s1)
+
+    match_I = SkeletonCalculatorType1.h__getMatchesBatch(
+        n_s1, n_s2, norm_x, norm_y, dx_across, dy_across, d_across,
+        left_I, right_I)
+
+    for frame_index, (n1, n2) in enumerate(zip(n_s1, n_s2)):
+        expected_match_I = _get_matches(
+            all_s1[frame_index], all_s2[frame_index],
+            norm_x[frame_index, :n1], norm_y[frame_index, :n1],
+            dx_across[frame_index, :n1, :n2],
+            dy_across[frame_index, :n1, :n2],
+            d_across[frame_index, :n1, :n2],
+            left_I[frame_index, :n1], right_I[frame_index, :n1])
+
+        assert(np.array_equal(match_I[frame_index, :n1], expected_match_I))
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_get_matches_batch()
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the statistics computed by StatisticsManager
+
+"""
+import sys
+import os
+import warnings
+import itertools
+
+import numpy as np
+import scipy as sp
+import scipy.stats
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+
+
+class _Spec(object):
+    def __init__(self, name):
+        self.name = name
+
+
+def _merged_histogram(name, mean_per_video):
+    merged_hist = mv.MergedHistogram(_Spec(name))
+    merged_hist.mean_per_video = np.array(mean_per_video, dtype=float)
+    return merged_hist
+
+
+def _get_histograms(num_features=50):
+    rng = np.random.RandomState(0)
+    exp_histograms = []
+    ctl_histograms = []
+    for i in range(num_features):
+        exp_means = rng.randn(rng.randint(2, 8)).round(1)
+        ctl_means = (rng.randn(rng.randint(2, 8)) + rng.rand()).round(1)
+        exp_means[rng.rand(exp_means.size) < 0.1] = np.NaN
+        exp_histograms.append(_merged_histogram(i, exp_means))
+        ctl_histograms.append(_merged_histogram(i, ctl_means))
+
+    return exp_histograms, ctl_histograms
+
+
+def test_statistics_manager():
+    exp_histograms, ctl_histograms = _get_histograms()
+    statistics_manager = mv.StatisticsManager(exp_histograms, ctl_histograms)
+
+    for exp_hist, ctl_hist, worm_statistics in zip(exp_histograms,
+                                                   ctl_histograms,
+                                                   statistics_manager):
+        exp_means = exp_hist.valid_mean_per_video
+        ctl_means = ctl_hist.valid_mean_per_video
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            t_statistic, p_studentst = sp.stats.ttest_ind(exp_means,
+                                                          ctl_means)
+        _, p_wilcoxon = sp.stats.ranksums(exp_means, ctl_means)
+
+        assert(np.allclose(worm_statistics.t_statistic, t_statistic,
+                           equal_nan=True))
+        assert(np.allclose(worm_statistics.p_studentst, p_studentst,
+                           equal_nan=True))
+        assert(np.isclose(worm_statistics.p_wilcoxon, p_wilcoxon))
+
+        if exp_hist.all_videos_valid:
+            assert(np.isclose(worm_statistics.z_score_experiment,
+                              (exp_hist.mean - ctl_hist.mean) /
+                              ctl_hist.std))
+
+    assert(np.array_equal(statistics_manager.q_wilcoxon_array,
+                          mv.utils.compute_q_values(
+                              statistics_manager.p_wilcoxon_array)))
+
+
+def _pooled_t_test(exp_means, ctl_means):
+    """
+    Student's t-test with a pooled variance, from the sums of squares. Older
+    versions of scipy return NaN when a group has a single value.
+    """
+    n1 = exp_means.size
+    n2 = ctl_means.size
+    df = n1 + n2 - 2
+    pooled_var = (np.sum((exp_means - np.mean(exp_means))**2) +
+                  np.sum((ctl_means - np.mean(ctl_means))**2)) / df
+    t_statistic = (np.mean(exp_means) - np.mean(ctl_means)) / \
+        np.sqrt(pooled_var * (1 / n1 + 1 / n2))
+    return t_statistic, 2 * sp.stats.t.sf(abs(t_statistic), df)
+
+
+def test_single_valid_video():
+    # One valid video on one side still gives a pooled variance
+    exp_histograms = [_merged_histogram('a', [4]),
+                      _merged_histogram('b', [np.NaN, 2.5, np.NaN]),
+                      _merged_histogram('c', [1, 2, 4])]
+    ctl_histograms = [_merged_histogram('a', [1, 1.2, 0.9, 1.1, 1]),
+                      _merged_histogram('b', [1, 2, 1.5]),
+                      _merged_histogram('c', [0.5])]
+
+    other_exp_histograms, other_ctl_histograms = _get_histograms()
+    statistics_manager = mv.StatisticsManager(
+        exp_histograms + other_exp_histograms,
+        ctl_histograms + other_ctl_histograms)
+
+    for exp_hist, ctl_hist, worm_statistics in zip(exp_histograms,
+                                                   ctl_histograms,
+                                                   statistics_manager):
+        exp_means = exp_hist.valid_mean_per_video
+        ctl_means = ctl_hist.valid_mean_per_video
+        t_statistic, p_studentst = _pooled_t_test(exp_means, ctl_means)
+
+        assert(np.isfinite(t_statistic))
+        assert(np.isclose(worm_statistics.t_statistic, t_statistic))
+        assert(np.isclose(worm_statistics.p_studentst, p_studentst))
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            scipy_t_statistic, _ = sp.stats.ttest_ind(exp_means, ctl_means)
+        if np.isfinite(scipy_t_statistic):
+            assert(np.isclose(scipy_t_statistic, t_statistic))
+
+    # 1 video against 5 controls
+    assert(np.isclose(statistics_manager[0].t_statistic, 23.699, atol=1e-3))
+
+    # With a single video on each side there are no degrees of freedom
+    statistics_manager = mv.StatisticsManager(
+        [_merged_histogram('d', [3])] + other_exp_histograms,
+        [_merged_histogram('d', [1])] + other_ctl_histograms)
+    assert(np.isnan(statistics_manager[0].t_statistic))
+
+
+def test_exclusive_and_missing_features():
+    exp_histograms = [_merged_histogram('a', [np.NaN] * 3),
+                      _merged_histogram('b', [1, 2, np.NaN]),
+                      None]
+    ctl_histograms = [_merged_histogram('a', [1, 2, 3, 4]),
+                      _merged_histogram('b', [np.NaN] * 3),
+                      _merged_histogram('c', [1, 2])]
+
+    # Enough other features for the q-values to be estimated
+    other_exp_histograms, other_ctl_histograms = _get_histograms()
+    statistics_manager = mv.StatisticsManager(
+        exp_histograms + other_exp_histograms,
+        ctl_histograms + other_ctl_histograms)
+
+    # Only in the control: Fisher's exact test, 1 / (7 choose 3)
+    assert(statistics_manager[0].is_exclusive)
+    assert(np.isclose(statistics_manager[0].p_wilcoxon, 1 / 35))
+    assert(statistics_manager[0].p_studentst ==
+           statistics_manager[0].p_wilcoxon)
+    assert(statistics_manager[0].z_score_experiment == -np.Inf)
+
+    # Not all the experiment means are valid, so this isn't exclusive
+    assert(not statistics_manager[1].is_exclusive)
+    assert(np.isnan(statistics_manager[1].p_wilcoxon))
+    # The experiment mean is NaN, and there are no valid control means
+    assert(np.isnan(statistics_manager[1].z_score_experiment))
+
+    assert(np.isnan(statistics_manager.p_wilcoxon_array[2]))
+    assert(np.isnan(statistics_manager.z_score_experiment_array[2]))
+
+    # A WormStatistics object can also be used on its own
+    worm_statistics = mv.statistics.statistics_manager.WormStatistics(
+        exp_histograms[0], ctl_histograms[0])
+    assert(worm_statistics.p_wilcoxon == statistics_manager[0].p_wilcoxon)
+
+
+def test_permutation_test():
+    exp_histograms, ctl_histograms = _get_histograms(20)
+    statistics_manager = mv.StatisticsManager(exp_histograms, ctl_histograms)
+
+    p_values = statistics_manager.permutation_test(5000, random_state=0)
+    # The permutations are the same with more workers
+    assert(np.array_equal(p_values, statistics_manager.permutation_test(
+        5000, random_state=0, n_workers=2)))
+
+    # Compare with the p-values of all the possible permutations
+    for exp_hist, ctl_hist, p_value in zip(exp_histograms, ctl_histograms,
+                                           p_values):
+        exp_means = exp_hist.valid_mean_per_video
+        pooled_means = np.concatenate((exp_means,
+                                       ctl_hist.valid_mean_per_video))
+        observed = abs(np.mean(exp_means) -
+                       np.mean(ctl_hist.valid_mean_per_video))
+
+        differences = []
+        for exp_indices in itertools.combinations(range(pooled_means.size),
+                                                  exp_means.size):
+            is_exp = np.zeros(pooled_means.size, dtype=bool)
+            is_exp[list(exp_indices)] = True
+            differences.append(abs(np.mean(pooled_means[is_exp]) -
+                                   np.mean(pooled_means[~is_exp])))
+        exact_p_value = np.mean(np.array(differences) >= observed - 1e-9)
+
+        assert(abs(p_value - exact_p_value) < 0.03)
+
+
+def test_bootstrap_confidence_intervals():
+    exp_histograms, ctl_histograms = _get_histograms(20)
+    exp_histograms[0] = _merged_histogram(0, [np.NaN] * 3)
+    exp_histograms[1] = _merged_histogram(1, [1, 1, 1])
+    ctl_histograms[1] = _merged_histogram(1, [3, 3])
+    statistics_manager = mv.StatisticsManager(exp_histograms, ctl_histograms)
+
+    intervals = statistics_manager.bootstrap_confidence_intervals(
+        2000, random_state=0)
+    assert(intervals.shape == (20, 2))
+    assert(np.all(np.isnan(intervals[0])))
+    assert(np.allclose(intervals,
+                       statistics_manager.bootstrap_confidence_intervals(
+                           2000, random_state=0, n_workers=2),
+                       equal_nan=True))
+
+    assert(np.all(intervals[2:, 0] <= intervals[2:, 1]))
+
+    # Every resample of constant means has the same difference
+    assert(np.allclose(intervals[1], [-2, -2]))
+
+
+def test_resampling_large_control_set():
+    # A small experiment against a large control set, as when comparing a
+    # strain against a control database
+    rng = np.random.RandomState(0)
+    exp_histograms = []
+    ctl_histograms = []
+    for i in range(10):
+        # The experiment is shifted for the first half of the features
+        shift = 3 if i < 5 else 0
+        exp_histograms.append(_merged_histogram(i, rng.randn(20) + shift))
+        ctl_histograms.append(_merged_histogram(i, rng.randn(1000)))
+    statistics_manager = mv.StatisticsManager(exp_histograms, ctl_histograms)
+
+    p_values = statistics_manager.permutation_test(300, random_state=0)
+    assert(np.all(p_values[:5] == 1 / 301))
+    assert(np.all(p_values[5:] > 1 / 301))
+
+    intervals = statistics_manager.bootstrap_confidence_intervals(
+        300, random_state=0)
+    assert(np.all(intervals[:5, 0] > 2))
+    differences = np.array([np.mean(exp_hist.mean_per_video) -
+                            np.mean(ctl_hist.mean_per_video)
+                            for exp_hist, ctl_hist
+                            in zip(exp_histograms, ctl_histograms)])
+    assert(np.all((intervals[:, 0] < differences) &
+                  (differences < intervals[:, 1])))
+
+    # The resamples are evaluated in batches to bound the memory used, but
+    # the results don't depend on the batch size
+    statistics_module = mv.statistics.statistics_manager
+    memory_budget = statistics_module.RESAMPLING_MEMORY_BUDGET
+    statistics_module.RESAMPLING_MEMORY_BUDGET = 2**16
+    try:
+        assert(np.array_equal(p_values, statistics_manager.permutation_test(
+            300, random_state=0)))
+        assert(np.array_equal(
+            intervals, statistics_manager.bootstrap_confidence_intervals(
+                300, random_state=0)))
+    finally:
+        statistics_module.RESAMPLING_MEMORY_BUDGET = memory_budget
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_statistics_manager()
+    test_single_valid_video()
+    test_exclusive_and_missing_features()
+    test_permutation_test()
+    test_bootstrap_confidence_intervals()
+    test_resampling_large_control_set()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of helper functions in utils
+
+"""
+import sys
+import os
+
+import numpy as np
+
+sys.path.append('..')
+import open_worm_analysis_toolbox as mv
+from open_worm_analysis_toolbox import utils
+
+
+def test_separated_peaks_2d():
+    """
+    Finding the peaks of all rows at once should agree with
+    separated_peaks on each row.
+    """
+    rng = np.random.RandomState(0)
+    x = rng.rand(20, 256) ** 3
+
+    for use_max in [True, False]:
+        if use_max:
+            value_cutoff = 0.5 * np.amax(x, axis=1)
+        else:
+            value_cutoff = 0.5 * np.amin(x, axis=1) + 0.3
+        is_peak = utils.separated_peaks_2d(x, 5, use_max, value_cutoff)
+
+        for row_index, row in enumerate(x):
+            peaks, indices = utils.separated_peaks(row, 5, use_max,
+                                                   value_cutoff[row_index])
+            assert(np.array_equal(is_peak[row_index].nonzero()[0],
+                                  indices))
+
+
+def test_find_runs():
+    x = np.array([[1, 1, 2, np.NaN, np.NaN, 2],
+                  [0, 0, 0, 0, 1, 1]]).T
+    column_I, start_I, end_I = utils.find_runs(x)
+    assert(list(column_I) == [0, 0, 0, 0, 0, 1, 1])
+    assert(list(start_I) == [0, 2, 3, 4, 5, 0, 4])
+    assert(list(end_I) == [1, 2, 3, 4, 5, 3, 5])
+
+    column_I, start_I, end_I = utils.find_runs(np.array([True, True, False]))
+    assert(list(start_I) == [0, 2])
+    assert(list(end_I) == [1, 2])
+
+
+if __name__ == '__main__':
+    print('RUNNING TEST ' + os.path.split(__file__)[1] + ':')
+    test_separated_peaks_2d()
+    test_find_runs()